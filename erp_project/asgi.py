@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'erp_project.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_CACHE_ON_STARTUP:
+    from main.precompute import warm_in_background  # noqa: E402
+
+    warm_in_background()
@@ -2,6 +2,7 @@
 Django settings for erp_project project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -11,7 +12,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-erp-project-secret-key-for-development'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# On unless DJANGO_DEBUG=0, which the deploy (.github/workflows/cd.yml) sets
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') != '0'
 
 ALLOWED_HOSTS = ['*']
 
@@ -22,12 +24,18 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Let runserver serve static files through WhiteNoise too
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'main.apps.MainConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # WhiteNoise, made async capable like the rest of this list (see main.middleware)
+    'main.middleware.AsyncWhiteNoiseMiddleware',
+    'main.metrics.MetricsMiddleware',
+    'main.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -42,18 +50,46 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.data_versions',
+            ],
+            # Compile each template once per process
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+# Template fragments ({% cache %}) are keyed on DataVersion counters, so a
+# stale fragment is never served; use a shared cache (Redis/Memcached) when
+# running several workers.
+CACHES = {
+    'default': {
+        # LocMemCache that also counts hits and misses for /metrics
+        'BACKEND': 'main.metrics.CountingLocMemCache',
+        'LOCATION': 'erp-default',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Dashboard and chart data (main.precompute), shared by every worker so
+    # `warm_cache` and the single-flight lock reach them all. `migrate`
+    # creates the table (main/migrations/0011_precompute_cache_table.py).
+    'precompute': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'erp_precompute_cache',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+PRECOMPUTE_CACHE = 'precompute'
+
 WSGI_APPLICATION = 'erp_project.wsgi.application'
 
 # Database
@@ -65,6 +101,15 @@ DATABASES = {
 }
 
 # Password validation
+# Sessions are read from the cache and written through to the database;
+# the resolved User is cached too (see main.backends)
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['main.backends.CachedModelBackend']
+# How long another worker may keep serving a user that was changed or
+# deactivated; the cache is per process, so the signal cannot reach it
+AUTH_USER_CACHE_SECONDS = 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -88,14 +133,113 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
-STATICFILES_DIRS = [
-    BASE_DIR /'main'/ 'static',
-]
 
+# Build output of collectstatic, not kept in git
 STATIC_ROOT = BASE_DIR / 'static'
 
+# With DEBUG off (production, DJANGO_DEBUG=0) collectstatic writes
+# content-hashed copies of every file plus .gz/.br variants, and WhiteNoise
+# serves the hashed names with a ten-year immutable Cache-Control.
+# Development serves the source files unhashed.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Login URL
 LOGIN_URL = '/login/'
+
+# Location that sales and receipts without one are booked at; created on
+# first use and holding all stock that was never moved to another location
+DEFAULT_LOCATION = 'Main'
+
+# Product.stock_quantity is the total over locations. None moves it in the
+# sale's own transaction; a number of milliseconds leaves each sale to its
+# location row and refreshes the totals of the products sold in the meantime
+# that often, in one UPDATE (main.stocktotals), so hot products stop
+# serialising writers at the cost of a total that lags by that much
+STOCK_TOTALS_DELAY_MS = None
+
+# Sales older than this many days are moved to the archive by `archive_sales`
+SALES_ARCHIVE_AFTER_DAYS = 365
+
+# ABC classification (classify_abc): products making up the first 80% of
+# revenue over the last ABC_PERIOD_DAYS are A, the next 15% B, the rest C
+ABC_PERIOD_DAYS = 365
+ABC_THRESHOLDS = (0.80, 0.95)
+
+# Demand forecast (forecast_demand): daily demand is the exponentially
+# smoothed ('ewma', weight FORECAST_ALPHA) or plain ('sma') average of the
+# last FORECAST_HISTORY_DAYS of unit sales. Products whose stock covers less
+# than FORECAST_LEAD_TIME_DAYS get an order up to FORECAST_COVER_DAYS beyond it
+FORECAST_METHOD = 'ewma'
+FORECAST_ALPHA = 0.1
+FORECAST_HISTORY_DAYS = 90
+FORECAST_LEAD_TIME_DAYS = 7
+FORECAST_COVER_DAYS = 30
+
+# Serve the dashboard and chart APIs from main.async_views, which run their
+# independent queries concurrently. Enable when running erp_project.asgi
+# under an ASGI server; leave off for WSGI.
+ASYNC_VIEWS = False
+ASYNC_QUERY_WORKERS = 4
+
+# Cache warm-up (main.precompute): `manage.py warm_cache` after a deploy
+# fills the shared dashboard and chart entries. With this on, each web
+# process also runs the warm-up on a background thread as it starts, which
+# fills its own dropdown fragments too.
+WARM_CACHE_ON_STARTUP = False
+
+# Group commit (main.ingest): sales and receipts from the forms and the API
+# go through one writer thread that commits them together, after at most
+# INGEST_MAX_DELAY_MS or INGEST_MAX_BATCH submissions. Raise the delay for
+# throughput under heavy write load, lower it for quicker single saves.
+INGEST_QUEUE = False
+INGEST_MAX_BATCH = 200
+INGEST_MAX_DELAY_MS = 5
+
+# Dashboard live feed (/live/): seconds between keep-alive comments, and how
+# long one stream lasts before the browser reconnects
+LIVE_FEED_KEEPALIVE = 15
+LIVE_FEED_MAX_SECONDS = 300
+
+# /metrics (main.metrics) needs "Authorization: Bearer <token>" when this is
+# set, and a logged-in staff user when it is None
+METRICS_TOKEN = None
+
+# Request profiling (main.profiling): Server-Timing headers on every response
+# and a slow log. The headers expose timings to clients, so keep it off
+# unless you are investigating a slow page.
+PROFILING = False
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_SLOW_QUERY_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_log': {
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'slow.log',
+            # The file is only created once something is slow
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'main.profiling': {
+            'handlers': ['slow_log'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,87 @@
+"""ABC (Pareto) classification of products by revenue contribution
+
+Products are ranked by revenue over the last ABC_PERIOD_DAYS. Those that
+make up the first 80% of revenue are A, the next 15% B and the rest,
+products without sales included, C (see ABC_THRESHOLDS).
+
+The ranking is a single query over Product: revenue is a correlated SUM
+of line_total per product (plus the archive rollups when the period reaches
+them), and the running and grand totals are window SUMs over it, so every
+product comes back with its cumulative share and current stock.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import DecimalField, F, OuterRef, RowRange, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .archive import archived_until, day_range
+from .models import DataVersion, Product, Sale, SaleRollup
+
+TIERS = ('A', 'B', 'C')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+# Ids per UPDATE, below SQLite's bound-parameter limit
+UPDATE_BATCH = 500
+
+
+def period_start(days=None):
+    days = days or settings.ABC_PERIOD_DAYS
+    return timezone.localdate() - datetime.timedelta(days=days - 1)
+
+
+def _revenue(model, field, lookups):
+    rows = model.objects.filter(product=OuterRef('pk'), **lookups).values('product')
+    return Coalesce(Subquery(rows.annotate(total=Sum(field)).values('total')), Value(0), output_field=MONEY)
+
+
+def ranking(start):
+    """Products, best first, annotated with revenue, running and total since start"""
+    revenue = _revenue(Sale, 'line_total', day_range('date_time', start))
+    boundary = archived_until()
+    if boundary is not None and boundary >= start:
+        revenue = revenue + _revenue(SaleRollup, 'line_total', {'day__gte': start})
+    return Product.objects.annotate(revenue=revenue).annotate(
+        running=Window(
+            Sum('revenue'),
+            order_by=[F('revenue').desc(), F('pk').asc()],
+            frame=RowRange(start=None, end=0),
+        ),
+        total=Window(Sum('revenue')),
+    ).order_by('-revenue', 'pk')
+
+
+def tier(revenue, running, total):
+    """A, B or C from the revenue share ranked before this product"""
+    if not total or not revenue:
+        return 'C'
+    share_before = (running - revenue) / total
+    a, b = settings.ABC_THRESHOLDS
+    if share_before < a:
+        return 'A'
+    if share_before < b:
+        return 'B'
+    return 'C'
+
+
+def classify(days=None, dry_run=False):
+    """Store every product's tier; only products whose tier moved are written
+
+    Returns ({tier: product count}, number of products that changed tier).
+    """
+    rows = ranking(period_start(days)).values_list('pk', 'revenue', 'running', 'total', 'abc_class')
+    counts = dict.fromkeys(TIERS, 0)
+    moved = {name: [] for name in TIERS}
+    for pk, revenue, running, total, current in rows:
+        name = tier(revenue, running, total)
+        counts[name] += 1
+        if name != current:
+            moved[name].append(pk)
+
+    changed = sum(len(ids) for ids in moved.values())
+    if changed and not dry_run:
+        for name, ids in moved.items():
+            for index in range(0, len(ids), UPDATE_BATCH):
+                Product.objects.filter(pk__in=ids[index:index + UPDATE_BATCH]).update(abc_class=name)
+        DataVersion.bump('product')
+    return counts, changed
@@ -0,0 +1,380 @@
+"""Versioned JSON API (/api/v1/) for POS and e-commerce integrations
+
+Clients authenticate with the normal session login and send the CSRF token
+(X-CSRFToken header) on writes, like the web forms do.
+
+Lists are cursor-paginated on id: pass the returned next_cursor back as
+?cursor= until it is null. ?fields=a,b selects columns, and each page is a
+single query (values_list over the selected columns, one extra row to
+detect the next page), whatever the page size.
+
+Writes take a JSON list of objects (or {"items": [...]}) and are all or
+nothing: any invalid item rejects the whole batch with per-item errors.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import ingest, services
+from .archive import day_range
+from .fastjson import JSONResponse
+from .models import Category, DataVersion, Employee, Inventory, Location, Product, ProductStock, Sale, Supplier
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BATCH = 1000
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.payload = dict(error=message, **extra)
+
+
+def api_view(*methods):
+    """JSON errors instead of login redirects and HTML error pages"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JSONResponse({'error': 'Authentication required'}, status=401)
+            if request.method not in methods:
+                response = JSONResponse({'error': f'Method {request.method} not allowed'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as exc:
+                return JSONResponse(exc.payload, status=exc.status)
+        return wrapper
+    return decorator
+
+
+# Public field name -> ORM lookup, per resource
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'size': 'size',
+    'color': 'color',
+    'price': 'price',
+    'stock_quantity': 'stock_quantity',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+STOCK_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'stock_quantity': 'stock_quantity',
+    'updated_at': 'updated_at',
+}
+LOCATION_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+}
+SALE_FIELDS = {
+    'id': 'id',
+    'product': 'product_id',
+    'product_name': 'product__name',
+    'employee': 'employee_id',
+    'employee_name': 'employee__name',
+    'quantity': 'quantity',
+    'price': 'price',
+    'line_total': 'line_total',
+    'location': 'location_id',
+    'date_time': 'date_time',
+}
+INVENTORY_FIELDS = {
+    'id': 'id',
+    'product': 'product_id',
+    'product_name': 'product__name',
+    'supplier': 'supplier_id',
+    'supplier_name': 'supplier__name',
+    'quantity': 'quantity',
+    'unit_price': 'unit_price',
+    'line_value': 'line_value',
+    'location': 'location_id',
+    'date_received': 'date_received',
+}
+
+
+def _int_param(request, name):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f'{name} must be an integer')
+
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ApiError(f'{name} must be a YYYY-MM-DD date')
+    return date
+
+
+def _ids_param(request):
+    value = request.GET.get('ids')
+    if not value:
+        return None
+    try:
+        return [int(pk) for pk in value.split(',')]
+    except ValueError:
+        raise ApiError('ids must be a comma-separated list of integers')
+
+
+def paginate(request, queryset, fields):
+    """One page of queryset as dicts of the requested fields"""
+    names = list(fields)
+    if request.GET.get('fields'):
+        names = request.GET['fields'].split(',')
+        unknown = [name for name in names if name not in fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}", allowed=list(fields))
+
+    limit = _int_param(request, 'limit') or DEFAULT_LIMIT
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f'limit must be between 1 and {MAX_LIMIT}')
+    cursor = _int_param(request, 'cursor')
+    if cursor is not None:
+        queryset = queryset.filter(id__gt=cursor)
+
+    # id always comes last, for the cursor, whether or not it was asked for
+    lookups = [fields[name] for name in names] + ['id']
+    rows = list(queryset.order_by('id').values_list(*lookups)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return JSONResponse({
+        'results': [dict(zip(names, row)) for row in rows],
+        'next_cursor': str(rows[-1][-1]) if has_more else None,
+    })
+
+
+def _items(request):
+    try:
+        body = json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError('Request body must be JSON')
+    items = body.get('items') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ApiError('Expected a non-empty list of objects')
+    if len(items) > MAX_BATCH:
+        raise ApiError(f'At most {MAX_BATCH} items per request', status=413)
+    return items
+
+
+# Lower bounds the model fields themselves do not enforce
+MINIMUMS = {'quantity': 1, 'price': 0, 'unit_price': 0, 'stock_quantity': 0}
+
+
+def _clean(model, items, writable, required=(), foreign_keys=None):
+    """Validate items against model fields; returns attribute dicts for each item
+
+    foreign_keys maps an item key to its model, e.g. {'product': Product};
+    existence is checked with one query per related model.
+    """
+    foreign_keys = foreign_keys or {}
+    errors = []
+    cleaned = []
+    for index, item in enumerate(items):
+        attrs = {}
+        for name in item:
+            if name not in writable and name != 'id':
+                errors.append({'index': index, 'field': name, 'error': 'Unknown or read-only field'})
+        for name in required:
+            if item.get(name) in (None, ''):
+                errors.append({'index': index, 'field': name, 'error': 'This field is required'})
+        for name in writable:
+            if name not in item or (item[name] is None and name in required):
+                continue
+            value = item[name]
+            if name in foreign_keys:
+                if not isinstance(value, int) or isinstance(value, bool):
+                    errors.append({'index': index, 'field': name, 'error': 'Must be an id'})
+                    continue
+                attrs[f'{name}_id'] = value
+                continue
+            try:
+                attrs[name] = model._meta.get_field(name).clean(value, None)
+            except ValidationError as exc:
+                errors.append({'index': index, 'field': name, 'error': ' '.join(exc.messages)})
+                continue
+            if name in MINIMUMS and attrs[name] is not None and attrs[name] < MINIMUMS[name]:
+                errors.append({'index': index, 'field': name, 'error': f'Must be at least {MINIMUMS[name]}'})
+        cleaned.append(attrs)
+
+    for name, related in foreign_keys.items():
+        wanted = {attrs[f'{name}_id'] for attrs in cleaned if f'{name}_id' in attrs}
+        existing = set(related.objects.filter(pk__in=wanted).values_list('id', flat=True))
+        for index, attrs in enumerate(cleaned):
+            if attrs.get(f'{name}_id') not in (None, *existing):
+                errors.append({'index': index, 'field': name, 'error': 'Does not exist'})
+    if errors:
+        raise ApiError('Invalid items', errors=errors)
+    return cleaned
+
+
+@api_view('GET', 'POST', 'PATCH')
+def products(request):
+    """GET: list products. POST: create products. PATCH: update products by id"""
+    if request.method == 'POST':
+        return _create_products(_items(request))
+    if request.method == 'PATCH':
+        return _update_products(_items(request))
+
+    queryset = Product.objects.all()
+    if request.GET.get('category'):
+        queryset = queryset.filter(category_id=_int_param(request, 'category'))
+    ids = _ids_param(request)
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+    return paginate(request, queryset, PRODUCT_FIELDS)
+
+
+PRODUCT_WRITABLE = ('name', 'category', 'size', 'color', 'price')
+
+
+def _create_products(items):
+    cleaned = _clean(
+        Product, items, PRODUCT_WRITABLE + ('stock_quantity',),
+        required=('name', 'category', 'price'), foreign_keys={'category': Category},
+    )
+    with transaction.atomic():
+        created = Product.objects.bulk_create([Product(**attrs) for attrs in cleaned])
+        ProductStock.rebalance([product.pk for product in created])
+        DataVersion.bump('product')
+    return JSONResponse({'results': [{'id': product.id} for product in created]}, status=201)
+
+
+def _update_products(items):
+    # Stock only moves through sales and receipts, never by overwriting it
+    cleaned = _clean(Product, items, PRODUCT_WRITABLE, required=('id',), foreign_keys={'category': Category})
+    ids = []
+    for index, item in enumerate(items):
+        if not isinstance(item['id'], int) or isinstance(item['id'], bool):
+            raise ApiError('Invalid items', errors=[{'index': index, 'field': 'id', 'error': 'Must be an id'}])
+        ids.append(item['id'])
+    if len(set(ids)) != len(ids):
+        raise ApiError('Each product may appear only once per batch')
+
+    with transaction.atomic():
+        found = Product.objects.select_for_update().in_bulk(ids)
+        missing = [
+            {'index': index, 'field': 'id', 'error': 'Does not exist'}
+            for index, pk in enumerate(ids) if pk not in found
+        ]
+        if missing:
+            raise ApiError('Invalid items', errors=missing)
+        changed = set()
+        now = timezone.now()
+        for pk, attrs in zip(ids, cleaned):
+            for name, value in attrs.items():
+                setattr(found[pk], name, value)
+            # bulk_update skips auto_now, so stamp updated_at here
+            found[pk].updated_at = now
+            changed.update(attrs)
+        if changed:
+            Product.objects.bulk_update(found.values(), [*changed, 'updated_at'])
+            DataVersion.bump('product')
+    return JSONResponse({'results': [{'id': pk} for pk in ids]})
+
+
+@api_view('GET')
+def stock(request):
+    """Current stock levels; ?below=N for products under N units, ?location=id for one location"""
+    queryset = Product.objects.all()
+    fields = STOCK_FIELDS
+    location = _int_param(request, 'location')
+    if location is not None:
+        # Joined through the (location, quantity) index, not the whole stock table
+        queryset = queryset.filter(stock_levels__location_id=location).annotate(
+            location_quantity=F('stock_levels__quantity'))
+        fields = dict(STOCK_FIELDS, stock_quantity='location_quantity')
+    below = _int_param(request, 'below')
+    if below is not None:
+        queryset = queryset.filter(**{f"{fields['stock_quantity']}__lt": below})
+    ids = _ids_param(request)
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+    return paginate(request, queryset, fields)
+
+
+@api_view('GET')
+def locations(request):
+    """Stores and warehouses, for the location of sales, receipts and stock"""
+    return paginate(request, Location.objects.all(), LOCATION_FIELDS)
+
+
+def _filter_period(request, queryset, field):
+    since = _date_param(request, 'since')
+    until = _date_param(request, 'until')
+    return queryset.filter(**day_range(field, since, until))
+
+
+def _stock_payload(products):
+    return {str(pk): product.stock_quantity for pk, product in products.items()}
+
+
+@api_view('GET', 'POST')
+def sales(request):
+    """GET: list sales (hot table only, not the archive). POST: record sales"""
+    if request.method == 'POST':
+        cleaned = _clean(
+            Sale, _items(request), ('product', 'employee', 'quantity', 'price', 'location'),
+            required=('product', 'employee', 'quantity', 'price'),
+            foreign_keys={'product': Product, 'employee': Employee, 'location': Location},
+        )
+        new = [Sale(**attrs) for attrs in cleaned]
+        if settings.INGEST_QUEUE:
+            products = ingest.writer().submit(sales=new)
+        else:
+            products = services.record_sales(new)
+        return JSONResponse({
+            'results': [{'id': sale.id} for sale in new],
+            'stock': _stock_payload(products),
+        }, status=201)
+
+    queryset = _filter_period(request, Sale.objects.all(), 'date_time')
+    for name in ('product', 'employee', 'location'):
+        if request.GET.get(name):
+            queryset = queryset.filter(**{f'{name}_id': _int_param(request, name)})
+    return paginate(request, queryset, SALE_FIELDS)
+
+
+@api_view('GET', 'POST')
+def inventory(request):
+    """GET: list inventory receipts. POST: record receipts"""
+    if request.method == 'POST':
+        cleaned = _clean(
+            Inventory, _items(request), ('product', 'supplier', 'quantity', 'unit_price', 'location'),
+            required=('product', 'supplier', 'quantity', 'unit_price'),
+            foreign_keys={'product': Product, 'supplier': Supplier, 'location': Location},
+        )
+        new = [Inventory(**attrs) for attrs in cleaned]
+        if settings.INGEST_QUEUE:
+            products = ingest.writer().submit(receipts=new)
+        else:
+            products = services.record_receipts(new)
+        return JSONResponse({
+            'results': [{'id': receipt.id} for receipt in new],
+            'stock': _stock_payload(products),
+        }, status=201)
+
+    queryset = _filter_period(request, Inventory.objects.all(), 'date_received')
+    for name in ('product', 'supplier', 'location'):
+        if request.GET.get(name):
+            queryset = queryset.filter(**{f'{name}_id': _int_param(request, name)})
+    return paginate(request, queryset, INVENTORY_FIELDS)
@@ -0,0 +1,243 @@
+"""Sales queries that span the hot Sale table and the archive
+
+Sales older than SALES_ARCHIVE_AFTER_DAYS are moved by the archive_sales
+command into SaleArchive, and their daily totals into SaleRollup. Every
+aggregate here adds the rollups for the archived part of the requested
+range, so totals stay correct however much has been archived.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, Max, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import DataVersion, Product, Sale, SaleArchive, SaleRollup, SalesCounter
+
+SUMMARY_FIELDS = ('count', 'quantity', 'price_total', 'line_total')
+CENT = Decimal('0.01')
+
+# Aliases are prefixed because an aggregate may not shadow a model field
+HOT_AGGREGATES = {
+    'sum_count': Count('id'),
+    'sum_quantity': Sum('quantity'),
+    'sum_price_total': Sum('price'),
+    'sum_line_total': Sum('line_total'),
+}
+
+ROLLUP_AGGREGATES = {
+    'sum_count': Sum('sale_count'),
+    'sum_quantity': Sum('quantity'),
+    'sum_price_total': Sum('price_total'),
+    'sum_line_total': Sum('line_total'),
+}
+
+
+def empty_summary():
+    return {'count': 0, 'quantity': 0, 'price_total': Decimal('0'), 'line_total': Decimal('0')}
+
+
+def _add(summary, row):
+    for field in SUMMARY_FIELDS:
+        value = row[f'sum_{field}'] or 0
+        # SQLite sums decimals as floats; money is whole cents
+        if isinstance(value, Decimal):
+            value = value.quantize(CENT)
+        summary[field] += value
+    return summary
+
+
+def archive_cutoff(days=None):
+    """Start of the oldest day that stays in the hot table"""
+    if days is None:
+        days = settings.SALES_ARCHIVE_AFTER_DAYS
+    return timezone.localdate() - datetime.timedelta(days=days)
+
+
+def day_range(field, start=None, end=None):
+    """Lookups keeping `field` within the local days [start, end]; either bound may be None
+
+    Compares with the local midnights around the range rather than casting
+    every row to a date (field__date__gte), which no index can serve.
+    """
+    lookups = {}
+    if start:
+        lookups[f'{field}__gte'] = _midnight(start)
+    if end:
+        lookups[f'{field}__lt'] = _midnight(end + datetime.timedelta(days=1))
+    return lookups
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def archived_until():
+    """Last day whose sales were moved to the archive, or None"""
+    return SaleRollup.objects.aggregate(Max('day'))['day__max']
+
+
+def _hot_sales(start, end, filters):
+    return Sale.objects.filter(**day_range('date_time', start, end), **filters)
+
+
+def _rollups(start, end, filters):
+    """Rollups for the range, or None when the range stays in hot data"""
+    boundary = archived_until()
+    if boundary is None or (start and start > boundary):
+        return None
+    rollups = SaleRollup.objects.filter(**filters)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    return rollups
+
+
+def sales_summary(start=None, end=None, **filters):
+    """Count, units, Sum(price) and revenue (Sum(line_total)) over hot and archived sales
+
+    start/end are inclusive dates; filters are Sale lookups that SaleRollup
+    shares, e.g. employee_id or product__category_id.
+    """
+    summary = _add(empty_summary(), _hot_sales(start, end, filters).aggregate(**HOT_AGGREGATES))
+    rollups = _rollups(start, end, filters)
+    if rollups is not None:
+        _add(summary, rollups.aggregate(**ROLLUP_AGGREGATES))
+    return summary
+
+
+def sales_by(field, start=None, end=None, **filters):
+    """sales_summary grouped by a foreign key such as 'employee' or 'product__category'"""
+    totals = defaultdict(empty_summary)
+    for row in _hot_sales(start, end, filters).values(field).annotate(**HOT_AGGREGATES).order_by():
+        _add(totals[row[field]], row)
+    rollups = _rollups(start, end, filters)
+    if rollups is not None:
+        for row in rollups.values(field).annotate(**ROLLUP_AGGREGATES).order_by():
+            _add(totals[row[field]], row)
+    return totals
+
+
+def daily_totals(start, end, **filters):
+    """sales_summary per calendar day between start and end (inclusive)"""
+    totals = defaultdict(empty_summary)
+    hot = _hot_sales(start, end, filters).annotate(day=TruncDate('date_time'))
+    for row in hot.values('day').annotate(**HOT_AGGREGATES).order_by():
+        _add(totals[row['day']], row)
+    rollups = _rollups(start, end, filters)
+    if rollups is not None:
+        for row in rollups.values('day').annotate(**ROLLUP_AGGREGATES).order_by():
+            _add(totals[row['day']], row)
+    return totals
+
+
+def bucket_totals(field, kind, start=None, end=None, **filters):
+    """sales_summary per (field value, first day of its day/week/month) in one GROUP BY"""
+    totals = defaultdict(empty_summary)
+    hot = _hot_sales(start, end, filters).annotate(bucket=Trunc('date_time', kind, output_field=DateField()))
+    for row in hot.values(field, 'bucket').annotate(**HOT_AGGREGATES).order_by():
+        _add(totals[row[field], row['bucket']], row)
+    rollups = _rollups(start, end, filters)
+    if rollups is not None:
+        rollups = rollups.annotate(bucket=Trunc('day', kind, output_field=DateField()))
+        for row in rollups.values(field, 'bucket').annotate(**ROLLUP_AGGREGATES).order_by():
+            _add(totals[row[field], row['bucket']], row)
+    return totals
+
+
+def top_sellers(limit=10, by='units', start=None, end=None, category_id=None):
+    """Best-selling products, best first, as dicts of product, units and revenue
+
+    by is 'units' or 'revenue'. Without a period this is one indexed query
+    on the SalesCounter rows; a period is summed from the hot sales in that
+    range plus the archive rollups.
+    """
+    order = 'units_sold' if by == 'units' else 'revenue'
+    if start is None and end is None:
+        counters = SalesCounter.objects.select_related('product__category').filter(units_sold__gt=0)
+        if category_id:
+            counters = counters.filter(product__category_id=category_id)
+        return [
+            {'product': counter.product, 'units': counter.units_sold, 'revenue': counter.revenue}
+            for counter in counters.order_by(f'-{order}', 'product_id')[:limit]
+        ]
+
+    filters = {'product__category_id': category_id} if category_id else {}
+    key = 'quantity' if by == 'units' else 'line_total'
+    totals = sales_by('product', start, end, **filters)
+    best = sorted(totals.items(), key=lambda item: (-item[1][key], item[0]))[:limit]
+    products = Product.objects.select_related('category').in_bulk([product_id for product_id, _ in best])
+    return [
+        {'product': products[product_id], 'units': row['quantity'], 'revenue': row['line_total']}
+        for product_id, row in best if row['quantity'] > 0
+    ]
+
+
+def archived_sales(start=None, end=None, **filters):
+    """Archived sale rows, only when an explicit start date reaches the archive
+
+    Unbounded listings stay on the hot table; asking for a range that starts
+    on or before the last archived day pulls the matching archive rows in.
+    """
+    boundary = archived_until()
+    if start is None or boundary is None or start > boundary:
+        return SaleArchive.objects.none()
+    rows = SaleArchive.objects.filter(**day_range('date_time', start, end), **filters)
+    return rows.select_related('product', 'employee', 'product__category')
+
+
+def archive_batch(sales):
+    """Move one batch of Sale rows into SaleArchive and merge their rollups"""
+    totals = {}
+    archive_rows = []
+    for sale in sales:
+        day = timezone.localtime(sale.date_time).date()
+        archive_rows.append(SaleArchive(
+            id=sale.id,
+            product_id=sale.product_id,
+            employee_id=sale.employee_id,
+            quantity=sale.quantity,
+            price=sale.price,
+            date_time=sale.date_time,
+            period=day.year * 100 + day.month,
+        ))
+        key = (day, sale.product_id, sale.employee_id)
+        row = totals.setdefault(key, empty_summary())
+        row['count'] += 1
+        row['quantity'] += sale.quantity
+        row['price_total'] += sale.price
+        row['line_total'] += sale.line_total
+    if not archive_rows:
+        return 0
+
+    with transaction.atomic():
+        SaleArchive.objects.bulk_create(archive_rows)
+        days = {day for day, _, _ in totals}
+        existing = {
+            (rollup.day, rollup.product_id, rollup.employee_id): rollup
+            for rollup in SaleRollup.objects.filter(
+                day__in=days, product_id__in={p for _, p, _ in totals},
+            )
+        }
+        new, changed = [], []
+        for (day, product_id, employee_id), row in totals.items():
+            rollup = existing.get((day, product_id, employee_id))
+            if rollup is None:
+                rollup = SaleRollup(day=day, product_id=product_id, employee_id=employee_id)
+                new.append(rollup)
+            else:
+                changed.append(rollup)
+            rollup.sale_count += row['count']
+            rollup.quantity += row['quantity']
+            rollup.price_total += row['price_total']
+            rollup.line_total += row['line_total']
+        SaleRollup.objects.bulk_create(new)
+        SaleRollup.objects.bulk_update(changed, ['sale_count', 'quantity', 'price_total', 'line_total'])
+        # Nothing references Sale, so this is a single fast DELETE
+        Sale.objects.filter(id__in=[row.id for row in archive_rows]).delete()
+        DataVersion.bump('sale', 'salearchive', 'salerollup')
+    return len(archive_rows)
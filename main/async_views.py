@@ -0,0 +1,126 @@
+"""Async versions of the dashboard and chart endpoints
+
+main.urls routes to these instead of the sync views when ASYNC_VIEWS is on,
+which is meant for serving erp_project.asgi under an ASGI server. Each
+view's independent queries run concurrently on a small dedicated thread
+pool, so a dashboard costs about its slowest query rather than the sum of
+all of them. With the flag off everything stays on the sync views.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import events, fastjson, precompute, views
+from .versioning import conditional, data_versions
+
+# Bounded, so a burst of requests cannot open an unbounded number of connections
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_QUERY_WORKERS, thread_name_prefix='erp-query')
+
+
+def _run_query(query, *args):
+    # Pool threads hold their own connections; honour CONN_MAX_AGE like a request would
+    close_old_connections()
+    try:
+        return query(*args)
+    finally:
+        close_old_connections()
+
+
+async def in_pool(query, *args):
+    """Run one blocking query on the query pool"""
+    return await sync_to_async(_run_query, thread_sensitive=False, executor=executor)(query, *args)
+
+
+async def run_concurrently(queries):
+    """Evaluate {name: callable} on the query pool at once, returning {name: result}"""
+    names = list(queries)
+    results = await asyncio.gather(*(in_pool(queries[name]) for name in names))
+    return dict(zip(names, results))
+
+
+def async_login_required(view):
+    """login_required for async views; Django 5.0's only wraps sync ones"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def async_view(*names, daily=False):
+    """async_login_required plus conditional() for async views
+
+    The DataVersion rows are loaded off the event loop first, so the ETag
+    functions that conditional() runs find them already on the request.
+    """
+    def decorator(view):
+        conditional_view = conditional(*names, daily=daily)(view)
+
+        @async_login_required
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            await sync_to_async(data_versions)(request)
+            return await conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@async_view(*views.DASHBOARD_MODELS, daily=True)
+async def dashboard(request):
+    """Display the main dashboard with key metrics and charts"""
+    today = timezone.now().date()
+    results = await precompute.asingle_flight(
+        precompute.key('dashboard', today, data_versions(request), views.DASHBOARD_MODELS),
+        lambda: run_concurrently(views.dashboard_queries(today)),
+    )
+    context = views.dashboard_context(today, results)
+    # The user and session are already loaded, so rendering need not wait
+    # for the single thread that runs Django's sync middleware
+    return await in_pool(render, request, 'main/dashboard.html', context)
+
+
+@async_view(*views.SALES_SERIES_MODELS, daily=True)
+async def api_sales_data(request):
+    """API endpoint for sales chart data"""
+    labels, values = await in_pool(
+        views.cached_sales_series, request.GET.get('period', 'daily'), timezone.now().date(),
+        data_versions(request),
+    )
+    return fastjson.JSONResponse({
+        'labels': labels,
+        'values': values
+    })
+
+
+@async_view(*views.PERFORMANCE_MODELS, daily=True)
+async def api_employee_performance(request):
+    """API endpoint for employee performance chart data"""
+    period = views.performance_period(request.GET.get('period', 'this_month'))
+    today = timezone.now().date()
+
+    async def compute():
+        return views.performance_payload(await run_concurrently(views.performance_queries(period, today)))
+    return fastjson.JSONResponse(await precompute.asingle_flight(
+        views.performance_key(period, today, data_versions(request)), compute,
+    ))
+
+
+@async_login_required
+async def live_feed(request):
+    """Server-Sent Events: one coroutine per open dashboard instead of a thread"""
+    response = StreamingHttpResponse(
+        events.astream(events.last_event_id(request)), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,51 @@
+"""Initials avatars rendered locally as SVG
+
+The same name always gets the same initials and colour, so the markup can be
+memoized in-process and the /avatar/ responses cached by browsers for a year.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.utils.html import escape
+
+# Bootstrap-ish tones that keep white text readable
+COLORS = (
+    '#0d6efd', '#6610f2', '#6f42c1', '#d63384', '#dc3545', '#fd7e14',
+    '#198754', '#20c997', '#0dcaf0', '#6c757d', '#3d5a80', '#8d6e63',
+)
+MIN_SIZE, MAX_SIZE = 16, 256
+
+
+def initials(name):
+    """First letter of the first two words, or '?' for a blank name"""
+    letters = [word[0] for word in name.split()[:2]]
+    return ''.join(letters).upper() or '?'
+
+
+def avatar_color(name):
+    digest = hashlib.md5(name.strip().lower().encode()).digest()
+    return COLORS[digest[0] % len(COLORS)]
+
+
+def clamp_size(size):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return 40
+    return max(MIN_SIZE, min(MAX_SIZE, size))
+
+
+@lru_cache(maxsize=4096)
+def avatar_svg(name, size=40):
+    """Round initials badge as a standalone SVG document fragment"""
+    size = clamp_size(size)
+    text = escape(initials(name))
+    font_size = round(size * (0.42 if len(text) > 1 else 0.5))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {size} {size}" role="img" aria-label="{escape(name)}">'
+        f'<circle cx="50%" cy="50%" r="50%" fill="{avatar_color(name)}"/>'
+        f'<text x="50%" y="50%" dy=".35em" text-anchor="middle" fill="#fff" '
+        f'font-family="Inter, sans-serif" font-size="{font_size}" font-weight="600">{text}</text>'
+        f'</svg>'
+    )
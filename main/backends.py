@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that keeps the session's User in the cache
+
+    AuthenticationMiddleware resolves request.user through get_user() on
+    every authenticated request; caching it removes that SELECT. Entries
+    are dropped whenever the User row is saved or deleted (main.signals),
+    but only in the cache of the process that wrote it: with a per-process
+    cache, other workers see a password change or deactivation once their
+    entry expires, after at most AUTH_USER_CACHE_SECONDS.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+        elif not self.user_can_authenticate(user):
+            return None
+        return user
@@ -0,0 +1,131 @@
+"""Helpers shared by the benchmark and load-test management commands"""
+import gc
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples_ms):
+    """Latency summary in milliseconds"""
+    return {
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'mean_ms': round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else 0.0,
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+@contextmanager
+def benchmark_database(scale, seed, days=365, keepdb=False, test_name=None, stdout=None):
+    """Create a throwaway test database filled by generate_data, then drop it
+
+    test_name overrides the TEST NAME, e.g. to get an on-disk SQLite file
+    whose locking behaves like production instead of the shared in-memory one.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if test_name:
+        test_settings['NAME'] = str(test_name)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        # Like the test runner: DEBUG query logging would distort every number
+        with override_settings(DEBUG=False):
+            call_command('generate_data', scale=scale, seed=seed, days=days, flush=keepdb, stdout=stdout)
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        test_settings['NAME'] = old_test_name
+
+
+def clear_caches():
+    """Empty every configured cache, the shared precompute table included"""
+    for alias in caches:
+        caches[alias].clear()
+
+
+async def aclear_caches():
+    """clear_caches() for code running on an event loop"""
+    for alias in caches:
+        await caches[alias].aclear()
+
+
+def measure_view(client, url, repeat=20, warmup=2):
+    """Request url repeatedly and return latency, query count and peak memory
+
+    Every request starts from empty caches, outside the timed and counted
+    part, so the numbers are those of a page computed from the database
+    rather than of a cache hit left behind by the previous sample.
+    """
+    for _ in range(warmup):
+        clear_caches()
+        response = client.get(url)
+        # Streaming responses only do their work while being consumed
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    # One instrumented pass for query count and peak allocation; the
+    # timed passes run without tracing so they are not skewed by it.
+    # CaptureQueriesContext diffs the length of a bounded log, so start empty
+    clear_caches()
+    reset_queries()
+    gc.collect()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Read now: the captured list is a slice of a log later requests reset
+    query_count = len(queries)
+
+    samples = []
+    for _ in range(repeat):
+        clear_caches()
+        started = time.perf_counter()
+        timed = client.get(url)
+        if timed.streaming:
+            b''.join(timed.streaming_content)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    result = summarize(samples)
+    result.update({
+        'status': response.status_code,
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+    })
+    return result
+
+
+def compare(results, baseline, threshold, min_delta_ms=1.0):
+    """Return (name, metric, baseline, current) for every regression past threshold"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            slower = current[metric] - previous[metric]
+            # Sub-millisecond jitter on fast views is noise, not a regression
+            if slower > min_delta_ms and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        if current['queries'] > previous['queries']:
+            regressions.append((name, 'queries', previous['queries'], current['queries']))
+    return regressions
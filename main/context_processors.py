@@ -0,0 +1,36 @@
+import hashlib
+from functools import cache
+from pathlib import Path
+
+from django.utils.functional import SimpleLazyObject
+
+from .versioning import data_versions as request_data_versions
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+@cache
+def templates_version():
+    """Short digest of the app's templates, read once per process
+
+    Goes into the fragment cache keys, so a deploy that changes a template
+    stops serving fragments rendered from the old one, even from a shared
+    cache.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(TEMPLATE_DIR.rglob('*.html')):
+        digest.update(str(path.relative_to(TEMPLATE_DIR)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def data_versions(request):
+    """Model change counters and the templates version for fragment cache keys
+
+    The counters are loaded lazily, and shared with the ETag check when the
+    view has one, e.g.
+    {% cache 86400 category_options templates_version data_versions.category %}.
+    """
+    def load():
+        return {name: version for name, (version, _) in request_data_versions(request).items()}
+    return {'data_versions': SimpleLazyObject(load), 'templates_version': templates_version()}
@@ -0,0 +1,189 @@
+"""In-process publish/subscribe behind the dashboard live feed
+
+Write paths call the helpers at the bottom (sale_recorded, stock_moved, ...)
+and the events are delivered once the transaction commits, to every open
+/live/ stream in this process. Payloads are built only when somebody is
+listening, so writes pay nothing while no dashboard is open.
+
+Subscribers are either plain queue.Queue objects, for the sync streaming
+view under WSGI, or asyncio queues fed with call_soon_threadsafe from the
+writer's thread, for the async view under ASGI. With several worker
+processes each one only sees its own writes; put a broker (e.g. Redis
+pub/sub) behind publish() before scaling out.
+"""
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+# Matches the dashboard's "Low Stock Items" card
+LOW_STOCK_LEVEL = 10
+
+_lock = threading.Lock()
+_subscribers = set()
+_event_ids = itertools.count(1)
+# Recent events, replayed to a reconnecting EventSource (Last-Event-ID)
+_history = deque(maxlen=200)
+
+
+class Subscription:
+    """One listener's bounded queue of (id, type, data) events"""
+
+    def __init__(self, loop=None, maxsize=500):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+
+    def put(self, event):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._put, event)
+        else:
+            self._put(event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            # A stalled client loses events; the page resyncs on its next load
+            pass
+
+
+def subscribe(loop=None, last_event_id=None):
+    """Register a listener; pass the running loop for an asyncio queue"""
+    subscription = Subscription(loop)
+    with _lock:
+        _subscribers.add(subscription)
+        missed = [event for event in _history if last_event_id is not None and event[0] > last_event_id]
+    for event in missed:
+        subscription._put(event)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        _subscribers.discard(subscription)
+
+
+def has_subscribers():
+    return bool(_subscribers)
+
+
+def publish(event_type, data):
+    """Deliver an event to every current subscriber immediately"""
+    with _lock:
+        event = (next(_event_ids), event_type, data)
+        _history.append(event)
+        targets = list(_subscribers)
+    for subscription in targets:
+        subscription.put(event)
+
+
+def publish_on_commit(event_type, build):
+    """Publish build() after the current transaction commits, if anyone listens"""
+    def send():
+        if has_subscribers():
+            publish(event_type, build())
+    transaction.on_commit(send)
+
+
+def format_event(event):
+    event_id, event_type, data = event
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def stream(last_event_id=None):
+    """text/event-stream chunks for a sync StreamingHttpResponse
+
+    Ends after LIVE_FEED_MAX_SECONDS so a WSGI thread is not held forever;
+    EventSource reconnects by itself and resumes from Last-Event-ID.
+    """
+    subscription = subscribe(last_event_id=last_event_id)
+    deadline = time.monotonic() + settings.LIVE_FEED_MAX_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                event = subscription.queue.get(timeout=settings.LIVE_FEED_KEEPALIVE)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(event)
+    finally:
+        unsubscribe(subscription)
+
+
+async def astream(last_event_id=None):
+    """The same stream for an async StreamingHttpResponse under ASGI"""
+    subscription = subscribe(loop=asyncio.get_running_loop(), last_event_id=last_event_id)
+    deadline = time.monotonic() + settings.LIVE_FEED_MAX_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.LIVE_FEED_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(event)
+    finally:
+        unsubscribe(subscription)
+
+
+def last_event_id(request):
+    try:
+        return int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        return None
+
+
+def _money(value):
+    """Prices and totals as "12.50" strings, whether the row holds a float (form views) or a Decimal"""
+    return f'{Decimal(str(value)):.2f}'
+
+
+def sale_recorded(sale):
+    def build():
+        product = sale.product
+        return {
+            'id': sale.id,
+            'product': product.name,
+            'category': product.category.name,
+            'employee': sale.employee.name,
+            'quantity': sale.quantity,
+            'price': _money(sale.price),
+            'line_total': _money(sale.line_total),
+            'date_time': timezone.localtime(sale.date_time).strftime('%b %d, %Y %H:%M'),
+        }
+    publish_on_commit('sale', build)
+
+
+def sale_removed(sale):
+    # The id is cleared by sale.delete(); the category is only looked up for listeners
+    sale_id, line_total = sale.id, sale.line_total
+
+    def build():
+        return {'id': sale_id, 'category': sale.product.category.name, 'line_total': _money(line_total)}
+    publish_on_commit('sale_deleted', build)
+
+
+def stock_moved(product, before):
+    """Low-stock transitions and changes to products that stay low"""
+    after = product.stock_quantity
+    if before >= LOW_STOCK_LEVEL and after >= LOW_STOCK_LEVEL:
+        return
+    data = {
+        'product_id': product.id,
+        'product': product.name,
+        'stock': after,
+        'low': after < LOW_STOCK_LEVEL,
+        'was_low': before < LOW_STOCK_LEVEL,
+    }
+    publish_on_commit('stock', lambda: data)
@@ -0,0 +1,36 @@
+"""JSON encoding for API and chart responses
+
+Encodes with orjson, which writes bytes directly and skips the str round
+trip of json.dumps. Decimals become numbers (prices have two places, so a
+float round-trips them), dates and datetimes ISO 8601 strings.
+"""
+import datetime
+from decimal import Decimal
+
+import orjson
+from django.http import HttpResponse
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps(obj):
+    """JSON text, e.g. for embedding chart data in a template"""
+    return dumps_bytes(obj).decode()
+
+
+class JSONResponse(HttpResponse):
+    """JsonResponse built on the fast encoder"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(dumps_bytes(data), **kwargs)
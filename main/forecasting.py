@@ -0,0 +1,137 @@
+"""Demand forecast and reorder suggestions for the whole catalog
+
+Daily unit sales of the last FORECAST_HISTORY_DAYS (today excluded, it is
+not over yet) come back from one grouped query as (product, day, units)
+rows; days without sales are simply absent. The average daily demand of
+every product is then a single weighted np.bincount over those rows, with
+one weight per day age: equal weights for 'sma', exponentially decaying
+ones for 'ewma', normalised so a product selling k units every day has
+demand k. Days of cover and order quantities are array arithmetic over the
+catalog, so no step loops over products in Python.
+
+Products whose stock lasts less than FORECAST_LEAD_TIME_DAYS are stored as
+ReorderSuggestion rows with an order that brings them up to
+FORECAST_LEAD_TIME_DAYS + FORECAST_COVER_DAYS of demand.
+"""
+import datetime
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import archived_until, day_range
+from .models import DataVersion, Inventory, Product, ReorderSuggestion, Sale, SaleRollup
+
+# Product ids per IN (...) lookup, below SQLite's bound-parameter limit
+ID_BATCH = 500
+
+
+def day_weights(days, method='ewma', alpha=0.1):
+    """Weight of each day age (0 = yesterday), summing to 1"""
+    if method == 'sma':
+        weights = np.ones(days)
+    elif method == 'ewma':
+        weights = alpha * (1 - alpha) ** np.arange(days)
+    else:
+        raise ValueError(f"Unknown forecast method {method!r}")
+    return weights / weights.sum()
+
+
+def daily_demand(index, ages, units, size, weights):
+    """Average daily demand per product from sparse (product index, age, units) rows"""
+    return np.bincount(index, weights=units * weights[ages], minlength=size)
+
+
+def reorder_plan(stock, demand, lead_time, cover):
+    """(days of cover, order quantity) arrays; the quantity is 0 where no order is due"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, np.maximum(stock, 0) / demand, np.inf)
+    due = days_of_cover < lead_time
+    quantity = np.where(due, np.ceil(demand * (lead_time + cover) - stock), 0).astype(np.int64)
+    return days_of_cover, quantity
+
+
+def sales_history(start, end):
+    """(product ids, day ages, units) arrays of unit sales per product and day in [start, end]"""
+    rows = list(
+        Sale.objects.filter(**day_range('date_time', start, end))
+        .annotate(day=TruncDate('date_time')).values_list('product_id', 'day')
+        .annotate(units=Sum('quantity')).order_by()
+    )
+    boundary = archived_until()
+    if boundary is not None and boundary >= start:
+        rows += SaleRollup.objects.filter(day__gte=start, day__lte=end).values_list(
+            'product_id', 'day').annotate(units=Sum('quantity')).order_by()
+    count = len(rows)
+    last = end.toordinal()
+    product_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    ages = np.fromiter((last - row[1].toordinal() for row in rows), dtype=np.int64, count=count)
+    units = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+    return product_ids, ages, units
+
+
+def last_suppliers(product_ids):
+    """{product id: supplier id} of each product's latest receipt"""
+    suppliers = {}
+    for index in range(0, len(product_ids), ID_BATCH):
+        latest = (Inventory.objects.filter(product_id__in=product_ids[index:index + ID_BATCH])
+                  .values('product_id').annotate(last=Max('id')).values('last'))
+        suppliers.update(Inventory.objects.filter(id__in=latest).values_list('product_id', 'supplier_id'))
+    return suppliers
+
+
+def forecast(dry_run=False, method=None, days=None):
+    """Recompute every product's demand and replace the reorder suggestions
+
+    Returns a summary dict: products, products with demand, suggestions,
+    units to order and seconds taken.
+    """
+    started = time.perf_counter()
+    method = method or settings.FORECAST_METHOD
+    days = days or settings.FORECAST_HISTORY_DAYS
+    lead_time, cover = settings.FORECAST_LEAD_TIME_DAYS, settings.FORECAST_COVER_DAYS
+    end = timezone.localdate() - datetime.timedelta(days=1)
+
+    catalog = list(Product.objects.order_by('id').values_list('id', 'stock_quantity'))
+    ids = np.fromiter((row[0] for row in catalog), dtype=np.int64, count=len(catalog))
+    stock = np.fromiter((row[1] for row in catalog), dtype=np.float64, count=len(catalog))
+
+    product_ids, ages, units = sales_history(end - datetime.timedelta(days=days - 1), end)
+    index = np.searchsorted(ids, product_ids)
+    # Drop rows of products deleted since the catalog was read
+    known = index < len(ids)
+    known[known] = ids[index[known]] == product_ids[known]
+    demand = daily_demand(index[known], ages[known], units[known], len(ids),
+                          day_weights(days, method, settings.FORECAST_ALPHA))
+    days_of_cover, quantity = reorder_plan(stock, demand, lead_time, cover)
+
+    due = np.flatnonzero(quantity > 0)
+    summary = {
+        'products': len(ids),
+        'with_demand': int(np.count_nonzero(demand)),
+        'suggestions': len(due),
+        'units': int(quantity[due].sum()),
+    }
+    if not dry_run:
+        due_ids = ids[due].tolist()
+        suppliers = last_suppliers(due_ids)
+        now = timezone.now()
+        suggestions = [
+            ReorderSuggestion(
+                product_id=product_id, supplier_id=suppliers.get(product_id),
+                daily_demand=round(float(demand[position]), 3),
+                days_of_cover=round(float(days_of_cover[position]), 1),
+                reorder_quantity=int(quantity[position]), computed_at=now,
+            )
+            for product_id, position in zip(due_ids, due.tolist())
+        ]
+        with transaction.atomic():
+            ReorderSuggestion.objects.all().delete()
+            ReorderSuggestion.objects.bulk_create(suggestions, batch_size=ID_BATCH)
+        DataVersion.bump('reordersuggestion')
+    summary['seconds'] = time.perf_counter() - started
+    return summary
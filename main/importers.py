@@ -0,0 +1,333 @@
+"""Streaming CSV import of products, inventory receipts and sales
+
+The file is read row by row and handled in batches of batch_size rows, so
+memory stays flat however large it is. Each batch costs a fixed number of
+queries: one name lookup per referenced table, one bulk insert or update,
+and for receipts and sales one stock UPDATE covering every product in the
+batch (see services).
+
+Headers are those of the export/ CSVs (case and spaces do not matter), so
+an export can be edited and loaded back; columns the importer does not use,
+such as Total, are ignored. Receipts and sales keep the Date Received and
+Date of their row, read in the current time zone, and are recorded at
+import time when the column is missing or empty. Dates in the future, or
+on days already moved to the sales archive, are row errors.
+
+Receipts and sales are inserted with a plain executemany rather than
+bulk_create (services.record_sales(set_ids=False)), so the imported rows
+carry no ids. What remains is mostly reading and checking the rows: a dry
+run takes about half the time of a real import.
+
+A bad row is reported with its line number and skipped; the other rows of
+its batch are still written.
+"""
+import csv
+import datetime
+import io
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import services
+from .archive import archived_until
+from .models import Category, DataVersion, Employee, Inventory, Product, ProductStock, Sale, Supplier
+
+# Per-batch costs (name lookups, the stock and counter UPDATEs) grow with
+# the products in a batch rather than its rows, so batches are large
+DEFAULT_BATCH_SIZE = 5000
+# Only this many row errors are kept for the report; all of them are counted
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_COLUMNS = {
+    'products': ('name', 'category', 'price'),
+    'inventory': ('product', 'supplier', 'quantity', 'unit_price'),
+    'sales': ('product', 'employee', 'quantity', 'price'),
+}
+KINDS = tuple(REQUIRED_COLUMNS)
+_DATETIME = forms.DateTimeField()
+
+
+class CsvImportError(ValueError):
+    """The file as a whole cannot be imported (wrong columns, not CSV, ...)"""
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportResult:
+    """Counts and row errors of one import"""
+
+    def __init__(self, kind, dry_run=False):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.seconds) if self.seconds else 0
+
+
+def _column(header):
+    return header.strip().lower().replace(' ', '_')
+
+
+def _text(row, name, max_length, required=True):
+    value = (row.get(name) or '').strip()
+    if not value:
+        if required:
+            raise RowError(f'{name} is required')
+        return None
+    if len(value) > max_length:
+        raise RowError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _number(model, row, name, minimum):
+    """Clean a numeric column with the model field, which also checks digits"""
+    value = (row.get(name) or '').strip()
+    if not value:
+        raise RowError(f'{name} is required')
+    try:
+        value = model._meta.get_field(name).clean(value, None)
+    except ValidationError as exc:
+        raise RowError(f"{name}: {' '.join(exc.messages)}")
+    if value < minimum:
+        raise RowError(f'{name} must be at least {minimum}')
+    return value
+
+
+def _moment(row, name, now, archived, zone):
+    """Aware datetime of an optional date column, naive ones read in zone; None when it is empty"""
+    value = (row.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        # Covers the export format; the form field also knows the locale ones
+        value = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            value = _DATETIME.clean(value)
+        except ValidationError:
+            raise RowError(f'{name} is not a date and time such as 2024-01-31 14:05')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, zone)
+    if value > now:
+        raise RowError(f'{name} is in the future')
+    if archived and timezone.localtime(value, zone).date() <= archived:
+        raise RowError(f'{name} falls on {archived} or earlier, which is already archived')
+    return value
+
+
+def _ids_by_name(model, names):
+    """{name: [ids]} for the given names, in one query"""
+    found = defaultdict(list)
+    for pk, name in model.objects.filter(name__in=names).values_list('id', 'name').order_by('id'):
+        found[name].append(pk)
+    return found
+
+
+def _resolve(found, name, label):
+    ids = found.get(name)
+    if not ids:
+        raise RowError(f'{label} "{name}" does not exist')
+    if len(ids) > 1:
+        raise RowError(f'{label} "{name}" matches {len(ids)} records')
+    return ids[0]
+
+
+def _import_products(batch, result, dry_run):
+    """Create products, or update the ones that match on name, size and colour
+
+    Stock is only set for new products (opening stock); existing stock
+    moves through receipts and sales, never by overwriting it.
+    """
+    cleaned = {}
+    for line, row in batch:
+        try:
+            attrs = {
+                'name': _text(row, 'name', 100),
+                'category': _text(row, 'category', 100),
+                'size': _text(row, 'size', 20, required=False),
+                'color': _text(row, 'color', 50, required=False),
+                'price': _number(Product, row, 'price', 0),
+                'stock_quantity': _number(Product, row, 'stock_quantity', 0) if row.get('stock_quantity') else 0,
+            }
+        except RowError as exc:
+            result.error(line, str(exc))
+            continue
+        # A product listed twice in one batch takes its last row
+        cleaned[(attrs['name'], attrs['size'], attrs['color'])] = (line, attrs)
+    if not cleaned:
+        return
+
+    categories = {
+        name: ids[0] for name, ids in
+        _ids_by_name(Category, {attrs['category'] for _, attrs in cleaned.values()}).items()
+    }
+    existing = defaultdict(list)
+    for product in Product.objects.filter(name__in={key[0] for key in cleaned}).order_by('id'):
+        existing[(product.name, product.size or None, product.color or None)].append(product)
+
+    with transaction.atomic():
+        missing = {attrs['category'] for _, attrs in cleaned.values()} - set(categories)
+        if missing and not dry_run:
+            new_categories = Category.objects.bulk_create([Category(name=name) for name in sorted(missing)])
+            categories.update((category.name, category.id) for category in new_categories)
+            DataVersion.bump('category')
+
+        new, changed = [], []
+        now = timezone.now()
+        for key, (line, attrs) in cleaned.items():
+            matches = existing.get(key, [])
+            if len(matches) > 1:
+                result.error(line, f'Product "{key[0]}" matches {len(matches)} records')
+                continue
+            category_id = categories.get(attrs['category'])
+            if matches:
+                product = matches[0]
+                product.category_id = category_id
+                product.price = attrs['price']
+                # bulk_update skips auto_now, so stamp updated_at here
+                product.updated_at = now
+                changed.append(product)
+            else:
+                new.append(Product(
+                    name=attrs['name'], category_id=category_id, size=attrs['size'],
+                    color=attrs['color'], price=attrs['price'], stock_quantity=attrs['stock_quantity'],
+                ))
+        result.created += len(new)
+        result.updated += len(changed)
+        if dry_run or not (new or changed):
+            return
+        Product.objects.bulk_create(new)
+        ProductStock.rebalance([product.pk for product in new])
+        Product.objects.bulk_update(changed, ['category', 'price', 'updated_at'])
+        DataVersion.bump('product')
+
+
+def _import_movements(batch, result, dry_run, model, party_model, party, price, date, date_field):
+    """Receipts (party=supplier) or sales (party=employee) for named products
+
+    The `date` column, when filled in, becomes the `date_field` of the row.
+    """
+    now = timezone.now()
+    archived = archived_until() if any(row.get(date) for _, row in batch) else None
+    # Looked up once: per row it costs more than parsing the date
+    zone = timezone.get_current_timezone()
+    cleaned = []
+    for line, row in batch:
+        try:
+            cleaned.append((line, {
+                'product': _text(row, 'product', 100),
+                party: _text(row, party, 100),
+                'quantity': _number(model, row, 'quantity', 1),
+                price: _number(model, row, price, 0),
+                date_field: _moment(row, date, now, archived, zone) or now,
+            }))
+        except RowError as exc:
+            result.error(line, str(exc))
+    if not cleaned:
+        return
+
+    products = _ids_by_name(Product, {attrs['product'] for _, attrs in cleaned})
+    parties = _ids_by_name(party_model, {attrs[party] for _, attrs in cleaned})
+    new = []
+    for line, attrs in cleaned:
+        try:
+            new.append(model(
+                product_id=_resolve(products, attrs['product'], 'Product'),
+                quantity=attrs['quantity'],
+                **{
+                    f'{party}_id': _resolve(parties, attrs[party], party.title()),
+                    price: attrs[price],
+                    date_field: attrs[date_field],
+                },
+            ))
+        except RowError as exc:
+            result.error(line, str(exc))
+    result.created += len(new)
+    if dry_run or not new:
+        return
+    if model is Sale:
+        services.record_sales(new, notify=False, set_ids=False)
+    else:
+        services.record_receipts(new, set_ids=False)
+
+
+def _import_inventory(batch, result, dry_run):
+    _import_movements(batch, result, dry_run, Inventory, Supplier, 'supplier', 'unit_price',
+                      'date_received', 'date_received')
+
+
+def _import_sales(batch, result, dry_run):
+    _import_movements(batch, result, dry_run, Sale, Employee, 'employee', 'price', 'date', 'date_time')
+
+
+IMPORTERS = {
+    'products': _import_products,
+    'inventory': _import_inventory,
+    'sales': _import_sales,
+}
+
+
+def _rows(reader):
+    """(line number, row) pairs, with file-level problems as CsvImportError"""
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except UnicodeDecodeError:
+        raise CsvImportError(f'Line {reader.line_num + 1}: the file is not UTF-8 text')
+    except csv.Error as exc:
+        raise CsvImportError(f'Line {reader.line_num}: {exc}')
+
+
+def import_csv(kind, stream, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Import a CSV of `kind` (products, inventory or sales) from a text stream
+
+    Returns an ImportResult. dry_run validates and resolves every row
+    without writing anything.
+    """
+    if kind not in IMPORTERS:
+        raise CsvImportError(f"Unknown import type {kind!r}; expected one of {', '.join(KINDS)}")
+    started = time.perf_counter()
+    result = ImportResult(kind, dry_run)
+
+    reader = csv.DictReader(stream)
+    try:
+        headers = reader.fieldnames
+    except UnicodeDecodeError:
+        raise CsvImportError('The file is not UTF-8 text')
+    if not headers:
+        raise CsvImportError('The file is empty')
+    reader.fieldnames = [_column(header) for header in headers]
+    missing = [name for name in REQUIRED_COLUMNS[kind] if name not in reader.fieldnames]
+    if missing:
+        raise CsvImportError(f"Missing columns: {', '.join(missing)}")
+
+    rows = _rows(reader)
+    while batch := list(islice(rows, batch_size)):
+        result.rows += len(batch)
+        IMPORTERS[kind](batch, result, dry_run)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def open_upload(upload):
+    """Text stream over an uploaded file, read in chunks rather than all at once"""
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
@@ -0,0 +1,144 @@
+"""Group commit for sale and receipt submissions (INGEST_QUEUE)
+
+SQLite lets one writer in at a time, so tills posting sales at once mostly
+wait on each other's commits. With INGEST_QUEUE on, the form views and the
+API hand their rows to one writer thread instead. The writer takes
+whatever is queued, up to INGEST_MAX_BATCH submissions, waiting at most
+INGEST_MAX_DELAY_MS after the first one for more. It writes them in one
+transaction through services.record_sales/record_receipts, so stock moves
+in one UPDATE per batch. Each caller returns only after the transaction
+holding its rows has committed.
+
+A larger batch or delay means fewer commits and more throughput, but each
+caller can wait up to INGEST_MAX_DELAY_MS longer. If a batch fails, its
+submissions are retried one by one, so a bad row only fails its own caller.
+
+The queue is per process; several workers each run their own writer.
+"""
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from . import services
+
+logger = logging.getLogger(__name__)
+
+
+class Submission:
+    """Rows from one caller, and the outcome once the writer is done with them"""
+
+    def __init__(self, sales=(), receipts=()):
+        self.sales, self.receipts = list(sales), list(receipts)
+        self.products = {}
+        self.error = None
+        self.done = threading.Event()
+
+
+def write(submissions):
+    """Record the rows of all submissions in one transaction; returns updated products"""
+    sales = [sale for submission in submissions for sale in submission.sales]
+    receipts = [receipt for submission in submissions for receipt in submission.receipts]
+    products = {}
+    with transaction.atomic():
+        if sales:
+            products.update(services.record_sales(sales))
+        if receipts:
+            products.update(services.record_receipts(receipts))
+    return products
+
+
+class GroupCommitWriter:
+    def __init__(self, max_batch=None, max_delay_ms=None):
+        self.max_batch = max_batch or settings.INGEST_MAX_BATCH
+        self.max_delay = (settings.INGEST_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Batches written and submissions in them, for tests and load tests
+        self.batches = 0
+        self.submissions = 0
+
+    def submit(self, sales=(), receipts=()):
+        """Queue rows and wait until they are committed
+
+        Returns the products whose stock the caller's rows changed, as
+        services.record_sales does; re-raises the error if they failed.
+        """
+        submission = Submission(sales, receipts)
+        self.start()
+        self.queue.put(submission)
+        submission.done.wait()
+        if submission.error is not None:
+            raise submission.error
+        return submission.products
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='ingest-writer', daemon=True)
+                self.thread.start()
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            close_old_connections()
+            try:
+                self.commit(batch)
+            except Exception as exc:  # pragma: no cover - commit() reports per submission
+                logger.exception('Ingest writer failed')
+                for submission in batch:
+                    submission.error = submission.error or exc
+            finally:
+                for submission in batch:
+                    submission.done.set()
+
+    def commit(self, batch):
+        try:
+            products = write(batch)
+        except Exception as exc:
+            if not connection.is_usable():
+                connection.close()
+            if len(batch) == 1:
+                batch[0].error = exc
+                return
+            # Find the bad rows: each submission on its own, with the ids
+            # bulk_create handed out before the rollback cleared
+            for submission in batch:
+                for row in submission.sales + submission.receipts:
+                    row.pk = None
+                self.commit([submission])
+            return
+        self.batches += 1
+        self.submissions += len(batch)
+        for submission in batch:
+            ids = {sale.product_id for sale in submission.sales}
+            ids.update(receipt.product_id for receipt in submission.receipts)
+            submission.products = {pk: products[pk] for pk in map(int, ids) if pk in products}
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer():
+    """The process-wide writer, created on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = GroupCommitWriter()
+        return _writer
@@ -0,0 +1,42 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.archive import archive_batch, archive_cutoff
+from main.models import Sale
+
+
+class Command(BaseCommand):
+    help = 'Move sales older than the archive horizon into SaleArchive and daily rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SALES_ARCHIVE_AFTER_DAYS,
+                            help='Keep this many recent days in the hot Sale table')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many sales would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        cutoff_day = archive_cutoff(options['days'])
+        # Whole days only, so a day's rollup is never split between hot and archive
+        cutoff = timezone.make_aware(datetime.datetime.combine(cutoff_day, datetime.time.min))
+        old_sales = Sale.objects.filter(date_time__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{old_sales.count()} sales before {cutoff_day} would be archived')
+            return
+
+        moved = 0
+        while True:
+            batch = list(old_sales.order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            moved += archive_batch(batch)
+            self.stdout.write(f'Archived {moved} sales...')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} sales before {cutoff_day}'))
@@ -0,0 +1,147 @@
+import asyncio
+import importlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches, reverse
+
+from main.benchmarking import aclear_caches, benchmark_database, clear_caches, summarize
+
+from .benchmark_views import VIEWS
+
+BENCHMARK_DB = Path(settings.BASE_DIR) / 'benchmark.sqlite3'
+ASYNC_LABELS = ['dashboard', 'api_sales_daily', 'api_sales_monthly', 'api_employee_performance']
+# cold: each client empties the caches before every request, so the views
+# compute their data (another client may refill them first, as on a busy
+# server); warm: the caches stay filled, so it mostly measures cache reads
+CACHE_MODES = ('cold', 'warm')
+
+
+@contextmanager
+def routed(async_views):
+    """Point the dashboard and chart URLs at the async or the sync views"""
+    import main.urls
+
+    def reload():
+        importlib.reload(main.urls)
+        # The root URLconf holds a resolver for include('main.urls') with its patterns cached
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    try:
+        with override_settings(ASYNC_VIEWS=async_views):
+            reload()
+            yield
+    finally:
+        reload()
+
+
+class Command(BaseCommand):
+    help = 'Compare sync (WSGI) and async (ASGI) dashboard/chart latency under concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Concurrent clients per view')
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Requests per client')
+        parser.add_argument('--views', nargs='*', metavar='LABEL', default=ASYNC_LABELS)
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Dataset size passed to generate_data')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', dest='json_path',
+                            help='Also write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        known = {label: (name, query) for label, name, query in VIEWS}
+        unknown = set(options['views']) - set(ASYNC_LABELS)
+        if unknown:
+            raise CommandError(f"Only these views have async versions: {', '.join(ASYNC_LABELS)}")
+
+        self.stdout.write(f"Loading dataset (scale {options['scale']})...")
+        # An on-disk database, so pool threads get real concurrent connections
+        with benchmark_database(options['scale'], options['seed'],
+                                test_name=BENCHMARK_DB, stdout=self.stdout):
+            user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+            report = {}
+            for label in options['views']:
+                name, query = known[label]
+                url = reverse(name) + (f'?{query}' if query else '')
+                report[label] = {}
+                for cache_mode in CACHE_MODES:
+                    cold = cache_mode == 'cold'
+                    with routed(async_views=False):
+                        report[label][f'wsgi {cache_mode}'] = self.run_sync(
+                            user, url, options['clients'], options['requests'], cold)
+                    with routed(async_views=True):
+                        report[label][f'asgi {cache_mode}'] = asyncio.run(self.run_async(
+                            user, url, options['clients'], options['requests'], cold))
+
+        self.print_report(report, options['clients'])
+        if options['json_path']:
+            Path(options['json_path']).write_text(json.dumps(report, indent=2) + '\n')
+
+    def run_sync(self, user, url, clients, requests, cold):
+        """One thread per client, as a threaded WSGI server would run them
+
+        cold empties the caches before each request, outside its timing.
+        """
+        def worker(_):
+            client = Client()
+            client.force_login(user)
+            client.get(url)  # warm-up
+            latencies = []
+            try:
+                for _ in range(requests):
+                    if cold:
+                        clear_caches()
+                    started = time.perf_counter()
+                    client.get(url)
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            latencies = [ms for result in pool.map(worker, range(clients)) for ms in result]
+        return self.summary(latencies, time.perf_counter() - started)
+
+    async def run_async(self, user, url, clients, requests, cold):
+        """All clients on one event loop, as a single ASGI worker would serve them"""
+        async def worker():
+            client = AsyncClient()
+            await client.aforce_login(user)
+            await client.get(url)  # warm-up
+            latencies = []
+            for _ in range(requests):
+                if cold:
+                    await aclear_caches()
+                started = time.perf_counter()
+                await client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            return latencies
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker() for _ in range(clients)))
+        return self.summary([ms for result in results for ms in result], time.perf_counter() - started)
+
+    def summary(self, latencies, elapsed):
+        return dict(summarize(latencies), throughput_per_s=round(len(latencies) / elapsed, 1))
+
+    def print_report(self, report, clients):
+        self.stdout.write(f'{clients} concurrent clients')
+        self.stdout.write(f"{'view':<28}{'mode':<12}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+        for label, modes in report.items():
+            for mode, stats in modes.items():
+                self.stdout.write(
+                    f"{label:<28}{mode:<12}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                    f"{stats['throughput_per_s']:>10.1f}"
+                )
@@ -0,0 +1,142 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from main.benchmarking import benchmark_database, compare, measure_view
+from main.models import Employee
+
+BENCHMARK_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+# (label, url name, query string) for every page and export we track
+VIEWS = [
+    ('dashboard', 'dashboard', ''),
+    ('products', 'products', ''),
+    ('sales', 'sales', ''),
+    ('sales_this_month', 'sales', 'date_range=this_month'),
+    ('inventory', 'inventory', ''),
+    ('employees', 'employees', ''),
+    ('employee_detail', 'employee_detail', ''),
+    ('reports_sales', 'reports', 'type=sales'),
+    ('reports_inventory', 'reports', 'type=inventory'),
+    ('reports_employee', 'reports', 'type=employee'),
+    ('export_products', 'export_products', ''),
+    ('export_sales', 'export_sales', ''),
+    ('export_inventory', 'export_inventory', ''),
+    ('export_employees', 'export_employees', ''),
+    ('api_sales_daily', 'api_sales_data', 'period=daily'),
+    ('api_sales_weekly', 'api_sales_data', 'period=weekly'),
+    ('api_sales_monthly', 'api_sales_data', 'period=monthly'),
+    ('api_employee_performance', 'api_employee_performance', 'period=this_year'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure per-view latency, query count and memory against a seeded test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Dataset size passed to generate_data')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per view')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--views', nargs='*', metavar='LABEL',
+                            help='Only run these view labels')
+        parser.add_argument('--output', default=str(BENCHMARK_DIR / 'latest.json'))
+        parser.add_argument('--baseline', default=str(BENCHMARK_DIR / 'baseline.json'))
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed slowdown before flagging (0.25 = 25%%)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write the results to the baseline file as well')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        views = VIEWS
+        if options['views']:
+            unknown = set(options['views']) - {label for label, _, _ in VIEWS}
+            if unknown:
+                raise CommandError(f"Unknown view labels: {', '.join(sorted(unknown))}")
+            views = [view for view in VIEWS if view[0] in options['views']]
+
+        self.stdout.write(f"Loading dataset (scale {options['scale']}, seed {options['seed']})...")
+        with benchmark_database(options['scale'], options['seed'],
+                                keepdb=options['keepdb'], stdout=self.stdout):
+            results = self.run_views(views, options['repeat'], options['warmup'])
+
+        report = {
+            'meta': {
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'created': timezone.now().isoformat(timespec='seconds'),
+            },
+            'views': results,
+        }
+        self.write_json(options['output'], report)
+        if options['update_baseline']:
+            self.write_json(options['baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {options['baseline']}"))
+            return
+
+        self.check_baseline(report, options['baseline'], options['threshold'])
+
+    def run_views(self, views, repeat, warmup):
+        user = User.objects.create_superuser('benchmark', password='benchmark')
+        client = Client()
+        client.force_login(user)
+        employee = Employee.objects.order_by('id').first()
+
+        results = {}
+        self.stdout.write(f"{'view':<28}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>11}")
+        for label, url_name, query in views:
+            kwargs = {'employee_id': employee.id} if url_name == 'employee_detail' else {}
+            url = reverse(url_name, kwargs=kwargs)
+            if query:
+                url = f'{url}?{query}'
+            result = measure_view(client, url, repeat=repeat, warmup=warmup)
+            if result['status'] != 200:
+                raise CommandError(f"{label} returned HTTP {result['status']}")
+            results[label] = result
+            self.stdout.write(
+                f"{label:<28}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['queries']:>9}{result['peak_kb']:>11.1f}"
+            )
+        return results
+
+    def write_json(self, path, report):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+
+    def check_baseline(self, report, baseline_path, threshold):
+        baseline_path = Path(baseline_path)
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; rerun with --update-baseline to create one'
+            ))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline['meta'].get('scale') != report['meta']['scale']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded at scale {baseline['meta'].get('scale')}; comparison may be meaningless"
+            ))
+
+        regressions = compare(report['views'], baseline['views'], threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+            return
+        for name, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(f'{name}: {metric} {before} -> {after}'))
+        raise CommandError(f'{len(regressions)} regression(s) past {threshold:.0%} threshold')
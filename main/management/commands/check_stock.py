@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+from main.services import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = 'Compare every product\'s stock with receipts minus sales and report drift; --fix corrects it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Set the drifted products to their ledger stock')
+        parser.add_argument('--show', type=int, default=20,
+                            help='List at most this many drifted products, largest drift first')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift = reconcile_stock(dry_run=not options['fix'])
+        seconds = time.perf_counter() - started
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f'Stock matches the ledger for every product ({seconds:.2f}s)'))
+            return
+
+        worst = sorted(drift.items(), key=lambda item: (-abs(item[1][1] - item[1][0]), item[0]))[:options['show']]
+        names = dict(Product.objects.filter(pk__in=[product_id for product_id, _ in worst]).values_list('id', 'name'))
+        for product_id, (stored, expected) in worst:
+            self.stdout.write(f'{names.get(product_id, product_id)}: stock {stored}, ledger {expected} '
+                              f'({expected - stored:+d})')
+        units = sum(abs(expected - stored) for stored, expected in drift.values())
+        if options['fix']:
+            summary = f'{len(drift)} products corrected ({units} units of drift)'
+        else:
+            summary = f'{len(drift)} products drifted ({units} units); run with --fix to correct them'
+        self.stdout.write(self.style.WARNING(f'{summary} in {seconds:.2f}s'))
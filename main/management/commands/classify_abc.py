@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.abc import classify
+
+
+class Command(BaseCommand):
+    help = 'Classify products into A/B/C revenue tiers; meant to run daily (e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Revenue period in days (default: ABC_PERIOD_DAYS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the tiers, leave the products as they are')
+
+    def handle(self, *args, **options):
+        counts, changed = classify(options['days'], dry_run=options['dry_run'])
+        summary = ', '.join(f'{tier}: {count}' for tier, count in counts.items())
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(f'{summary} ({changed} products {verb} tier)'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.forecasting import forecast
+
+
+class Command(BaseCommand):
+    help = 'Forecast daily demand for every product and refresh the reorder suggestions; run daily'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=['ewma', 'sma'], default=None,
+                            help='Smoothing method (default: FORECAST_METHOD)')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days of sales history (default: FORECAST_HISTORY_DAYS)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report, leave the stored suggestions as they are')
+
+    def handle(self, *args, **options):
+        summary = forecast(dry_run=options['dry_run'], method=options['method'], days=options['days'])
+        verb = 'would be suggested' if options['dry_run'] else 'suggested'
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['products']} products, {summary['with_demand']} with demand: "
+            f"{summary['suggestions']} reorders {verb} ({summary['units']} units) "
+            f"in {summary['seconds']:.2f}s"
+        ))
@@ -0,0 +1,307 @@
+import datetime
+import random
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from main.models import DataVersion, Employee, Category, Location, Product, ProductStock, Supplier, Inventory, Sale
+from main.services import reconcile_sales_counters
+
+# Row counts at --scale 1 (the sizes populate_data.py used to create)
+BASE_COUNTS = {
+    'employees': 50,
+    'suppliers': 100,
+    'products': 1000,
+    'receipts': 2000,
+    'sales': 1000,
+}
+
+CATEGORIES = ['Men', 'Women', 'Kids', 'Accessories', 'Shoes']
+SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+DEFAULT_PASSWORD = 'password123'
+
+# Relative sale volume per weekday (Mon..Sun) and per opening hour
+WEEKDAY_WEIGHTS = [0.8, 0.85, 0.9, 1.0, 1.2, 1.5, 1.3]
+HOUR_WEIGHTS = {
+    9: 2, 10: 4, 11: 6, 12: 9, 13: 9, 14: 6, 15: 5,
+    16: 6, 17: 8, 18: 10, 19: 9, 20: 6, 21: 3,
+}
+
+
+@contextmanager
+def keep_explicit_dates(*fields):
+    """Let bulk_create store our timestamps instead of auto_now_add ones"""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic fake dataset with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplier for the default row counts (1 = ~4k rows)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed; the same seed always produces the same data')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread sales and receipts over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per INSERT statement')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete existing ERP data (and employee users) first')
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError('--scale must be positive')
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker()
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) \
+            - datetime.timedelta(days=self.days)
+
+        counts = {
+            name: max(1, round(base * options['scale']))
+            for name, base in BASE_COUNTS.items()
+        }
+
+        with transaction.atomic(), keep_explicit_dates(Employee._meta.get_field('date_joined')):
+            if options['flush']:
+                self.flush()
+            employees = self.create_employees(counts['employees'])
+            categories = self.create_categories()
+            suppliers = self.create_suppliers(counts['suppliers'])
+            products = self.create_products(counts['products'], categories)
+            receipts, sales = self.create_movements(
+                products, suppliers, employees, counts['receipts'], counts['sales'],
+            )
+            # bulk_create skips save(), so build the sales counters in one pass
+            reconcile_sales_counters()
+            # ... and invalidate cached pages explicitly
+            DataVersion.bump('employee', 'category', 'supplier', 'product', 'inventory', 'sale')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(employees)} employees, {len(suppliers)} suppliers, "
+            f"{len(products)} products, {receipts} receipts and {sales} sales"
+        ))
+
+    def flush(self):
+        self.stdout.write('Deleting existing data...')
+        Sale.objects.all().delete()
+        Inventory.objects.all().delete()
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+        Supplier.objects.all().delete()
+        User.objects.filter(employee__isnull=False, is_superuser=False).delete()
+        Employee.objects.all().delete()
+
+    def create_employees(self, n):
+        self.stdout.write('Creating employees...')
+        fake = self.fake
+        # Hash once: every generated account shares the same password
+        password = make_password(DEFAULT_PASSWORD)
+        taken = set(User.objects.values_list('username', flat=True))
+
+        users = []
+        for i in range(n):
+            username = fake.user_name()
+            if username in taken:
+                username = f'{username}{i}'
+            taken.add(username)
+            users.append(User(username=username, email=fake.email(), password=password))
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        if users and users[0].pk is None:
+            # Backends that cannot return ids from bulk inserts
+            ids = dict(User.objects.filter(
+                username__in=[u.username for u in users]
+            ).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+
+        employees = [
+            Employee(
+                user=user,
+                name=fake.name(),
+                position=fake.job()[:100],
+                phone=fake.phone_number()[:20],
+                email=user.email,
+                date_joined=(self.start - datetime.timedelta(days=self.rng.randint(0, 3 * 365))).date(),
+            )
+            for user in users
+        ]
+        return Employee.objects.bulk_create(employees, batch_size=self.batch_size)
+
+    def create_categories(self):
+        self.stdout.write('Creating categories...')
+        existing = {c.name: c for c in Category.objects.filter(name__in=CATEGORIES)}
+        missing = [Category(name=name) for name in CATEGORIES if name not in existing]
+        Category.objects.bulk_create(missing)
+        if missing and missing[0].pk is None:
+            existing = {c.name: c for c in Category.objects.filter(name__in=CATEGORIES)}
+        else:
+            existing.update((c.name, c) for c in missing)
+        return [existing[name] for name in CATEGORIES]
+
+    def create_suppliers(self, n):
+        self.stdout.write('Creating suppliers...')
+        fake = self.fake
+        suppliers = [
+            Supplier(
+                name=fake.company()[:100],
+                contact_person=fake.name(),
+                phone=fake.phone_number()[:20],
+                email=fake.company_email(),
+                address=fake.address(),
+            )
+            for _ in range(n)
+        ]
+        suppliers = Supplier.objects.bulk_create(suppliers, batch_size=self.batch_size)
+        if suppliers and suppliers[0].pk is None:
+            suppliers = list(Supplier.objects.order_by('-id')[:n])
+        return suppliers
+
+    def create_products(self, n, categories):
+        self.stdout.write('Creating products...')
+        rng = self.rng
+        # Small vocabularies keep Faker out of the per-row loop
+        words = [self.fake.word().capitalize() for _ in range(300)]
+        colors = [self.fake.color_name() for _ in range(60)]
+
+        products = [
+            Product(
+                name=f'{rng.choice(words)} {rng.choice(colors)}',
+                category=rng.choice(categories),
+                size=rng.choice(SIZES),
+                color=rng.choice(colors),
+                price=Decimal(rng.randint(1000, 20000)) / 100,
+                stock_quantity=0,
+            )
+            for _ in range(n)
+        ]
+        products = Product.objects.bulk_create(products, batch_size=self.batch_size)
+        if products and products[0].pk is None:
+            products = list(Product.objects.order_by('-id')[:n])[::-1]
+        return products
+
+    def create_movements(self, products, suppliers, employees, n_receipts, n_sales):
+        """Create receipts and sales day by day, tracking stock so it never goes negative"""
+        self.stdout.write('Creating receipts and sales...')
+        rng = self.rng
+        days = self.days
+        stock = [0] * len(products)
+        # Everything is booked at the default location
+        self.location_id = Location.default_id()
+
+        # Popular products sell much more often than the long tail
+        popularity = list(range(len(products)))
+        rng.shuffle(popularity)
+        product_weights = cumulative(1 / (rank + 1) ** 0.8 for rank in popularity)
+
+        # Busier weekends and a slow upward trend across the period
+        day_weights = cumulative(
+            WEEKDAY_WEIGHTS[(self.start + datetime.timedelta(days=d)).weekday()] * (0.7 + 0.6 * d / days)
+            for d in range(days)
+        )
+        hours = list(HOUR_WEIGHTS)
+        hour_weights = cumulative(HOUR_WEIGHTS.values())
+
+        sales_per_day = Counter(rng.choices(range(days), cum_weights=day_weights, k=n_sales))
+        receipts_per_day = Counter(rng.choices(range(days), k=max(0, n_receipts - len(products))))
+
+        # Every product starts with an opening receipt so stock always matches the ledger
+        opening = []
+        for index, product in enumerate(products):
+            quantity = rng.randint(20, 100)
+            stock[index] += quantity
+            opening.append(self.make_receipt(product, rng.choice(suppliers), quantity, self.start))
+        Inventory.objects.bulk_create(opening, batch_size=self.batch_size)
+        receipt_count = len(opening)
+        sale_count = 0
+
+        receipt_batch = []
+        sale_batch = []
+        for day in range(days):
+            day_start = self.start + datetime.timedelta(days=day)
+            events = []
+            for _ in range(receipts_per_day[day]):
+                events.append((rng.randint(7 * 3600, 10 * 3600), 'receipt'))
+            day_hours = rng.choices(hours, cum_weights=hour_weights, k=sales_per_day[day])
+            for hour in day_hours:
+                events.append((hour * 3600 + rng.randint(0, 3599), 'sale'))
+            events.sort()
+
+            for offset, kind in events:
+                when = day_start + datetime.timedelta(seconds=offset)
+                index = rng.choices(range(len(products)), cum_weights=product_weights)[0]
+                product = products[index]
+                if kind == 'receipt':
+                    quantity = rng.randint(1, 50)
+                    stock[index] += quantity
+                    receipt_batch.append(self.make_receipt(product, rng.choice(suppliers), quantity, when))
+                elif stock[index] > 0:
+                    quantity = rng.randint(1, min(2, stock[index]))
+                    stock[index] -= quantity
+                    sale_batch.append(Sale(
+                        product=product,
+                        employee=rng.choice(employees),
+                        quantity=quantity,
+                        price=product.price,
+                        location_id=self.location_id,
+                        date_time=when,
+                    ))
+
+            if len(receipt_batch) >= self.batch_size:
+                receipt_count += len(Inventory.objects.bulk_create(receipt_batch))
+                receipt_batch = []
+            if len(sale_batch) >= self.batch_size:
+                sale_count += len(Sale.objects.bulk_create(sale_batch))
+                sale_batch = []
+
+        receipt_count += len(Inventory.objects.bulk_create(receipt_batch, batch_size=self.batch_size))
+        sale_count += len(Sale.objects.bulk_create(sale_batch, batch_size=self.batch_size))
+
+        # executemany is far cheaper than bulk_update's CASE expression for every row
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {Product._meta.db_table} SET stock_quantity = %s WHERE id = %s',
+                [(quantity, product.pk) for product, quantity in zip(products, stock)],
+            )
+        ProductStock.rebalance()
+        return receipt_count, sale_count
+
+    def make_receipt(self, product, supplier, quantity, when):
+        return Inventory(
+            product=product,
+            supplier=supplier,
+            quantity=quantity,
+            unit_price=(product.price * Decimal('0.6')).quantize(Decimal('0.01')),
+            location_id=self.location_id,
+            date_received=when,
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importers import DEFAULT_BATCH_SIZE, KINDS, CsvImportError, import_csv
+
+
+class Command(BaseCommand):
+    help = 'Import products, inventory receipts or sales from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help='CSV file with the same headers as the export')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without writing anything')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_csv(options['kind'], stream, options['batch_size'], options['dry_run'])
+        except (OSError, CsvImportError) as exc:
+            raise CommandError(str(exc))
+
+        for line, message in result.errors:
+            self.stderr.write(f'Line {line}: {message}')
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... and {result.failed - len(result.errors)} more errors')
+
+        prefix = 'Dry run: ' if result.dry_run else ''
+        summary = (f'{prefix}{result.rows} rows in {result.seconds:.2f}s ({result.rows_per_second} rows/s): '
+                   f'{result.created} created, {result.updated} updated, {result.failed} failed')
+        style = self.style.WARNING if result.failed else self.style.SUCCESS
+        self.stdout.write(style(summary))
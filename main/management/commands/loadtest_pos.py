@@ -0,0 +1,243 @@
+import http.cookiejar
+import json
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main import ingest
+from main.benchmarking import benchmark_database, summarize
+from main.models import Employee, Product, Supplier, Inventory, Sale
+
+LOADTEST_DB = Path(settings.BASE_DIR) / 'loadtest.sqlite3'
+
+
+def ledger_snapshot():
+    """Stock plus received and sold totals per product, in three queries"""
+    received = dict(Inventory.objects.values_list('product').annotate(Sum('quantity')))
+    sold = dict(Sale.objects.values_list('product').annotate(Sum('quantity')))
+    return {
+        pk: (stock, received.get(pk, 0), sold.get(pk, 0))
+        for pk, stock in Product.objects.values_list('id', 'stock_quantity')
+    }
+
+
+def stock_drift(before, after):
+    """Products whose stock moved differently from the rows recorded meanwhile"""
+    drift = {}
+    for pk, (stock, received, sold) in after.items():
+        old_stock, old_received, old_sold = before.get(pk, (0, 0, 0))
+        expected = old_stock + (received - old_received) - (sold - old_sold)
+        if stock != expected:
+            drift[pk] = stock - expected
+    return drift
+
+
+class LocalTill:
+    """Posts forms straight into the WSGI handler through the test client"""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def post(self, path, data):
+        try:
+            response = self.client.post(path, data)
+        except OperationalError as exc:
+            return 'locked' if 'locked' in str(exc) else 'error'
+        finally:
+            # Each till runs in its own thread and owns its connection
+            connection.close()
+        return 'ok' if response.status_code == 302 else 'error'
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class RemoteTill:
+    """Logs in to a running server and posts forms over HTTP"""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect,
+        )
+        self.opener.open(self.base_url + reverse('login')).read()
+        if self.post(reverse('login'), {'username': username, 'password': password}) != 'ok':
+            raise CommandError(f'Could not log in to {self.base_url} as {username}')
+
+    def csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def post(self, path, data):
+        token = self.csrf_token()
+        body = urllib.parse.urlencode(dict(data, csrfmiddlewaretoken=token)).encode()
+        request = urllib.request.Request(
+            self.base_url + path, data=body,
+            headers={'X-CSRFToken': token, 'Referer': self.base_url + path},
+        )
+        try:
+            self.opener.open(request, timeout=30).read()
+        except urllib.error.HTTPError as exc:
+            if exc.code == 302:
+                return 'ok'
+            # A locked SQLite database surfaces as a 500 from the server
+            return 'locked' if exc.code >= 500 else 'error'
+        except urllib.error.URLError:
+            return 'error'
+        return 'error'
+
+
+class Command(BaseCommand):
+    help = 'Simulate concurrent tills posting sales and receipts, then report stock drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Concurrent simulated tills')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Submissions per till')
+        parser.add_argument('--receipt-ratio', type=float, default=0.2,
+                            help='Share of submissions that are inventory receipts')
+        parser.add_argument('--hot-products', type=int, default=0,
+                            help='Only sell the N best-stocked products to provoke contention (0 = all)')
+        parser.add_argument('--max-retries', type=int, default=5,
+                            help='Retries per submission after a lock error')
+        parser.add_argument('--url',
+                            help='Target a running server (e.g. http://127.0.0.1:8000) instead of the in-process app')
+        parser.add_argument('--username', default='admin')
+        parser.add_argument('--password', default='admin')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='In-process mode: dataset size for the throwaway database')
+        parser.add_argument('--group-commit', action='store_true',
+                            help='In-process mode: send submissions through the main.ingest writer')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', dest='json_path',
+                            help='Also write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            # The server must share our database for the drift check to mean anything
+            database = nullcontext()
+        else:
+            self.stdout.write(f"Loading dataset (scale {options['scale']})...")
+            database = benchmark_database(options['scale'], options['seed'],
+                                          test_name=LOADTEST_DB, stdout=self.stdout)
+
+        group_commit = override_settings(INGEST_QUEUE=True) if options['group_commit'] else nullcontext()
+        with database, group_commit:
+            report = self.run(options)
+
+        self.print_report(report)
+        if options['json_path']:
+            Path(options['json_path']).write_text(json.dumps(report, indent=2) + '\n')
+
+    def run(self, options):
+        products = Product.objects.filter(stock_quantity__gt=0).order_by('-stock_quantity')
+        if options['hot_products']:
+            products = products[:options['hot_products']]
+        products = list(products.values_list('id', 'price'))
+        employees = list(Employee.objects.values_list('id', flat=True))
+        suppliers = list(Supplier.objects.values_list('id', flat=True))
+        if not (products and employees and suppliers):
+            raise CommandError('Need products in stock, employees and suppliers; run generate_data first')
+
+        if options['url']:
+            make_till = lambda: RemoteTill(options['url'], options['username'], options['password'])
+        else:
+            user, _ = User.objects.get_or_create(username='loadtest', defaults={'is_staff': True})
+            make_till = lambda: LocalTill(user)
+
+        def till(number):
+            rng = random.Random(options['seed'] + number)
+            session = make_till()
+            stats = {'latencies': [], 'ok': 0, 'failed': 0, 'lock_retries': 0, 'sales': 0, 'receipts': 0}
+            for _ in range(options['requests']):
+                product_id, price = rng.choice(products)
+                if rng.random() < options['receipt_ratio']:
+                    kind, path = 'receipts', reverse('add_inventory')
+                    data = {'product': product_id, 'supplier': rng.choice(suppliers),
+                            'quantity': rng.randint(5, 20), 'unit_price': price}
+                else:
+                    kind, path = 'sales', reverse('add_sale')
+                    data = {'product': product_id, 'employee': rng.choice(employees),
+                            'quantity': rng.randint(1, 2), 'price': price}
+
+                started = time.perf_counter()
+                for attempt in range(options['max_retries'] + 1):
+                    outcome = session.post(path, data)
+                    if outcome != 'locked' or attempt == options['max_retries']:
+                        break
+                    stats['lock_retries'] += 1
+                    time.sleep(0.01 * 2 ** attempt * rng.random())
+                stats['latencies'].append((time.perf_counter() - started) * 1000)
+                if outcome == 'ok':
+                    stats['ok'] += 1
+                    stats[kind] += 1
+                else:
+                    stats['failed'] += 1
+            return stats
+
+        before = ledger_snapshot()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            results = list(pool.map(till, range(options['clients'])))
+        elapsed = time.perf_counter() - started
+        drift = stock_drift(before, ledger_snapshot())
+
+        latencies = [ms for stats in results for ms in stats['latencies']]
+        if settings.INGEST_QUEUE:
+            writer = ingest.writer()
+            group_commit = {'batches': writer.batches, 'submissions': writer.submissions}
+        else:
+            group_commit = None
+        totals = {key: sum(stats[key] for stats in results)
+                  for key in ('ok', 'failed', 'lock_retries', 'sales', 'receipts')}
+        return dict(
+            totals,
+            clients=options['clients'],
+            elapsed_s=round(elapsed, 3),
+            throughput_per_s=round(totals['ok'] / elapsed, 1) if elapsed else 0.0,
+            latency=summarize(latencies),
+            group_commit=group_commit,
+            drifted_products=len(drift),
+            total_drift_units=sum(abs(units) for units in drift.values()),
+            drift_sample={str(pk): units for pk, units in list(drift.items())[:20]},
+        )
+
+    def print_report(self, report):
+        latency = report['latency']
+        self.stdout.write(
+            f"{report['clients']} tills, {report['ok']} committed "
+            f"({report['sales']} sales, {report['receipts']} receipts), {report['failed']} failed "
+            f"in {report['elapsed_s']}s -> {report['throughput_per_s']}/s"
+        )
+        self.stdout.write(
+            f"latency p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms, "
+            f"max {latency['max_ms']:.1f} ms; lock retries: {report['lock_retries']}"
+        )
+        if report['group_commit']:
+            batches = report['group_commit']['batches']
+            submissions = report['group_commit']['submissions']
+            self.stdout.write(f"group commit: {submissions} submissions in {batches} transactions")
+        if report['drifted_products']:
+            self.stdout.write(self.style.ERROR(
+                f"Stock drift on {report['drifted_products']} products "
+                f"({report['total_drift_units']} units lost or gained)"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('No stock drift'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Product
+from main.services import reconcile_sales_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-product sales counters from the sales and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report drift, leave the counters as they are')
+        parser.add_argument('--show', type=int, default=20,
+                            help='List at most this many drifted products')
+
+    def handle(self, *args, **options):
+        drift = reconcile_sales_counters(dry_run=options['dry_run'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Sales counters match the sales'))
+            return
+
+        names = dict(Product.objects.filter(pk__in=list(drift)[:options['show']]).values_list('id', 'name'))
+        for product_id, (stored, actual) in list(drift.items())[:options['show']]:
+            self.stdout.write(
+                f'{names.get(product_id, product_id)}: units {stored[0]} -> {actual[0]}, '
+                f'revenue {stored[1]} -> {actual[1]}'
+            )
+        units = sum(abs(actual[0] - stored[0]) for stored, actual in drift.values())
+        verb = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.WARNING(
+            f'{len(drift)} counters {verb} ({units} units of drift)'
+        ))
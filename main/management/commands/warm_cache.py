@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.precompute import warm
+
+
+class Command(BaseCommand):
+    help = 'Compute the shared dashboard and chart cache entries ahead of the first requests; run after a deploy'
+
+    def handle(self, *args, **options):
+        if settings.CACHES[settings.PRECOMPUTE_CACHE]['BACKEND'].endswith('LocMemCache'):
+            raise CommandError(
+                f'The {settings.PRECOMPUTE_CACHE!r} cache is per process, so the web workers would not see '
+                'what this command computes; use WARM_CACHE_ON_STARTUP instead'
+            )
+        # The dropdown fragments live in each process's own cache
+        timings = warm(fragments=False)
+        for name, seconds in timings:
+            self.stdout.write(f'{name}: {seconds * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {len(timings)} entries in {sum(seconds for _, seconds in timings):.2f}s'
+        ))
@@ -0,0 +1,255 @@
+"""In-process metrics, served at /metrics in the Prometheus text format
+
+MetricsMiddleware counts every request by URL name, with its latency,
+queries and DB time; the default cache backend counts hits and misses;
+export views add the bytes they sent. Updates are a dict increment under
+one lock, cheap enough to leave on. Business gauges (low stock, sales per
+minute) are read from the database when /metrics is scraped.
+
+Each worker process keeps its own numbers, so scrape every process (or sum
+them in the query) when running several.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .events import LOW_STOCK_LEVEL
+from .middleware import add_execute_wrapper
+from .models import Product, Sale
+
+# Latency buckets in seconds, upper bounds as in Prometheus' "le"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Sales per minute are averaged over this many minutes
+SALES_RATE_MINUTES = 5
+
+_lock = threading.Lock()
+_metrics = []
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = defaultdict(int)
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] += amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # Per label set: [count per bucket..., count above the last bucket], sum
+        self.counts = {}
+        self.sums = defaultdict(float)
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.counts.get(labels)
+            if counts is None:
+                counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self.sums[labels] += value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labels + ('le',)
+        for labels, counts in sorted(self.counts.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {total}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_number(self.sums[labels])}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {total}'
+
+
+class Gauge:
+    """A value computed when /metrics is scraped"""
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+        _metrics.append(self)
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} gauge'
+        yield f'{self.name} {_number(self.read())}'
+
+
+REQUESTS = Counter('erp_http_requests_total', 'Requests by URL name, method and status class',
+                   ('view', 'method', 'status'))
+LATENCY = Histogram('erp_http_request_duration_seconds', 'Request latency by URL name', ('view',))
+QUERIES = Counter('erp_db_queries_total', 'Database queries by URL name', ('view',))
+DB_SECONDS = Counter('erp_db_query_seconds_total', 'Time spent in database queries by URL name', ('view',))
+CACHE_REQUESTS = Counter('erp_cache_requests_total', 'Cache lookups by result', ('result',))
+EXPORT_BYTES = Counter('erp_export_bytes_total', 'Bytes sent by the export views', ('view',))
+
+
+def cache_hit_ratio():
+    hits = CACHE_REQUESTS.values.get(('hit',), 0)
+    total = hits + CACHE_REQUESTS.values.get(('miss',), 0)
+    return round(hits / total, 4) if total else 0.0
+
+
+def sales_per_minute():
+    since = timezone.now() - timedelta(minutes=SALES_RATE_MINUTES)
+    return round(Sale.objects.filter(date_time__gte=since).count() / SALES_RATE_MINUTES, 2)
+
+
+Gauge('erp_cache_hit_ratio', 'Share of cache lookups that were hits', cache_hit_ratio)
+Gauge('erp_low_stock_products', f'Products with fewer than {LOW_STOCK_LEVEL} units in stock',
+      lambda: Product.objects.filter(stock_quantity__lt=LOW_STOCK_LEVEL).count())
+Gauge('erp_sales_per_minute', f'Sales per minute over the last {SALES_RATE_MINUTES} minutes', sales_per_minute)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.lines())
+    return '\n'.join(lines) + '\n'
+
+
+class CountingLocMemCache(LocMemCache):
+    """LocMemCache that counts hits and misses for erp_cache_requests_total"""
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        if value is self._missing:
+            CACHE_REQUESTS.inc('miss')
+            return default
+        CACHE_REQUESTS.inc('hit')
+        return value
+
+
+class _QueryTimer:
+    """Adds up a request's queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+_timer = ContextVar('metrics_query_timer', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    """execute_wrapper on every connection; counts for the request being served, if any"""
+    timer = _timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def _counted(chunks, view):
+    for chunk in chunks:
+        EXPORT_BYTES.inc(view, amount=len(chunk))
+        yield chunk
+
+
+class MetricsMiddleware:
+    """Counts, latency and queries of every request; sync and async capable (see main.middleware)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        add_execute_wrapper(_time_query)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        token = _timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.record(request, response, time.perf_counter() - started, timer)
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        token = _timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.record(request, response, time.perf_counter() - started, timer)
+
+    def record(self, request, response, elapsed, timer):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        REQUESTS.inc(view, request.method, f'{response.status_code // 100}xx')
+        LATENCY.observe(elapsed, view)
+        if timer.count:
+            QUERIES.inc(view, amount=timer.count)
+            DB_SECONDS.inc(view, amount=timer.seconds)
+        if view.startswith('export_'):
+            if response.streaming:
+                response.streaming_content = _counted(response.streaming_content, view)
+            else:
+                EXPORT_BYTES.inc(view, amount=len(response.content))
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint
+
+    Needs "Authorization: Bearer <METRICS_TOKEN>" when a token is set, and a
+    logged-in staff user otherwise; the gauges query the database and show
+    business figures, so it is never open to anyone.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    elif not request.user.is_staff:
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
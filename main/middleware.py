@@ -0,0 +1,60 @@
+"""Plumbing for the project's middleware under both WSGI and ASGI
+
+A sync-only middleware anywhere in MIDDLEWARE makes Django run every
+request through its single thread-sensitive executor under ASGI, so async
+views stop running concurrently. The project's middleware is therefore
+sync and async capable, WhiteNoise included through AsyncWhiteNoiseMiddleware.
+
+Per-request query hooks cannot use connection.execute_wrapper() under
+ASGI: connections belong to threads, and an async request's queries run on
+executor threads the middleware never sees. add_execute_wrapper() installs
+a hook on every connection instead, and the hook finds its request through
+a ContextVar, which sync_to_async carries into those threads.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+def add_execute_wrapper(wrapper):
+    """Run wrapper around every query of every connection, in any thread, from now on"""
+    def install(connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False, dispatch_uid=f'execute-wrapper-{id(wrapper)}')
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that lets async requests through without a thread hop
+
+    Static files are looked up in WhiteNoise's in-memory index and served
+    as before. Under ASGI Django reads the file in a thread before sending
+    it, which is fine for the app's small assets; put a web server in front
+    for anything large.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks at the filesystem, so off the event loop
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
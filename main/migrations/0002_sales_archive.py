@@ -0,0 +1,55 @@
+# Generated by Django 5.0 on 2026-10-19 13:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='SaleArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date_time', models.DateTimeField()),
+                ('period', models.IntegerField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.employee')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date_time'], name='main_salear_date_ti_7202bb_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sale_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('line_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.employee')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='main_salero_day_167100_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salerollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'employee'), name='unique_sale_rollup'),
+        ),
+    ]
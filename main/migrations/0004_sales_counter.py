@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-19 14:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Max, Sum
+
+
+def fill_counters(apps, schema_editor):
+    SalesCounter = apps.get_model('main', 'SalesCounter')
+    counters = {}
+    for model_name in ('Sale', 'SaleArchive'):
+        rows = apps.get_model('main', model_name).objects.values('product').annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            last=Max('date_time'),
+        ).order_by()
+        for row in rows:
+            counter = counters.setdefault(row['product'], SalesCounter(product_id=row['product']))
+            counter.units_sold += row['units']
+            counter.revenue += row['revenue']
+            counter.last_sold_at = max(filter(None, (counter.last_sold_at, row['last'])))
+    SalesCounter.objects.bulk_create(counters.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesCounter',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_counter', serialize=False, to='main.product')),
+                ('units_sold', models.IntegerField(db_index=True, default=0)),
+                ('revenue', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=14)),
+                ('last_sold_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0 on 2026-10-19 14:30
+
+import main.models
+from django.db import migrations, models
+from django.db.models import F, Max, Min
+from django.db.models.functions import Round
+
+BATCH_SIZE = 10000
+
+
+def fill_line_totals(apps, schema_editor):
+    """quantity * price for existing rows, one id range per UPDATE"""
+    for model_name, field, price in (
+        ('Sale', 'line_total', 'price'),
+        ('SaleArchive', 'line_total', 'price'),
+        ('Inventory', 'line_value', 'unit_price'),
+    ):
+        rows = apps.get_model('main', model_name).objects
+        bounds = rows.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            rows.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+                **{field: Round(F('quantity') * F(price), 2)}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_sales_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='line_value',
+            field=main.models.LineTotalField(decimal_places=2, default=0, editable=False, max_digits=14, price='unit_price'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='line_total',
+            field=main.models.LineTotalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='salearchive',
+            name='line_total',
+            field=main.models.LineTotalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(fill_line_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date_time', 'line_total'], name='sale_date_line_total'),
+        ),
+    ]
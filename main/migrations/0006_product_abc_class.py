@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_line_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='abc_class',
+            field=models.CharField(blank=True, choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], db_index=True, default='', editable=False, max_length=1),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_product_abc_class'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder', serialize=False, to='main.product')),
+                ('daily_demand', models.FloatField()),
+                ('days_of_cover', models.FloatField(db_index=True)),
+                ('reorder_quantity', models.IntegerField()),
+                ('computed_at', models.DateTimeField()),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.supplier')),
+            ],
+        ),
+    ]
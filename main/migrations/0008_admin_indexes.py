@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_reorder_suggestion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='date_received',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0 on 2026-10-19 14:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+BATCH_SIZE = 10000
+
+
+def book_at_default_location(apps, schema_editor):
+    """Existing sales, receipts and stock all belong to DEFAULT_LOCATION"""
+    location = apps.get_model('main', 'Location').objects.get_or_create(name=settings.DEFAULT_LOCATION)[0]
+    for model_name in ('Sale', 'Inventory'):
+        rows = apps.get_model('main', model_name).objects
+        bounds = rows.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            rows.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(location=location)
+
+    ProductStock = apps.get_model('main', 'ProductStock')
+    products = apps.get_model('main', 'Product').objects.values_list('id', 'stock_quantity')
+    ProductStock.objects.bulk_create(
+        (ProductStock(product_id=pk, location=location, quantity=stock) for pk, stock in products.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.location'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.location'),
+        ),
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='main.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', 'quantity'], name='stock_location_quantity')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productstock',
+            constraint=models.UniqueConstraint(fields=('product', 'location'), name='unique_product_stock'),
+        ),
+        migrations.RunPython(book_at_default_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-19 15:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_locations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='date_received',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='date_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,7 +1,124 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import stocktotals
+
+class DataVersion(models.Model):
+    """Change counter per model; ETags and caches are keyed on it"""
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def bump(cls, *names):
+        """Increment the counters for the given model names once the transaction commits
+
+        Within a transaction the names are collected and bumped together by
+        one on_commit callback, so a request that saves many rows writes each
+        counter once, and holds no lock on the shared counter rows while the
+        rest of its transaction runs. Outside one they are bumped at once.
+        """
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            cls._bump(set(names))
+            return
+        pending = getattr(connection, 'pending_versions', None)
+        # A rolled back transaction dropped its callback along with the set
+        queued = pending is not None and any(func is pending for _, func, _ in connection.run_on_commit)
+        if not queued or pending.done:
+            pending = connection.pending_versions = _PendingVersions(cls)
+            transaction.on_commit(pending)
+        pending.names.update(names)
+
+    @classmethod
+    def _bump(cls, names):
+        now = timezone.now()
+        updated = cls.objects.filter(name__in=names).update(version=F('version') + 1, updated_at=now)
+        if updated < len(names):
+            existing = set(cls.objects.filter(name__in=names).values_list('name', flat=True))
+            for name in names - existing:
+                cls.objects.get_or_create(name=name, defaults={'version': 1, 'updated_at': now})
+
+class _PendingVersions:
+    """The on_commit callback of DataVersion.bump: the names bumped in one transaction"""
+
+    def __init__(self, model):
+        self.model = model
+        self.names = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.model._bump(self.names)
 
-class Employee(models.Model):
+def cascade_names(model, seen=None):
+    """Model names whose rows a delete of `model` can remove through CASCADE"""
+    seen = seen if seen is not None else set()
+    seen.add(model._meta.model_name)
+    for relation in model._meta.related_objects:
+        related = relation.related_model
+        if relation.on_delete is models.CASCADE and related._meta.model_name not in seen:
+            cascade_names(related, seen)
+    return seen
+
+class LineTotalField(models.DecimalField):
+    """quantity * price of its row, recomputed by save() and bulk_create()
+
+    Both call pre_save, as does the bulk insert of services._insert, so no
+    write path can forget it; bulk_update and
+    QuerySet.update do not, and must set it themselves.
+    """
+
+    def __init__(self, *args, quantity='quantity', price='price', **kwargs):
+        self.quantity_field, self.price_field = quantity, price
+        kwargs.setdefault('max_digits', 14)
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('default', 0)
+        kwargs['editable'] = False
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.quantity_field != 'quantity':
+            kwargs['quantity'] = self.quantity_field
+        if self.price_field != 'price':
+            kwargs['price'] = self.price_field
+        return name, path, args, kwargs
+
+    def pre_save(self, instance, add):
+        quantity = getattr(instance, self.quantity_field)
+        # Form views hand over the price as a float
+        price = Decimal(str(getattr(instance, self.price_field)))
+        value = (quantity * price).quantize(Decimal('0.01'))
+        setattr(instance, self.attname, value)
+        return value
+
+class VersionedModel(models.Model):
+    """Bumps the model's DataVersion on every save and delete"""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        DataVersion.bump(self._meta.model_name)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        DataVersion.bump(*cascade_names(type(self)))
+        return result
+
+class Employee(VersionedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
     position = models.CharField(max_length=100)
@@ -12,7 +129,7 @@ class Employee(models.Model):
     def __str__(self):
         return self.name
 
-class Category(models.Model):
+class Category(VersionedModel):
     name = models.CharField(max_length=100)
     
     def __str__(self):
@@ -21,20 +138,46 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
-class Product(models.Model):
-    name = models.CharField(max_length=100)
+class Product(VersionedModel):
+    name = models.CharField(max_length=100, db_index=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     size = models.CharField(max_length=20, blank=True, null=True)
     color = models.CharField(max_length=50, blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.IntegerField(default=0)
+    # Revenue tier from the classify_abc command; '' until it first runs
+    abc_class = models.CharField(
+        max_length=1, blank=True, default='', db_index=True, editable=False,
+        choices=[('A', 'A'), ('B', 'B'), ('C', 'C')],
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
 
-class Supplier(models.Model):
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # Opening stock is held at the default location
+            ProductStock.rebalance([self.pk])
+
+    @classmethod
+    def add_stock(cls, deltas):
+        """Add {product_id: units} to stock_quantity in one UPDATE"""
+        deltas = {product_id: units for product_id, units in deltas.items() if units}
+        if not deltas:
+            return
+        cls.objects.filter(pk__in=deltas).update(
+            stock_quantity=F('stock_quantity') + Case(
+                *(When(pk=product_id, then=Value(units)) for product_id, units in deltas.items()),
+                output_field=models.IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+class Supplier(VersionedModel):
     name = models.CharField(max_length=100)
     contact_person = models.CharField(max_length=100)
     phone = models.CharField(max_length=20)
@@ -44,12 +187,137 @@ class Supplier(models.Model):
     def __str__(self):
         return self.name
 
-class Inventory(models.Model):
+class Location(VersionedModel):
+    """A store or warehouse holding its own stock"""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def default_id(cls):
+        """Id of DEFAULT_LOCATION, where rows without a location are booked"""
+        return cls.objects.get_or_create(name=settings.DEFAULT_LOCATION)[0].pk
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            # Its stock rows went with it; the totals now sit at the default location
+            ProductStock.rebalance()
+        return result
+
+class ProductStock(models.Model):
+    """Stock of one product at one location
+
+    Product.stock_quantity is the sum over locations. Sales and receipts go
+    through move(), which shifts the location row and then the total: in
+    the same transaction, or after commit when STOCK_TOTALS_DELAY_MS is set
+    (see main.stocktotals). Edits of the total (product form, API, import)
+    land on DEFAULT_LOCATION through rebalance().
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='stock_levels')
+    quantity = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.location.name}: {self.quantity}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location'], name='unique_product_stock'),
+        ]
+        # Low stock at one location without touching the others
+        indexes = [models.Index(fields=['location', 'quantity'], name='stock_location_quantity')]
+
+    @staticmethod
+    def _shift(rows, units):
+        """Add {product_id: units} to the quantity of rows; returns the number of rows updated"""
+        return rows.update(quantity=F('quantity') + Case(
+            *(When(product_id=product, then=Value(delta)) for product, delta in units.items()),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ))
+
+    @classmethod
+    def add(cls, deltas):
+        """Add {(product_id, location_id): units} to the location rows only
+
+        One UPDATE per location, touching exactly the rows that move; rows
+        that do not exist yet are created first.
+        """
+        by_location = defaultdict(dict)
+        for (product, location), units in deltas.items():
+            if units:
+                by_location[int(location)][int(product)] = units
+        for location, units in by_location.items():
+            rows = cls.objects.filter(location_id=location, product_id__in=units)
+            if cls._shift(rows, units) == len(units):
+                continue
+            missing = set(units) - set(rows.values_list('product_id', flat=True))
+            cls.objects.bulk_create([cls(product_id=product, location_id=location) for product in missing],
+                                    ignore_conflicts=True)
+            cls._shift(cls.objects.filter(location_id=location, product_id__in=missing),
+                       {product: units[product] for product in missing})
+
+    @classmethod
+    def move(cls, deltas):
+        """Move {(product_id, location_id): units} of stock; returns the {product_id: units} totals
+
+        The location rows change at once. Product.stock_quantity follows in
+        the same transaction, or once it commits under STOCK_TOTALS_DELAY_MS.
+        """
+        cls.add(deltas)
+        totals = defaultdict(int)
+        for (product, _), units in deltas.items():
+            totals[int(product)] += units
+        if settings.STOCK_TOTALS_DELAY_MS is None:
+            Product.add_stock(totals)
+            DataVersion.bump('product')
+        else:
+            stocktotals.schedule(totals)
+        return dict(totals)
+
+    @classmethod
+    def refresh_totals(cls, product_ids, batch_size=500):
+        """Set stock_quantity of the products to the sum of their location rows"""
+        total = cls.objects.filter(product=OuterRef('pk')).values('product').annotate(
+            total=Sum('quantity')).values('total')
+        product_ids = list(product_ids)
+        with transaction.atomic():
+            for start in range(0, len(product_ids), batch_size):
+                Product.objects.filter(pk__in=product_ids[start:start + batch_size]).update(
+                    stock_quantity=Coalesce(Subquery(total), 0), updated_at=timezone.now(),
+                )
+            DataVersion.bump('product')
+
+    @classmethod
+    def rebalance(cls, product_ids=None):
+        """Set DEFAULT_LOCATION stock so each product's locations add up to its stock_quantity
+
+        product_ids=None does the whole catalog.
+        """
+        default = Location.default_id()
+        products = Product.objects.all() if product_ids is None else Product.objects.filter(pk__in=product_ids)
+        missing = products.exclude(stock_levels__location_id=default).values_list('id', flat=True)
+        cls.objects.bulk_create([cls(product_id=pk, location_id=default) for pk in missing],
+                                batch_size=1000, ignore_conflicts=True)
+        elsewhere = cls.objects.filter(product=OuterRef('product')).exclude(location_id=default).values(
+            'product').annotate(total=Sum('quantity')).values('total')
+        rows = cls.objects.filter(location_id=default)
+        if product_ids is not None:
+            rows = rows.filter(product_id__in=product_ids)
+        rows.update(quantity=Subquery(Product.objects.filter(pk=OuterRef('product')).values('stock_quantity')[:1])
+                    - Coalesce(Subquery(elsewhere), 0))
+
+class Inventory(VersionedModel):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
-    date_received = models.DateTimeField(auto_now_add=True)
+    line_value = LineTotalField(price='unit_price')
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
+    # Not auto_now_add, so an import can keep the date of an exported receipt
+    date_received = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     def __str__(self):
         return f"{self.product.name} - {self.quantity} units"
@@ -58,23 +326,164 @@ class Inventory(models.Model):
         verbose_name_plural = "Inventories"
         
     def save(self, *args, **kwargs):
-        # Update product stock quantity when inventory is added
-        self.product.stock_quantity += self.quantity
-        self.product.save()
-        super().save(*args, **kwargs)
+        if self.location_id is None:
+            self.location_id = Location.default_id()
+        with transaction.atomic():
+            # Update product stock quantity when inventory is added
+            ProductStock.move({(self.product_id, self.location_id): self.quantity})
+            if Inventory.product.is_cached(self):
+                self.product.stock_quantity += self.quantity
+            super().save(*args, **kwargs)
 
-class Sale(models.Model):
+class Sale(VersionedModel):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    date_time = models.DateTimeField(auto_now_add=True)
+    line_total = LineTotalField()
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
+    # Not auto_now_add, so an import can keep the date of an exported sale
+    date_time = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     
     def __str__(self):
         return f"{self.product.name} - {self.quantity} units"
+
+    class Meta:
+        # Covers revenue over a date range without touching the table
+        indexes = [models.Index(fields=['date_time', 'line_total'], name='sale_date_line_total')]
     
     def save(self, *args, **kwargs):
-        # Update product stock quantity when sale is made
-        self.product.stock_quantity -= self.quantity
-        self.product.save()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        if self.location_id is None:
+            self.location_id = Location.default_id()
+        with transaction.atomic():
+            # Update product stock quantity when sale is made; the loaded
+            # product follows, for the caller's stock events
+            ProductStock.move({(self.product_id, self.location_id): -self.quantity})
+            if Sale.product.is_cached(self):
+                self.product.stock_quantity -= self.quantity
+            super().save(*args, **kwargs)
+            if adding:
+                SalesCounter.add([self])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            SalesCounter.add([self], sign=-1)
+        return result
+
+class SaleArchive(models.Model):
+    """Sales moved out of the hot Sale table by the archive_sales command"""
+    # Keeps the original Sale id, so archiving the same sale twice is impossible
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = LineTotalField()
+    date_time = models.DateTimeField()
+    # Partition key (YYYYMM) so a period can be scanned or dropped on its own
+    period = models.IntegerField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity} units (archived)"
+
+    class Meta:
+        indexes = [models.Index(fields=['date_time'])]
+
+class SaleRollup(models.Model):
+    """Daily per-product, per-employee totals of archived sales"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    sale_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    price_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    line_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.product.name} - {self.sale_count} sales"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'employee'], name='unique_sale_rollup'),
+        ]
+        indexes = [models.Index(fields=['day'])]
+
+class SalesCounter(models.Model):
+    """Running all-time sales totals per product, archived sales included
+
+    Sale.save, Sale.delete and services.record_sales keep it current;
+    reconcile_counters recomputes it from the sales themselves.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales_counter')
+    units_sold = models.IntegerField(default=0, db_index=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, db_index=True)
+    last_sold_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.product.name} - {self.units_sold} sold"
+
+    @classmethod
+    def add(cls, sales, sign=1):
+        """Add saved sales to their products' counters; sign=-1 takes deleted ones out
+
+        One UPDATE covers every product that already has a counter.
+        """
+        totals = {}
+        for sale in sales:
+            # Form views set product_id from the raw POST string
+            product_id = int(sale.product_id)
+            units, revenue, last = totals.get(product_id, (0, Decimal('0'), sale.date_time))
+            totals[product_id] = (
+                units + sign * sale.quantity,
+                revenue + sign * sale.line_total,
+                max(last, sale.date_time),
+            )
+        if not totals:
+            return
+        existing = set(cls.objects.filter(product_id__in=totals).values_list('product_id', flat=True))
+        cls.objects.bulk_create([
+            cls(product_id=product_id, units_sold=units, revenue=revenue, last_sold_at=last if sign > 0 else None)
+            for product_id, (units, revenue, last) in totals.items() if product_id not in existing
+        ])
+        if not existing:
+            return
+
+        def per_product(index, field):
+            return Case(
+                *(When(product_id=product_id, then=Value(totals[product_id][index])) for product_id in existing),
+                output_field=field,
+            )
+
+        changes = {
+            'units_sold': F('units_sold') + per_product(0, models.IntegerField()),
+            'revenue': F('revenue') + per_product(1, models.DecimalField(max_digits=14, decimal_places=2)),
+        }
+        if sign > 0:
+            newest = per_product(2, models.DateTimeField())
+            changes['last_sold_at'] = Greatest(Coalesce('last_sold_at', newest), newest)
+        else:
+            # The deleted sale may have been the latest one; look the date up again
+            changes['last_sold_at'] = Coalesce(
+                Subquery(Sale.objects.filter(product=OuterRef('product')).order_by('-date_time').values('date_time')[:1]),
+                Subquery(SaleArchive.objects.filter(product=OuterRef('product')).order_by('-date_time').values('date_time')[:1]),
+            )
+        cls.objects.filter(product_id__in=existing).update(**changes)
+
+class ReorderSuggestion(models.Model):
+    """Forecast demand and suggested order per product, from the forecast_demand command
+
+    Only products that will run out within their lead time get a row; the
+    supplier is the one that last delivered the product.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='reorder')
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
+    daily_demand = models.FloatField()
+    days_of_cover = models.FloatField(db_index=True)
+    reorder_quantity = models.IntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product.name} - order {self.reorder_quantity}"
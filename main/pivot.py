@@ -0,0 +1,96 @@
+"""Category x period pivot of units, revenue and sale count
+
+The totals come from one GROUP BY category, bucket query (archive.
+bucket_totals, plus the rollups for archived days) and are laid out here as
+a dense matrix: every category by every day, week or month of the range,
+zeros included. The matrix is cached under the sale and category data
+versions, so any write to either makes the next request rebuild it.
+"""
+import datetime
+
+from django.core.cache import cache
+
+from . import precompute
+from .archive import bucket_totals
+from .models import Category
+
+KINDS = ('day', 'week', 'month')
+# Measure name -> sales_summary field
+MEASURES = {'units': 'quantity', 'revenue': 'line_total', 'count': 'count'}
+# Widest pivot; longer ranges keep their most recent buckets
+MAX_BUCKETS = 366
+CACHE_SECONDS = 86400
+
+
+def bucket_start(kind, day):
+    """First day of the day/week/month containing day; weeks start on Monday"""
+    if kind == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(kind, day):
+    if kind == 'week':
+        return day + datetime.timedelta(days=7)
+    if kind == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def buckets(kind, start, end):
+    """Start dates of every bucket overlapping [start, end]"""
+    days = []
+    day = bucket_start(kind, start)
+    while day <= end:
+        days.append(day)
+        day = next_bucket(kind, day)
+    return days[-MAX_BUCKETS:]
+
+
+def default_start(kind, end):
+    """Start of the range shown when none is given: 30 days, 12 weeks or 12 months"""
+    if kind == 'week':
+        return bucket_start('week', end) - datetime.timedelta(weeks=11)
+    if kind == 'month':
+        year, month = divmod(end.year * 12 + end.month - 12, 12)
+        return datetime.date(year, month + 1, 1)
+    return end - datetime.timedelta(days=29)
+
+
+def build(kind, start, end):
+    """{'kind', 'buckets', 'categories', 'cells': {measure: [[value per bucket] per category]}}"""
+    columns = buckets(kind, start, end)
+    # Whole buckets, so the first and last week or month are not cut short;
+    # a range ending before it starts has no buckets and an empty matrix
+    totals = bucket_totals('product__category', kind, columns[0], end) if columns else {}
+    categories = list(Category.objects.order_by('name').values_list('id', 'name'))
+    cells = {
+        measure: [[totals[category_id, column][field] if (category_id, column) in totals else 0
+                   for column in columns] for category_id, _ in categories]
+        for measure, field in MEASURES.items()
+    }
+    return {'kind': kind, 'buckets': columns, 'categories': [name for _, name in categories], 'cells': cells}
+
+
+def category_pivot(kind, start, end, versions):
+    """build(), cached per sale and category data version
+
+    versions is {name: (version, updated_at)}, as from versioning.data_versions;
+    the key is built like the dashboard and chart entries (precompute.key).
+    """
+    key = precompute.key(f'pivot:{kind}:{start}', end, versions, ('sale', 'category'))
+    pivot = cache.get(key)
+    if pivot is None:
+        pivot = build(kind, start, end)
+        cache.set(key, pivot, CACHE_SECONDS)
+    return pivot
+
+
+def table(pivot, measure):
+    """(rows of (category, values, total), column totals, grand total) for one measure"""
+    matrix = pivot['cells'][measure]
+    rows = [(name, values, sum(values)) for name, values in zip(pivot['categories'], matrix)]
+    columns = [sum(column) for column in zip(*matrix)] if matrix else [0] * len(pivot['buckets'])
+    return rows, columns, sum(columns)
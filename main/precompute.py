@@ -0,0 +1,177 @@
+"""Server-side cache of the dashboard and chart data, filled single-flight
+
+The dashboard and the chart endpoints keep their query results in the
+cache under today's date and the data versions they depend on (see
+versioning), so a write to one of those models, or midnight, makes the next
+request compute them again. When a key is missing, one caller computes it
+and the others wait for its result instead of running the same aggregates:
+after a deploy, or when a popular key is invalidated by a sale, the
+database sees one computation per key rather than one per worker.
+
+The entries live in the PRECOMPUTE_CACHE cache, a database cache table by
+default, so every worker process shares them: `manage.py warm_cache`
+computes them once after a deploy, and the lock, a cache add() of its own
+key, keeps the workers from computing the same entry at once.
+WARM_CACHE_ON_STARTUP does the same warm-up from each web process as it
+starts, and also fills that process's dropdown fragments, which stay in
+the per-process default cache.
+"""
+import asyncio
+import logging
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .context_processors import templates_version
+from .models import Category, Employee, Product, Supplier
+from .versioning import current_versions
+
+logger = logging.getLogger(__name__)
+
+CACHE_SECONDS = 86400
+# A computation taking longer than this is assumed dead; waiters then compute it themselves
+LOCK_SECONDS = 60
+POLL_SECONDS = 0.05
+
+_missing = object()
+
+
+def key(name, today, versions, models):
+    """Cache key for name on today, at the current version of each of models
+
+    The update times go in too, so a database that was reset and counted up
+    to the same versions again does not find the old entries.
+    """
+    parts = []
+    for model in sorted(models):
+        version, updated_at = versions[model]
+        parts.append(f'{model}{version}@{updated_at.timestamp() if updated_at else 0}')
+    return f"precompute:{name}:{today.isoformat()}:{':'.join(parts)}"
+
+
+def store():
+    """The PRECOMPUTE_CACHE cache"""
+    return caches[settings.PRECOMPUTE_CACHE]
+
+
+def single_flight(key, compute, timeout=CACHE_SECONDS):
+    """The cached value of key, computing and storing it once if missing
+
+    Callers arriving while another one computes the same key wait for its
+    result, up to LOCK_SECONDS.
+    """
+    cache = store()
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        return value
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_SECONDS
+    while not cache.add(lock, 1, LOCK_SECONDS):
+        time.sleep(POLL_SECONDS)
+        value = cache.get(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() > deadline:
+            return compute()
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+    finally:
+        cache.delete(lock)
+    return value
+
+
+async def asingle_flight(key, compute, timeout=CACHE_SECONDS):
+    """single_flight() for async views; compute is a coroutine function"""
+    cache = store()
+    value = await cache.aget(key, _missing)
+    if value is not _missing:
+        return value
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_SECONDS
+    while not await cache.aadd(lock, 1, LOCK_SECONDS):
+        await asyncio.sleep(POLL_SECONDS)
+        value = await cache.aget(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() > deadline:
+            return await compute()
+    try:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    finally:
+        await cache.adelete(lock)
+    return value
+
+
+def _fragments():
+    """(template, context) of each dropdown partial, as the list and form pages include it
+
+    Only the unfiltered variants (nothing selected) are cached, so those are
+    the ones rendered here.
+    """
+    return [
+        ('main/partials/category_options.html', {'categories': Category.objects.all(), 'selected': ''}),
+        ('main/partials/employee_options.html', {'employees': Employee.objects.all(), 'selected': ''}),
+        ('main/partials/supplier_options.html', {'suppliers': Supplier.objects.all(), 'selected': ''}),
+        ('main/partials/sale_product_options.html', {'all_products': Product.objects.filter(stock_quantity__gt=0)}),
+        ('main/partials/inventory_product_options.html', {'all_products': Product.objects.all()}),
+    ]
+
+
+def warm(today=None, fragments=True):
+    """Compute every dashboard, chart and dropdown cache entry; returns [(name, seconds)]
+
+    Entries already cached at the current data versions are not recomputed,
+    so running it again, or from several processes, costs little.
+    fragments=False leaves out the dropdowns, which only fill the cache of
+    the calling process.
+    """
+    from . import views
+
+    today = today or timezone.now().date()
+    versions = current_versions()
+    # As the data_versions context processor exposes them to the fragment keys
+    fragment_context = {
+        'data_versions': {name: version for name, (version, _) in versions.items()},
+        'templates_version': templates_version(),
+    }
+    tasks = [('dashboard', partial(views.dashboard_results, today, versions))]
+    for period in views.SALES_PERIODS:
+        tasks.append((f'sales_series:{period}', partial(views.cached_sales_series, period, today, versions)))
+    for period in views.PERFORMANCE_PERIODS:
+        tasks.append((f'performance:{period}', partial(views.employee_performance, period, today, versions)))
+    for template, context in _fragments() if fragments else ():
+        name = template.rsplit('/', 1)[-1].removesuffix('.html')
+        tasks.append((name, partial(render_to_string, template, {**context, **fragment_context})))
+
+    timings = []
+    for name, task in tasks:
+        started = time.perf_counter()
+        task()
+        timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+def _warm_in_thread():
+    close_old_connections()
+    try:
+        timings = warm()
+        logger.info('Warmed %d cache entries in %.2fs', len(timings), sum(seconds for _, seconds in timings))
+    except Exception:
+        logger.exception('Cache warm-up failed')
+    finally:
+        close_old_connections()
+
+
+def warm_in_background():
+    """Start warm() on a daemon thread; the WARM_CACHE_ON_STARTUP hook of the WSGI and ASGI entry points"""
+    thread = threading.Thread(target=_warm_in_thread, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,199 @@
+"""Opt-in request profiling: Server-Timing headers and a slow log
+
+With PROFILING = True every response carries a Server-Timing header
+(visible in the browser's network panel) with the request's wall time, DB
+time, query count, repeated queries and template render time. Repeated
+queries are the same SQL run more than once in a request, usually a query
+inside a loop.
+
+Requests slower than PROFILING_SLOW_REQUEST_MS, and requests with a query
+slower than PROFILING_SLOW_QUERY_MS, are written to the main.profiling
+logger as one JSON object each, with the offending SQL and the line of
+project code that ran it.
+
+Queries are seen on any thread the request's context reaches, the query
+pool of main.async_views included, so when they run concurrently db can
+exceed total. DB time spent while a template renders (lazy querysets) is
+counted in both db and tpl.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import add_execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+# Listed in the slow log, worst first
+MAX_LOGGED_QUERIES = 5
+
+_current = ContextVar('profile', default=None)
+# Project modules whose execute_wrappers sit between a query and its caller
+HOOK_MODULES = {__name__, 'main.metrics', 'main.middleware'}
+
+
+def call_site(skip=2):
+    """'path:line in function' of the innermost project frame outside Django"""
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(skip)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        in_hooks = frame.f_globals.get('__name__') in HOOK_MODULES
+        if filename.startswith(root) and not in_hooks and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class Profile:
+    """Queries and template time of one request; also a DB execute_wrapper"""
+
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+        self.total_seconds = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started, call_site()))
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for _, seconds, _ in self.queries)
+
+    def repeated(self):
+        """{sql: count} for SQL run more than once"""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def repeated_count(self):
+        return sum(count - 1 for count in self.repeated().values())
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.total_seconds * 1000:.1f}',
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{len(self.queries)} queries"',
+            f'dup;desc="{self.repeated_count()} repeated"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+        ])
+
+    def slow_entry(self, request, response):
+        """The slow log record for this request, or None when nothing was slow"""
+        slow_query = settings.PROFILING_SLOW_QUERY_MS / 1000
+        slow_queries = sorted(
+            (query for query in self.queries if query[1] >= slow_query), key=lambda query: -query[1],
+        )
+        if self.total_seconds * 1000 < settings.PROFILING_SLOW_REQUEST_MS and not slow_queries:
+            return None
+        sites = {sql: where for sql, _, where in self.queries}
+        repeated = sorted(self.repeated().items(), key=lambda item: -item[1])
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(self.total_seconds * 1000, 1),
+            'db_ms': round(self.db_seconds * 1000, 1),
+            'queries': len(self.queries),
+            'repeated': self.repeated_count(),
+            'template_ms': round(self.template_seconds * 1000, 1),
+            'slow_queries': [
+                {'sql': sql, 'ms': round(seconds * 1000, 1), 'where': where}
+                for sql, seconds, where in slow_queries[:MAX_LOGGED_QUERIES]
+            ],
+            'repeated_queries': [
+                {'sql': sql, 'count': count, 'where': sites[sql]}
+                for sql, count in repeated[:MAX_LOGGED_QUERIES]
+            ],
+        }
+
+
+def _install_template_timer():
+    """Time each top-level template render of a profiled request"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'profiled', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, *args, **kwargs):
+        profile = _current.get()
+        # Nested renders (render_to_string inside a render) are already timed
+        if profile is None or profile.rendering:
+            return original(self, *args, **kwargs)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            profile.template_seconds += time.perf_counter() - started
+            profile.rendering = False
+
+    render.profiled = True
+    Template.render = render
+
+
+def _profile_query(execute, sql, params, many, context):
+    """execute_wrapper on every connection; records into the request's Profile, if any"""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+class ProfilingMiddleware:
+    """Server-Timing header and slow log for every request; off unless PROFILING"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install_template_timer()
+        add_execute_wrapper(_profile_query)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    def report(self, request, response, profile, elapsed):
+        profile.total_seconds = elapsed
+        response['Server-Timing'] = profile.server_timing()
+        entry = profile.slow_entry(request, response)
+        if entry is not None:
+            logger.warning(json.dumps(entry))
+        return response
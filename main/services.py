@@ -0,0 +1,223 @@
+"""Write paths shared by the JSON API and other batch writers
+
+Stock moves through ProductStock.move: one UPDATE ... SET quantity =
+quantity + CASE ... per location for the batch, then the same for the
+product totals (or after commit, under STOCK_TOTALS_DELAY_MS). Concurrent
+writers cannot lose each other's changes, and a batch costs the same number
+of statements however many products it touches.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from . import events
+from .models import (
+    DataVersion, Inventory, LineTotalField, Location, Product, ProductStock, Sale, SaleArchive, SaleRollup,
+    SalesCounter,
+)
+
+
+def apply_stock_deltas(deltas):
+    """Add {product_id: units} to stock; returns the updated products
+
+    The returned Product objects only carry id, name and stock_quantity.
+    """
+    deltas = {product_id: units for product_id, units in deltas.items() if units}
+    if not deltas:
+        return {}
+    Product.add_stock(deltas)
+    return Product.objects.only('id', 'name', 'stock_quantity').in_bulk(list(deltas))
+
+
+def moved_products(totals):
+    """Products of a ProductStock.move(), with the stock_quantity they have or will have
+
+    Under STOCK_TOTALS_DELAY_MS the stored totals lag behind, so the value
+    is summed from the location rows instead.
+    """
+    moved = [product_id for product_id, units in totals.items() if units]
+    products = Product.objects.only('id', 'name', 'stock_quantity').in_bulk(moved)
+    if settings.STOCK_TOTALS_DELAY_MS is not None:
+        levels = ProductStock.objects.filter(product_id__in=products).values('product').annotate(
+            total=Sum('quantity')).values_list('product', 'total').order_by()
+        for product_id, total in levels:
+            products[product_id].stock_quantity = total
+    return products
+
+
+def _location_deltas(rows, sign):
+    """{(product_id, location_id): units} of rows, booking those without a location at the default"""
+    missing = [row for row in rows if row.location_id is None]
+    if missing:
+        default = Location.default_id()
+        for row in missing:
+            row.location_id = default
+    deltas = defaultdict(int)
+    for row in rows:
+        deltas[row.product_id, row.location_id] += sign * row.quantity
+    return deltas
+
+
+def _publish_stock(deltas, products):
+    for product_id, product in products.items():
+        events.stock_moved(product, product.stock_quantity - deltas[product_id])
+
+
+def _insert(model, rows, set_ids):
+    """INSERT unsaved rows of model in one go
+
+    set_ids=False skips bulk_create, whose per-field preparation of every
+    row (pre_save, then get_db_prep_save through the connection proxy) is
+    most of the cost of a large load, for one executemany of values
+    converted against the connection directly. The rows get no primary keys.
+    """
+    if set_ids:
+        model.objects.bulk_create(rows)
+        return
+    db = transaction.get_connection()
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(db.ops.quote_name(field.column) for field in fields)
+    getters = [
+        # Line totals come from their pre_save, as with bulk_create
+        partial(field.pre_save, add=True) if isinstance(field, LineTotalField) else attrgetter(field.attname)
+        for field in fields
+    ]
+    with db.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {db.ops.quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})",
+            [[field.get_db_prep_save(get(row), db) for field, get in zip(fields, getters)] for row in rows],
+        )
+
+
+def record_sales(sales, notify=True, set_ids=True):
+    """Insert unsaved Sale objects and take their units out of stock
+
+    Returns the products whose stock changed, keyed by id. notify=False
+    skips the per-sale live feed events, for bulk loads that would
+    otherwise flood open dashboards (stock events are still sent).
+    set_ids=False inserts faster but leaves the sales without ids (see
+    _insert).
+    """
+    location_deltas = _location_deltas(sales, -1)
+    with transaction.atomic():
+        # Not Sale.save(): one stock move for the whole batch
+        _insert(Sale, sales, set_ids)
+        deltas = ProductStock.move(location_deltas)
+        products = moved_products(deltas)
+        SalesCounter.add(sales)
+        DataVersion.bump('sale')
+        if notify:
+            for sale in sales:
+                events.sale_recorded(sale)
+        _publish_stock(deltas, products)
+    return products
+
+
+def record_receipts(receipts, set_ids=True):
+    """Insert unsaved Inventory receipts and add their units to stock
+
+    set_ids is as for record_sales.
+    """
+    location_deltas = _location_deltas(receipts, 1)
+    with transaction.atomic():
+        _insert(Inventory, receipts, set_ids)
+        deltas = ProductStock.move(location_deltas)
+        products = moved_products(deltas)
+        DataVersion.bump('inventory')
+        _publish_stock(deltas, products)
+    return products
+
+
+def reconcile_sales_counters(dry_run=False):
+    """Recompute every SalesCounter from Sale and SaleArchive in one pass
+
+    Returns {product_id: (stored, actual)} for the products whose counter
+    was wrong, each side a (units_sold, revenue, last_sold_at) tuple. The
+    counters are rewritten unless dry_run.
+    """
+    actual = {}
+    for model in (Sale, SaleArchive):
+        rows = model.objects.values('product').annotate(
+            units=Sum('quantity'),
+            revenue=Sum('line_total'),
+            last=Max('date_time'),
+        ).values_list('product', 'units', 'revenue', 'last').order_by()
+        for product_id, units, revenue, last in rows:
+            before = actual.get(product_id, (0, Decimal('0'), None))
+            actual[product_id] = (
+                before[0] + units,
+                before[1] + revenue,
+                max(filter(None, (before[2], last))),
+            )
+
+    stored = SalesCounter.objects.in_bulk()
+    drift = {}
+    new, changed = [], []
+    for product_id in actual.keys() | stored.keys():
+        units, revenue, last = actual.get(product_id, (0, Decimal('0'), None))
+        revenue = revenue.quantize(Decimal('0.01'))
+        counter = stored.get(product_id) or SalesCounter(product_id=product_id)
+        current = (counter.units_sold, counter.revenue, counter.last_sold_at)
+        if current == (units, revenue, last):
+            continue
+        drift[product_id] = (current, (units, revenue, last))
+        counter.units_sold, counter.revenue, counter.last_sold_at = units, revenue, last
+        (changed if product_id in stored else new).append(counter)
+
+    if not dry_run:
+        with transaction.atomic():
+            SalesCounter.objects.bulk_create(new, batch_size=500)
+            SalesCounter.objects.bulk_update(changed, ['units_sold', 'revenue', 'last_sold_at'], batch_size=500)
+    return drift
+
+
+# Products per stock correction UPDATE
+STOCK_FIX_BATCH = 500
+
+
+def _units_by_product(queryset):
+    return dict(queryset.values('product').annotate(units=Sum('quantity')).values_list('product', 'units').order_by())
+
+
+def reconcile_stock(dry_run=False):
+    """Compare every Product.stock_quantity with its ledger, fixing drift unless dry_run
+
+    The ledger is receipts minus sales, hot and archived (through the
+    rollups), each summed in one grouped query. Returns {product_id:
+    (stored, expected)} for the products that differ. Stock set directly,
+    through the product form or as opening stock of an import, has no
+    receipt behind it and is reported as drift too.
+
+    Drift is corrected by adding expected - stored, like any other stock
+    move, so a sale committed while the check runs is not lost; the
+    product's default location absorbs the correction.
+    """
+    with transaction.atomic():
+        # One snapshot for the ledger and the stored values
+        received = _units_by_product(Inventory.objects.all())
+        sold = _units_by_product(Sale.objects.all())
+        for product_id, units in _units_by_product(SaleRollup.objects.all()).items():
+            sold[product_id] = sold.get(product_id, 0) + units
+        stored = dict(Product.objects.values_list('id', 'stock_quantity'))
+
+    drift = {}
+    for product_id, quantity in stored.items():
+        expected = received.get(product_id, 0) - sold.get(product_id, 0)
+        if quantity != expected:
+            drift[product_id] = (quantity, expected)
+
+    if drift and not dry_run:
+        ids = list(drift)
+        with transaction.atomic():
+            for start in range(0, len(ids), STOCK_FIX_BATCH):
+                batch = ids[start:start + STOCK_FIX_BATCH]
+                apply_stock_deltas({product_id: drift[product_id][1] - drift[product_id][0] for product_id in batch})
+                ProductStock.rebalance(batch)
+            DataVersion.bump('product')
+    return drift
@@ -0,0 +1,12 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import user_cache_key
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Covers logins (last_login), password changes and edit_employee"""
+    cache.delete(user_cache_key(instance.pk))
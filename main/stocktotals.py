@@ -0,0 +1,81 @@
+"""Product stock totals maintained after commit (STOCK_TOTALS_DELAY_MS)
+
+Sales and receipts move stock on their (product, location) ProductStock row.
+By default Product.stock_quantity, the total over locations, moves in the
+same transaction, so every sale of a product also locks the product's row
+and on PostgreSQL sales of one product at different locations still queue
+behind each other.
+
+With STOCK_TOTALS_DELAY_MS set, the transaction only touches the location
+row. Once it commits, the product ids are queued, and a background thread
+recomputes their totals from the location rows at most every
+STOCK_TOTALS_DELAY_MS, one UPDATE for all of them: a busy product row is
+written once per interval instead of once per sale. Until then its
+stock_quantity lags behind its locations.
+
+The queue is per process, like the group-commit writer (main.ingest);
+flush() catches up at once, and the check_stock command repairs totals left
+behind by a process that stopped with ids still queued.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = set()
+_wake = threading.Event()
+_thread = None
+
+
+def schedule(product_ids):
+    """Queue the products' totals for recomputation once the current transaction commits"""
+    ids = set(product_ids)
+    transaction.on_commit(lambda: _queue(ids))
+
+
+def _queue(ids):
+    global _thread
+    with _lock:
+        _pending.update(ids)
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='stock-totals', daemon=True)
+            _thread.start()
+    _wake.set()
+
+
+def flush():
+    """Recompute the totals of every queued product now; returns how many there were"""
+    from .models import ProductStock
+
+    with _lock:
+        ids = list(_pending)
+        _pending.clear()
+    if not ids:
+        return 0
+    try:
+        ProductStock.refresh_totals(ids)
+    except Exception:
+        with _lock:
+            _pending.update(ids)
+        raise
+    return len(ids)
+
+
+def _run():
+    while True:
+        _wake.wait()
+        _wake.clear()
+        # Let the sales of the next few milliseconds join this UPDATE
+        time.sleep((settings.STOCK_TOTALS_DELAY_MS or 0) / 1000)
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Stock totals refresh failed')
+        finally:
+            close_old_connections()
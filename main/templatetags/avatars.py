@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from main.avatars import avatar_svg
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(name, size=40):
+    """Inline SVG initials avatar: no extra request per row"""
+    return mark_safe(avatar_svg(str(name or ''), size))
@@ -1,9 +1,1190 @@
 # main/tests/test_smoke.py
-from django.test import SimpleTestCase, Client
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest.mock import patch
+
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import path, resolve
+from django.utils import timezone
+
+from erp_project import settings as project_settings
+from main import abc, async_views, events, ingest, metrics, pivot, precompute, stocktotals
+from main.archive import archive_cutoff, daily_totals, sales_by, sales_summary, top_sellers
+from main.admin import EstimatedCountPaginator
+from main.avatars import avatar_svg, initials
+from main.backends import user_cache_key
+from main.forecasting import daily_demand, day_weights, forecast, reorder_plan
+from main.importers import import_csv
+from main.profiling import Profile
+from main.services import reconcile_sales_counters, reconcile_stock, record_sales
+from main.versioning import current_versions
+from main.benchmarking import compare, percentile
+from main.context_processors import templates_version
+from main.management.commands.benchmark_async import routed
+from main.management.commands.loadtest_pos import stock_drift
+from main.models import (
+    Category, DataVersion, Employee, Product, Inventory, Location, ProductStock, ReorderSuggestion, Sale,
+    SaleArchive, SalesCounter, Supplier,
+)
+
+
+async def slow_async(request):
+    await asyncio.sleep(0.2)
+    await sync_to_async(Category.objects.count, thread_sensitive=False)()
+    return HttpResponse('ok')
+
+
+# URLconf of the tests that need views of their own
+urlpatterns = [path('slow/', slow_async, name='slow_async')]
 
 
 class MathSmokeTest(SimpleTestCase):
     """Django va Python muhiti to'g'ri ishlayotganini tekshiradi."""
 
     def test_basic_math(self):
-        self.assertEqual(1 + 1, 2)
\ No newline at end of file
+        self.assertEqual(1 + 1, 2)
+
+class GenerateDataCommandTest(TestCase):
+    """generate_data buyrug'i izchil ma'lumot yaratishini tekshiradi."""
+
+    def test_stock_matches_receipts_and_sales(self):
+        call_command('generate_data', scale=0.1, seed=7, days=30, stdout=StringIO())
+
+        self.assertEqual(Product.objects.count(), 100)
+        self.assertEqual(Employee.objects.filter(user__isnull=False).count(), 5)
+        received = dict(Inventory.objects.values_list('product').annotate(Sum('quantity')))
+        sold = dict(Sale.objects.values_list('product').annotate(Sum('quantity')))
+        for product in Product.objects.all():
+            expected = received.get(product.pk, 0) - sold.get(product.pk, 0)
+            self.assertEqual(product.stock_quantity, expected)
+            self.assertGreaterEqual(product.stock_quantity, 0)
+
+    def test_same_seed_gives_same_catalog(self):
+        call_command('generate_data', scale=0.05, seed=3, days=10, stdout=StringIO())
+        first = list(Product.objects.order_by('id').values_list('name', 'price'))
+        call_command('generate_data', scale=0.05, seed=3, days=10, flush=True, stdout=StringIO())
+        second = list(Product.objects.order_by('id').values_list('name', 'price'))
+        self.assertEqual(first, second)
+
+
+class BenchmarkHelpersTest(SimpleTestCase):
+    """Benchmark natijalarini bazaviy qiymat bilan solishtirishni tekshiradi."""
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEqual(percentile([10, 20], 95), 19.5)
+
+    def test_compare_flags_slowdowns_and_extra_queries(self):
+        baseline = {'dashboard': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 5}}
+        current = {'dashboard': {'p50_ms': 15.0, 'p95_ms': 20.5, 'queries': 6}}
+        regressions = compare(current, baseline, threshold=0.25)
+        self.assertEqual(
+            [(name, metric) for name, metric, _, _ in regressions],
+            [('dashboard', 'p50_ms'), ('dashboard', 'queries')],
+        )
+
+
+class StockDriftTest(SimpleTestCase):
+    """Yo'qolgan zaxira yangilanishlari aniqlanishini tekshiradi."""
+
+    def test_lost_update_is_reported(self):
+        before = {1: (10, 10, 0), 2: (5, 5, 0)}
+        # Product 1: two units sold but stock only dropped by one
+        after = {1: (9, 10, 2), 2: (7, 7, 0)}
+        self.assertEqual(stock_drift(before, after), {1: 1})
+
+
+class SalesArchiveTest(TestCase):
+    """Arxivlangan sotuvlar jami ko'rsatkichlarda saqlanishini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.2, seed=11, days=60, stdout=StringIO())
+
+    def test_totals_survive_archiving(self):
+        before_total = sales_summary()
+        before_by_employee = dict(sales_by('employee'))
+        start = timezone.localdate() - datetime.timedelta(days=90)
+        before_daily = dict(daily_totals(start, timezone.localdate()))
+
+        call_command('archive_sales', days=30, batch_size=50, stdout=StringIO())
+
+        self.assertTrue(SaleArchive.objects.exists())
+        self.assertFalse(Sale.objects.filter(date_time__date__lt=archive_cutoff(30)).exists())
+        self.assertEqual(sales_summary(), before_total)
+        self.assertEqual(dict(sales_by('employee')), before_by_employee)
+        self.assertEqual(dict(daily_totals(start, timezone.localdate())), before_daily)
+
+    def test_range_sums_use_the_date_index(self):
+        end = timezone.localdate()
+        with CaptureQueriesContext(connection) as queries:
+            sales_summary(end - datetime.timedelta(days=7), end)
+        sql = next(query['sql'] for query in queries if 'FROM "main_sale"' in query['sql'])
+        self.assertNotIn('django_datetime_cast_date', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        # A range search on a date_time index rather than a SCAN of the table
+        self.assertRegex(plan, r'SEARCH main_sale USING (COVERING )?INDEX \S+ \(date_time>\? AND date_time<\?\)')
+
+    def test_export_includes_archive_when_range_reaches_it(self):
+        call_command('archive_sales', days=30, stdout=StringIO())
+        client = Client()
+        client.force_login(User.objects.create_user('exporter'))
+        start = (timezone.localdate() - datetime.timedelta(days=90)).isoformat()
+        end = timezone.localdate().isoformat()
+
+        response = client.get('/export/sales/', {'start_date': start, 'end_date': end})
+        rows = response.content.decode().strip().splitlines()[1:]
+        self.assertEqual(len(rows), Sale.objects.count() + SaleArchive.objects.count())
+
+        response = client.get('/export/sales/')
+        rows = response.content.decode().strip().splitlines()[1:]
+        self.assertEqual(len(rows), Sale.objects.count())
+
+
+class ConditionalGetTest(TestCase):
+    """O'zgarmagan ma'lumotlar uchun 304 javob qaytishini tekshiradi."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_data', scale=0.05, seed=5, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('viewer'))
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_data_returns_304(self):
+        for url in ['/dashboard/', '/products/', '/api/sales-data/', '/export/sales/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url), 304)
+
+    def test_every_write_path_changes_the_etag(self):
+        product = Product.objects.filter(stock_quantity__gt=0).first()
+        employee = Employee.objects.first()
+        sale = Sale.objects.first()
+        inventory = Inventory.objects.first()
+        writes = [
+            ('/sales/add/', {'product': product.id, 'employee': employee.id, 'quantity': 1, 'price': '1.00'}),
+            (f'/sales/delete/{sale.id}/', {}),
+            (f'/inventory/delete/{inventory.id}/', {}),
+        ]
+        for url, data in writes:
+            with self.subTest(url=url):
+                etag = self.client.get('/api/sales-data/')['ETag'] + self.client.get('/export/inventory/')['ETag']
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(url, data)
+                after = self.client.get('/api/sales-data/')['ETag'] + self.client.get('/export/inventory/')['ETag']
+                self.assertNotEqual(etag, after)
+
+    def test_a_transaction_bumps_each_counter_once_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                for name in ('Bir', 'Ikki', 'Uch'):
+                    Category.objects.create(name=name)
+                Supplier.objects.create(name='Yangi', contact_person='A', phone='1', email='a@example.com', address='-')
+        self.assertFalse(any('main_dataversion' in query['sql'] for query in queries))
+        self.assertEqual(len(callbacks), 1)
+        version = DataVersion.objects.get(name='category').version
+        with CaptureQueriesContext(connection) as queries:
+            callbacks[0]()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(DataVersion.objects.get(name='category').version, version + 1)
+
+
+class FragmentCacheTest(TestCase):
+    """Ro'yxat fragmentlari keshlanishi va ma'lumot o'zgarganda yangilanishini tekshiradi."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_data', scale=0.05, seed=6, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('viewer'))
+        cache.clear()
+
+    def test_cached_dropdowns_skip_their_queries(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/sales/')
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/sales/')
+        self.assertLess(len(warm), len(cold))
+
+    def test_new_category_appears_in_dropdown(self):
+        self.client.get('/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Yangi toifa')
+        self.assertContains(self.client.get('/products/'), 'Yangi toifa')
+
+    def test_query_string_values_never_reach_the_fragment_keys(self):
+        category = Category.objects.first()
+        for value in ['900001', '900002', str(category.pk)]:
+            response = self.client.get('/products/', {'category': value})
+        self.assertContains(response, f'<option value="{category.pk}" selected>')
+        keys = [key for key in cache._cache if 'template.cache.category_options' in key]
+        self.assertEqual(len(keys), 1)
+
+    def test_template_changes_change_the_keys(self):
+        self.client.get('/products/')
+        with patch('main.context_processors.templates_version', return_value='nextrelease'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/products/')
+        self.assertTrue(any('main_category' in query['sql'] for query in queries))
+
+
+class SelfHostedAssetsTest(TestCase):
+    """Sahifalar tashqi CDN'larga bog'liq emasligini tekshiradi."""
+
+    def test_pages_reference_no_third_party_hosts(self):
+        self.assertNotContains(self.client.get('/login/'), 'https://')
+        self.client.force_login(User.objects.create_user('viewer'))
+        for url in ['/dashboard/', '/reports/', '/sales/']:
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                for host in ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com', 'fonts.googleapis.com']:
+                    self.assertNotIn(host, content)
+
+    def test_deploy_setting_selects_the_hashed_storage(self):
+        def storage(debug):
+            with patch.dict(os.environ, {'DJANGO_DEBUG': debug}):
+                return importlib.reload(project_settings).STORAGES['staticfiles']['BACKEND']
+
+        try:
+            self.assertEqual(storage('0'), 'whitenoise.storage.CompressedManifestStaticFilesStorage')
+            self.assertEqual(storage('1'), 'django.contrib.staticfiles.storage.StaticFilesStorage')
+        finally:
+            importlib.reload(project_settings)
+
+
+class AvatarTest(TestCase):
+    """Avatarlar mahalliy va barqaror yaratilishini tekshiradi."""
+
+    def test_same_name_same_svg(self):
+        self.assertEqual(initials('Ali Valiyev Karimovich'), 'AV')
+        self.assertEqual(initials('  '), '?')
+        self.assertEqual(avatar_svg('Ali Valiyev', 35), avatar_svg('Ali Valiyev', 35))
+        self.assertIn('&lt;b&gt;', avatar_svg('<b>'))
+
+    def test_endpoint_is_cacheable_svg(self):
+        response = self.client.get('/avatar/Ali Valiyev.svg?size=100')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertContains(response, '>AV</text>')
+
+    def test_employee_list_inlines_avatars(self):
+        Employee.objects.create(name='Ali Valiyev', position='Kassir', phone='1', email='ali@example.com')
+        self.client.force_login(User.objects.create_user('viewer'))
+        response = self.client.get('/employees/')
+        self.assertContains(response, '<svg', count=1)
+
+
+class CachedAuthTest(TestCase):
+    """Sessiya va foydalanuvchi keshdan o'qilishini va yangilanishini tekshiradi."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('kassir', password='eski-parol')
+        self.client.login(username='kassir', password='eski-parol')
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        self.client.get('/settings/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/settings/')
+        self.assertEqual(len(queries), 0)
+
+    def test_password_change_ends_cached_session(self):
+        self.assertEqual(self.client.get('/settings/').status_code, 200)
+        self.user.set_password('yangi-parol')
+        self.user.save()
+        self.assertEqual(self.client.get('/settings/').status_code, 302)
+
+    def test_cached_user_expires_within_a_minute(self):
+        self.client.get('/settings/')
+        with patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            cache.delete(user_cache_key(self.user.pk))
+            self.client.get('/settings/')
+        timeouts = [call.args[2] for call in cache_set.call_args_list if call.args[0] == user_cache_key(self.user.pk)]
+        self.assertEqual(timeouts, [60])
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Asinxron ko'rinishlar sinxron bilan bir xil natija berishini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=7, days=40, stdout=StringIO())
+        self.user = User.objects.create_user('viewer')
+
+    def test_async_views_match_sync_views(self):
+        urls = ['/api/sales-data/?period=weekly', '/api/employee-performance/?period=this_year']
+        client = Client()
+        client.force_login(self.user)
+        expected = [client.get(url).json() for url in urls]
+
+        async def fetch():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            responses = [await client.get(url) for url in urls + ['/dashboard/']]
+            anonymous = await AsyncClient().get('/dashboard/')
+            return responses, anonymous
+
+        with routed(async_views=True):
+            self.assertIs(resolve('/dashboard/').func, async_views.dashboard)
+            responses, anonymous = async_to_sync(fetch)()
+        self.assertEqual([response.json() for response in responses[:2]], expected)
+        self.assertContains(responses[2], 'Dashboard')
+        self.assertEqual(anonymous.status_code, 302)
+
+    @override_settings(ROOT_URLCONF='main.tests')
+    def test_middleware_lets_async_requests_run_concurrently(self):
+        key = 'erp_db_queries_total{view="slow_async"}'
+        before = metrics.render()
+
+        async def fetch():
+            client = AsyncClient()
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(client.get('/slow/') for _ in range(5)))
+            return responses, time.perf_counter() - started
+
+        responses, elapsed = async_to_sync(fetch)()
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        # Serialised through one thread they would take 5 x 0.2s
+        self.assertLess(elapsed, 0.6)
+        # Queries on other threads still count towards their request
+        counted = [line for line in metrics.render().splitlines() if line.startswith(key + ' ')]
+        previous = [line for line in before.splitlines() if line.startswith(key + ' ')]
+        self.assertEqual(float(counted[0].rsplit(' ', 1)[1]) - float((previous or ['x 0'])[0].rsplit(' ', 1)[1]), 5)
+
+
+@override_settings(LIVE_FEED_KEEPALIVE=0.01, LIVE_FEED_MAX_SECONDS=5)
+class LiveFeedTest(TestCase):
+    """Sotuvlar jonli oqim orqali tranzaksiyadan keyin yetkazilishini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=8, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('viewer'))
+
+    def test_sale_reaches_open_stream_after_commit(self):
+        response = self.client.get('/live/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+
+        product = Product.objects.filter(stock_quantity=10).first() or Product.objects.first()
+        Product.objects.filter(pk=product.pk).update(stock_quantity=10)
+        data = {'product': product.id, 'employee': Employee.objects.first().id, 'quantity': 1, 'price': '2.50'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/sales/add/', data)
+
+        received = []
+        while len(received) < 2:
+            chunk = next(chunks).decode()
+            if not chunk.startswith(':'):
+                received.append(chunk)
+        response.close()
+        self.assertIn('event: sale', received[0])
+        self.assertIn('"price": "2.50"', received[0])
+        self.assertIn('event: stock', received[1])
+        self.assertIn('"low": true', received[1])
+
+    def test_nothing_is_built_without_listeners(self):
+        sale = Sale.objects.select_related('product').first()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            events.sale_recorded(sale)
+            events.sale_removed(sale)
+        self.assertEqual(len(queries), 0)
+
+    def test_dashboard_only_opens_the_feed_under_async_views(self):
+        self.assertNotContains(self.client.get('/dashboard/'), 'new EventSource')
+        with override_settings(ASYNC_VIEWS=True):
+            self.assertContains(self.client.get('/dashboard/'), 'new EventSource')
+
+
+class ApiV1Test(TestCase):
+    """JSON API: sahifalash, maydon tanlash va ommaviy yozuvlarni tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=9, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('pos'))
+
+    def post_json(self, url, items, method='post'):
+        return getattr(self.client, method)(url, json.dumps(items), content_type='application/json')
+
+    def test_cursor_pages_cover_every_row_in_one_query_each(self):
+        self.client.get('/api/v1/stock/?limit=1')  # session and user now cached
+        seen = []
+        cursor = ''
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.client.get(f'/api/v1/products/?fields=id,price&limit=7&cursor={cursor}').json()
+            self.assertEqual(len(queries), 1)
+            seen += [row['id'] for row in body['results']]
+            self.assertEqual(set(body['results'][0]), {'id', 'price'})
+            if body['next_cursor'] is None:
+                break
+            cursor = body['next_cursor']
+        self.assertEqual(seen, list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_bulk_sales_move_stock_once_per_product(self):
+        product = Product.objects.order_by('-stock_quantity').first()
+        employee = Employee.objects.first()
+        items = [{'product': product.id, 'employee': employee.id, 'quantity': 2, 'price': '3.50'}] * 3
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_json('/api/v1/sales/', items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['results']), 3)
+        product_after = Product.objects.get(pk=product.pk)
+        self.assertEqual(product_after.stock_quantity, product.stock_quantity - 6)
+        self.assertEqual(response.json()['stock'], {str(product.id): product_after.stock_quantity})
+
+    def test_invalid_batch_is_rejected_whole(self):
+        employee = Employee.objects.first()
+        items = [
+            {'product': Product.objects.first().id, 'employee': employee.id, 'quantity': 1, 'price': '1.00'},
+            {'product': 999999, 'employee': employee.id, 'quantity': 0, 'price': 'x'},
+        ]
+        count = Sale.objects.count()
+        response = self.post_json('/api/v1/sales/', items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual({error['field'] for error in response.json()['errors']}, {'product', 'quantity', 'price'})
+        self.assertEqual(Sale.objects.count(), count)
+
+    def test_bulk_product_update(self):
+        first, second = Product.objects.order_by('id')[:2]
+        response = self.post_json('/api/v1/products/', [
+            {'id': first.id, 'price': '9.99'}, {'id': second.id, 'name': 'Yangi nom'},
+        ], method='patch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(str(Product.objects.get(pk=first.pk).price), '9.99')
+        self.assertEqual(Product.objects.get(pk=second.pk).name, 'Yangi nom')
+
+    def test_anonymous_gets_json_401(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/v1/stock/').status_code, 401)
+
+
+class CsvImportTest(TestCase):
+    """CSV importi: nom bo'yicha bog'lash, qator xatolari va zaxira o'zgarishlarini tekshiradi."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Shirts')
+        self.product = Product.objects.create(name='Polo', category=self.category, size='M', price='10.00', stock_quantity=5)
+        Supplier.objects.create(name='Acme', contact_person='A', phone='1', email='a@example.com', address='x')
+        Employee.objects.create(name='Ali', position='Cashier', phone='1', email='ali@example.com')
+
+    def test_products_upsert_and_bad_rows_are_skipped(self):
+        result = import_csv('products', StringIO(
+            'Name,Category,Size,Color,Price,Stock Quantity\n'
+            'Polo,Shirts,M,,12.50,99\n'
+            'Cap,Hats,,Red,4.00,7\n'
+            ',Hats,,,1.00,0\n'
+            'Scarf,Hats,,,-1,0\n'
+        ))
+        self.assertEqual((result.rows, result.created, result.updated, result.failed), (4, 1, 1, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.product.refresh_from_db()
+        # Existing stock is never overwritten by a catalog import
+        self.assertEqual((str(self.product.price), self.product.stock_quantity), ('12.50', 5))
+        cap = Product.objects.get(name='Cap')
+        self.assertEqual((cap.category.name, cap.stock_quantity), ('Hats', 7))
+
+    def test_sales_batch_costs_the_same_queries_for_any_row_count(self):
+        def run(rows):
+            data = 'Product,Employee,Quantity,Price\n' + 'Polo,Ali,1,10.00\n' * rows
+            with CaptureQueriesContext(connection) as queries:
+                result = import_csv('sales', StringIO(data), batch_size=1000)
+            self.assertEqual(result.created, rows)
+            return len(queries)
+
+        run(1)  # creates the DataVersion rows
+        self.assertEqual(run(2), run(50))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 5 - 53)
+
+    def test_receipts_command_reports_unknown_names(self):
+        with NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('Product,Supplier,Quantity,Unit Price\nPolo,Acme,3,6.00\nPolo,Nobody,3,6.00\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_csv', 'inventory', handle.name, stdout=out, stderr=err)
+        self.assertIn('1 created', out.getvalue())
+        self.assertIn('Line 3: Supplier "Nobody" does not exist', err.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+        receipt = Inventory.objects.get()
+        self.assertEqual((str(receipt.line_value), receipt.location_id), ('18.00', Location.default_id()))
+
+    def test_upload_dry_run_writes_nothing(self):
+        self.client.force_login(User.objects.create_user('importer'))
+        upload = SimpleUploadedFile('sales.csv', '\ufeffProduct,Employee,Quantity,Price\nPolo,Ali,2,10\n'.encode())
+        response = self.client.post('/import/', {'kind': 'sales', 'file': upload, 'dry_run': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_sales_keep_the_date_of_the_export(self):
+        data = (
+            'Product,Category,Employee,Date,Quantity,Price,Total\n'
+            'Polo,Shirts,Ali,2024-03-05 14:30,1,10.00,10.00\n'
+            'Polo,Shirts,Ali,,1,10.00,10.00\n'
+            'Polo,Shirts,Ali,2999-01-01 00:00,1,10.00,10.00\n'
+            'Polo,Shirts,Ali,2024-02-01 09:00,1,10.00,10.00\n'
+            'Polo,Shirts,Ali,yesterday,1,10.00,10.00\n'
+        )
+        with patch('main.importers.archived_until', return_value=datetime.date(2024, 2, 29)):
+            result = import_csv('sales', StringIO(data))
+        self.assertEqual((result.created, [line for line, _ in result.errors]), (2, [4, 5, 6]))
+        dated, undated = Sale.objects.order_by('date_time')
+        self.assertEqual(dated.date_time, datetime.datetime(2024, 3, 5, 14, 30, tzinfo=datetime.timezone.utc))
+        self.assertEqual(undated.date_time.date(), timezone.now().date())
+        self.assertEqual(SalesCounter.objects.get(product=self.product).last_sold_at, undated.date_time)
+
+
+class ProfilingTest(TestCase):
+    """Profiling middleware: Server-Timing sarlavhasi va sekin so'rovlar jurnalini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=5, days=5, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('profiler'))
+
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/products/'))
+
+    @override_settings(PROFILING=True)
+    def test_server_timing_header(self):
+        timing = self.client.get('/products/')['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", dup;desc="\d+ repeated", tpl;dur=[\d.]+$')
+
+    @override_settings(PROFILING=True, PROFILING_SLOW_QUERY_MS=0)
+    def test_slow_request_is_logged_with_sql_and_call_site(self):
+        with self.assertLogs('main.profiling', 'WARNING') as logs:
+            self.client.get('/employees/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['path'], entry['status']), ('/employees/', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in entry['slow_queries']))
+        self.assertTrue(any((query['where'] or '').startswith('main/') for query in entry['slow_queries']))
+
+    def test_loop_queries_are_counted_as_repeated(self):
+        profile = Profile()
+        with connection.execute_wrapper(profile):
+            for product in Product.objects.all()[:3]:
+                product.category.name
+        self.assertEqual(profile.repeated_count(), 2)
+        self.assertTrue(profile.queries[-1][2].startswith('main/tests.py:'))
+
+
+class MetricsTest(TestCase):
+    """/metrics: Prometheus formatidagi hisoblagichlar va gistogrammalarni tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=5, days=5, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('scraper', is_staff=True))
+
+    def sample(self, body, line_start):
+        for line in body.splitlines():
+            if line.startswith(line_start + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+
+    def test_requests_latency_and_queries_per_view(self):
+        before = self.client.get('/metrics').content.decode()
+        self.client.get('/products/')
+        self.client.get('/products/')
+        body = self.client.get('/metrics').content.decode()
+        key = 'erp_http_requests_total{view="products",method="GET",status="2xx"}'
+        self.assertEqual(self.sample(body, key) - self.sample(before, key), 2)
+        inf = 'erp_http_request_duration_seconds_bucket{view="products",le="+Inf"}'
+        count = 'erp_http_request_duration_seconds_count{view="products"}'
+        self.assertEqual(self.sample(body, inf), self.sample(body, count))
+        self.assertGreater(self.sample(body, 'erp_db_queries_total{view="products"}'), 0)
+        self.assertIn('# TYPE erp_http_request_duration_seconds histogram', body)
+        self.assertIn('# HELP erp_http_request_duration_seconds Request latency by URL name', body)
+        self.assertEqual(body.count('# HELP '), body.count('# TYPE '))
+
+    def test_export_bytes_and_business_gauges(self):
+        key = 'erp_export_bytes_total{view="export_products"}'
+        before = self.sample(self.client.get('/metrics').content.decode(), key)
+        size = len(self.client.get('/export/products/').content)
+        body = self.client.get('/metrics').content.decode()
+        self.assertEqual(self.sample(body, key) - before, size)
+        self.assertEqual(
+            self.sample(body, 'erp_low_stock_products'),
+            Product.objects.filter(stock_quantity__lt=events.LOW_STOCK_LEVEL).count(),
+        )
+        self.assertIn('erp_sales_per_minute ', body)
+
+    def test_cache_hits_and_misses_are_counted(self):
+        hits = metrics.CACHE_REQUESTS.values[('hit',)]
+        cache.set('metrics-test', 1)
+        cache.get('metrics-test')
+        cache.get('metrics-test-missing')
+        self.assertEqual(metrics.CACHE_REQUESTS.values[('hit',)], hits + 1)
+
+    def test_only_staff_may_scrape_without_a_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+
+class SalesCounterTest(TestCase):
+    """Mahsulot savdo hisoblagichlari va eng ko'p sotilganlar hisobotini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=4, days=20, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('counter'))
+
+    def test_generated_counters_match_sales(self):
+        self.assertEqual(reconcile_sales_counters(dry_run=True), {})
+
+    def test_add_and_delete_sale_keep_counters_current(self):
+        product = Product.objects.order_by('-stock_quantity').first()
+        before = SalesCounter.objects.filter(product=product).first()
+        units = before.units_sold if before else 0
+        self.client.post('/sales/add/', {
+            'product': product.id, 'employee': Employee.objects.first().id, 'quantity': 3, 'price': '2.50',
+        })
+        counter = SalesCounter.objects.get(product=product)
+        self.assertEqual(counter.units_sold, units + 3)
+        sale = Sale.objects.latest('id')
+        self.assertEqual(counter.last_sold_at, sale.date_time)
+
+        self.client.post(f'/sales/delete/{sale.id}/')
+        counter.refresh_from_db()
+        self.assertEqual(counter.units_sold, units)
+        self.assertEqual(reconcile_sales_counters(dry_run=True), {})
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        counter = SalesCounter.objects.first()
+        SalesCounter.objects.filter(pk=counter.pk).update(units_sold=F('units_sold') + 7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('1 counters corrected (7 units of drift)', out.getvalue())
+        self.assertEqual(reconcile_sales_counters(dry_run=True), {})
+
+    def test_all_time_ranking_matches_period_ranking(self):
+        start = timezone.localdate() - datetime.timedelta(days=400)
+        for by in ('units', 'revenue'):
+            counted = [(row['product'].id, row['units'], row['revenue']) for row in top_sellers(5, by)]
+            summed = [(row['product'].id, row['units'], row['revenue']) for row in top_sellers(5, by, start=start)]
+            self.assertEqual(counted, summed)
+        category = Category.objects.first()
+        self.assertTrue(all(row['product'].category_id == category.id for row in top_sellers(5, category_id=category.id)))
+
+    def test_dashboard_and_report_pages(self):
+        best = top_sellers(1)[0]['product']
+        self.assertContains(self.client.get('/dashboard/'), best.name)
+        response = self.client.get('/reports/top-sellers/?by=revenue&date_range=this_month')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['by'], 'revenue')
+        # A category that is not an id is ignored, like a bad limit
+        response = self.client.get('/reports/top-sellers/?category=abc&limit=x')
+        self.assertEqual((response.status_code, response.context['limit']), (200, 10))
+
+
+class LineTotalTest(TestCase):
+    """Saqlangan line_total/line_value ustunlari va daromad yig'indilarini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=6, days=15, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('totals'))
+
+    def test_every_write_path_stores_the_line_total(self):
+        for sale in Sale.objects.all():
+            self.assertEqual(sale.line_total, sale.quantity * sale.price)
+        for receipt in Inventory.objects.all():
+            self.assertEqual(receipt.line_value, receipt.quantity * receipt.unit_price)
+        product = Product.objects.order_by('-stock_quantity').first()
+        self.client.post('/sales/add/', {
+            'product': product.id, 'employee': Employee.objects.first().id, 'quantity': 3, 'price': '0.10',
+        })
+        self.assertEqual(str(Sale.objects.latest('id').line_total), '0.30')
+
+    def test_revenue_counts_quantity(self):
+        expected = sum(sale.price * sale.quantity for sale in Sale.objects.all())
+        self.assertEqual(sales_summary()['line_total'], expected)
+        response = self.client.get('/sales/')
+        self.assertEqual(response.context['total_revenue'], expected)
+        with CaptureQueriesContext(connection) as queries:
+            sales_summary()
+        self.assertIn('SUM("main_sale"."line_total")', queries[0]['sql'])
+
+
+class AbcTest(TestCase):
+    """ABC tasnifi, uning Product'da saqlanishi va hisobotini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=8, days=15, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('abc'))
+
+    def expected_tiers(self):
+        revenue = {product.id: 0 for product in Product.objects.all()}
+        for sale in Sale.objects.all():
+            revenue[sale.product_id] += sale.line_total
+        total = sum(revenue.values())
+        ranked = sorted(revenue.items(), key=lambda item: (-item[1], item[0]))
+        tiers, running = {}, 0
+        for product_id, amount in ranked:
+            share_before = running / total
+            running += amount
+            tiers[product_id] = 'C' if not amount else 'A' if share_before < 0.8 else 'B' if share_before < 0.95 else 'C'
+        return tiers
+
+    def test_classify_stores_tiers_and_only_rewrites_changes(self):
+        counts, changed = abc.classify()
+        expected = self.expected_tiers()
+        self.assertEqual(dict(Product.objects.values_list('id', 'abc_class')), expected)
+        self.assertEqual(changed, len(expected))
+        self.assertEqual(sum(counts.values()), len(expected))
+        self.assertTrue(counts['A'] and counts['C'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(abc.classify()[1], 0)
+        self.assertIn('OVER', queries[-1]['sql'])
+        self.assertFalse(any(query['sql'].startswith('UPDATE') for query in queries))
+
+    def test_products_filter_by_tier_and_report(self):
+        call_command('classify_abc', stdout=StringIO())
+        response = self.client.get('/products/', {'tier': 'A'})
+        self.assertTrue(all(product.abc_class == 'A' for product in response.context['products']))
+        self.assertEqual(response.context['products'].paginator.count,
+                         Product.objects.filter(abc_class='A').count())
+
+        response = self.client.get('/reports/abc/')
+        self.assertEqual(response.status_code, 200)
+        rows = list(response.context['rows'])
+        expected = self.expected_tiers()
+        self.assertTrue(all(row['tier'] == expected[row['product'].id] for row in rows))
+        self.assertEqual([row['rank'] for row in rows], list(range(1, len(rows) + 1)))
+        self.assertEqual(sum(entry['count'] for entry in response.context['summary']), len(expected))
+
+
+class ForecastTest(TestCase):
+    """Talab prognozi va qayta buyurtma takliflarini tekshiradi."""
+
+    def test_demand_and_plan_are_vectorized_over_products(self):
+        weights = day_weights(4, 'sma')
+        # Product 0 sells 2 units every day, product 1 only 8 units yesterday, product 2 nothing
+        demand = daily_demand(
+            np.array([0, 0, 0, 0, 1]), np.array([0, 1, 2, 3, 0]), np.array([2., 2., 2., 2., 8.]), 3, weights,
+        )
+        self.assertEqual(demand.tolist(), [2.0, 2.0, 0.0])
+        ewma = daily_demand(np.array([0]), np.array([0]), np.array([8.]), 1, day_weights(4, 'ewma', 0.5))
+        self.assertGreater(ewma[0], 2.0)
+
+        days_of_cover, quantity = reorder_plan(np.array([4., 100., 0.]), demand, lead_time=7, cover=30)
+        self.assertEqual(days_of_cover[:2].tolist(), [2.0, 50.0])
+        self.assertEqual(quantity.tolist(), [70, 0, 0])
+
+    def test_forecast_stores_suggestions_shown_on_inventory_and_dashboard(self):
+        call_command('generate_data', scale=0.05, seed=9, days=20, stdout=StringIO())
+        product = Product.objects.filter(inventory__isnull=False).first()
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        Sale.objects.filter(product=product).delete()
+        sale = Sale.objects.create(product=product, employee=Employee.objects.first(), quantity=90, price=1)
+        Sale.objects.filter(pk=sale.pk).update(date_time=yesterday)
+        Product.objects.filter(pk=product.pk).update(stock_quantity=5)
+
+        summary = forecast(method='sma')
+        suggestion = ReorderSuggestion.objects.get(product=product)
+        self.assertEqual(summary['suggestions'], ReorderSuggestion.objects.count())
+        self.assertAlmostEqual(suggestion.daily_demand, 1.0)
+        self.assertEqual(suggestion.days_of_cover, 5.0)
+        self.assertEqual(suggestion.reorder_quantity, 37 - 5)
+        self.assertEqual(suggestion.supplier_id, product.inventory_set.latest('id').supplier_id)
+
+        self.client.force_login(User.objects.create_user('forecast'))
+        self.assertIn(suggestion, self.client.get('/inventory/').context['reorder_suggestions'])
+        self.assertEqual(self.client.get('/dashboard/').context['reorder_count'], summary['suggestions'])
+
+
+class PivotTest(TestCase):
+    """Kategoriya x davr pivot hisobotini, uning keshi va eksportini tekshiradi."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_data', scale=0.05, seed=10, days=40, stdout=StringIO())
+        cache.clear()
+        self.client.force_login(User.objects.create_user('pivot'))
+
+    def test_matrix_matches_the_sales(self):
+        end = timezone.localdate()
+        start = pivot.default_start('week', end)
+        with CaptureQueriesContext(connection) as queries:
+            result = pivot.build('week', start, end)
+        # Rollup boundary, the grouped sales and the categories
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(result['buckets']), 12)
+        self.assertEqual(result['buckets'][0].weekday(), 0)
+
+        names = result['categories']
+        for measure in pivot.MEASURES:
+            self.assertEqual(len(result['cells'][measure]), len(names))
+        expected_units = {name: 0 for name in names}
+        for sale in Sale.objects.filter(date_time__date__gte=result['buckets'][0]).select_related('product__category'):
+            expected_units[sale.product.category.name] += sale.quantity
+        rows, columns, total = pivot.table(result, 'units')
+        self.assertEqual({name: row_total for name, _, row_total in rows}, expected_units)
+        self.assertEqual(total, sum(expected_units.values()))
+
+    def test_report_is_cached_per_data_version_and_exports(self):
+        self.client.get('/reports/pivot/', {'kind': 'month', 'measure': 'units'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/reports/pivot/', {'kind': 'month', 'measure': 'count'})
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in queries))
+        before = response.context['grand_total']
+
+        product = Product.objects.order_by('-stock_quantity').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/sales/add/', {
+                'product': product.id, 'employee': Employee.objects.first().id, 'quantity': 1, 'price': '1.00',
+            })
+        response = self.client.get('/reports/pivot/', {'kind': 'month', 'measure': 'count'})
+        self.assertEqual(response.context['grand_total'], before + 1)
+
+        response = self.client.get('/export/sales/', {'kind': 'month', 'measure': 'count'})
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Category')
+        self.assertEqual(lines[-1].split(',')[-1], str(before + 1))
+        self.assertEqual(len(lines), Category.objects.count() + 2)
+
+    def test_reversed_range_gives_an_empty_pivot(self):
+        params = {'kind': 'day', 'start_date': '2026-10-10', 'end_date': '2026-10-01'}
+        response = self.client.get('/reports/pivot/', params)
+        self.assertEqual((response.status_code, response.context['grand_total']), (200, 0))
+        lines = self.client.get('/export/sales/', params).content.decode().splitlines()
+        self.assertEqual(lines[0], 'Category,Total')
+        self.assertEqual(lines[-1], 'Total,0')
+
+    def test_export_link_carries_the_pivot_parameters(self):
+        response = self.client.get('/reports/pivot/', {'measure': 'units'})
+        self.assertContains(response, '/export/sales/?measure=units&amp;kind=month')
+
+
+class AdminTest(TestCase):
+    """Admin ro'yxatlari katta jadvallarda ham arzon so'rovlar bilan ishlashini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=11, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+
+    def test_changelists_do_not_query_per_row_or_count_the_table(self):
+        for url in ('/admin/main/sale/', '/admin/main/inventory/', '/admin/main/product/'):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(len(queries), 10, url)
+            if url != '/admin/main/product/':
+                counts = [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+                self.assertTrue(all('LIMIT 10001' in sql for sql in counts), url)
+
+        response = self.client.get('/admin/main/sale/')
+        self.assertEqual(response.context['cl'].result_count, Sale.objects.count())
+
+    def test_count_ignores_id_gaps_and_caps_large_tables(self):
+        Sale.objects.order_by('-id')[:1].get().delete()
+        response = self.client.get('/admin/main/sale/')
+        self.assertEqual(response.context['cl'].result_count, Sale.objects.count())
+        with patch('main.admin.COUNT_LIMIT', 5), patch.object(EstimatedCountPaginator, 'limit', 5):
+            response = self.client.get('/admin/main/sale/')
+        self.assertEqual(response.context['cl'].result_count, 6)
+        self.assertContains(response, 'More than 5 sales')
+
+    def test_filtered_count_is_exact_below_the_limit(self):
+        employee = Employee.objects.first()
+        response = self.client.get('/admin/main/sale/', {'employee__id__exact': employee.id})
+        self.assertEqual(response.context['cl'].result_count, Sale.objects.filter(employee=employee).count())
+
+    def test_sale_form_uses_autocomplete(self):
+        response = self.client.get('/admin/main/sale/add/')
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'>{Product.objects.last()}</option>')
+
+
+class LocationTest(TestCase):
+    """Joylashuvlar bo'yicha qoldiq va umumiy qoldiq bir-biriga mos kelishini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=13, days=5, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('store'))
+        self.store = Location.objects.create(name='Chilonzor')
+        self.product = Product.objects.order_by('-stock_quantity').first()
+        self.employee = Employee.objects.first()
+
+    def level(self, location_id):
+        return ProductStock.objects.get(product=self.product, location_id=location_id).quantity
+
+    def assert_levels_add_up(self):
+        sums = dict(ProductStock.objects.values_list('product').annotate(total=Sum('quantity')))
+        self.assertEqual(sums, dict(Product.objects.values_list('id', 'stock_quantity')))
+
+    def test_existing_stock_sits_at_the_default_location(self):
+        default = Location.default_id()
+        self.assertEqual(self.level(default), self.product.stock_quantity)
+        self.assertFalse(Sale.objects.filter(location=None).exists())
+        self.assert_levels_add_up()
+
+    def test_receipts_and_sales_move_their_location_and_the_total(self):
+        default = Location.default_id()
+        before = self.level(default)
+        Inventory.objects.create(product=self.product, supplier=Supplier.objects.first(), location=self.store,
+                                 quantity=10, unit_price=1)
+        Sale.objects.create(product=self.product, employee=self.employee, location=self.store, quantity=4, price=2)
+        self.assertEqual(self.level(self.store.id), 6)
+        self.assertEqual(self.level(default), before)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, before + 6)
+        self.assert_levels_add_up()
+
+    def test_bulk_writes_and_deleting_a_location(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/inventory/', json.dumps([{
+                'product': self.product.id, 'supplier': Supplier.objects.first().id,
+                'quantity': 5, 'unit_price': '1.00', 'location': self.store.id,
+            }]), content_type='application/json')
+            self.client.post('/api/v1/sales/', json.dumps([
+                {'product': self.product.id, 'employee': self.employee.id, 'quantity': 2, 'price': '1.00',
+                 'location': self.store.id},
+                {'product': self.product.id, 'employee': self.employee.id, 'quantity': 1, 'price': '1.00'},
+            ]), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.level(self.store.id), 3)
+        self.assert_levels_add_up()
+
+        self.store.delete()
+        self.assert_levels_add_up()
+
+    def test_stock_filters_by_location(self):
+        Inventory.objects.create(product=self.product, supplier=Supplier.objects.first(), location=self.store,
+                                 quantity=7, unit_price=1)
+        body = self.client.get(f'/api/v1/stock/?location={self.store.id}').json()
+        self.assertEqual([(row['id'], row['stock_quantity']) for row in body['results']], [(self.product.id, 7)])
+
+        response = self.client.get('/products/', {'location': self.store.id})
+        self.assertEqual([product.id for product in response.context['products']], [self.product.id])
+        self.assertEqual(response.context['products'][0].stock_level, 7)
+        response = self.client.get('/inventory/', {'location': self.store.id})
+        self.assertEqual(len(response.context['inventories']), 1)
+        self.assertEqual(self.client.get('/products/', {'location': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/inventory/', {'location': 'abc'}).status_code, 400)
+
+    def test_admin_stock_edits_keep_the_locations_in_step(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        fields = {
+            'name': self.product.name, 'category': self.product.category_id, 'size': '', 'color': '',
+            'price': '9.99', 'abc_class': '',
+        }
+        response = self.client.post(f'/admin/main/product/{self.product.pk}/change/', {**fields, 'stock_quantity': 7})
+        self.assertEqual(response.status_code, 302)
+        self.client.post('/admin/main/product/add/', {**fields, 'name': 'Yangi', 'stock_quantity': 4})
+        self.assertEqual(Product.objects.get(name='Yangi').stock_quantity, 4)
+        self.assert_levels_add_up()
+
+    def test_a_sale_writes_the_product_row_with_a_delta_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            Sale.objects.create(product_id=self.product.id, employee=self.employee, location=self.store,
+                                quantity=1, price=1)
+        product_queries = [query['sql'] for query in queries if '"main_product"' in query['sql']]
+        self.assertEqual(len(product_queries), 1)
+        self.assertTrue(product_queries[0].startswith('UPDATE'))
+
+    def test_deferred_totals_leave_the_product_row_to_the_flush(self):
+        stock = self.product.stock_quantity
+        # Long enough that the background thread never gets there first
+        with override_settings(STOCK_TOTALS_DELAY_MS=60000):
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                products = record_sales([
+                    Sale(product=self.product, employee=self.employee, location=self.store, quantity=2, price=1),
+                ])
+            self.assertFalse(any('UPDATE "main_product"' in query['sql'] for query in queries))
+            self.assertEqual(products[self.product.id].stock_quantity, stock - 2)
+            self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, stock)
+            self.assertEqual(stocktotals.flush(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, stock - 2)
+        self.assert_levels_add_up()
+
+
+class PrecomputeTest(TestCase):
+    """Keshni oldindan to'ldirish va bir vaqtda hisoblashning oldi olinishini tekshiradi."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_data', scale=0.05, seed=14, days=10, stdout=StringIO())
+        self.client.force_login(User.objects.create_user('viewer'))
+        cache.clear()
+        precompute.store().clear()
+
+    def test_warmed_charts_and_dashboard_skip_the_sales_queries(self):
+        call_command('warm_cache', stdout=StringIO(), stderr=StringIO())
+        for url in ('/dashboard/', '/api/sales-data/?period=weekly', '/api/employee-performance/?period=all'):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(any('"main_sale"' in query['sql'] for query in queries), url)
+
+        cached = self.client.get('/api/sales-data/?period=weekly').json()
+        precompute.store().clear()
+        self.assertEqual(self.client.get('/api/sales-data/?period=weekly').json(), cached)
+
+    def test_command_refuses_a_per_process_cache(self):
+        with override_settings(PRECOMPUTE_CACHE='default'), self.assertRaises(CommandError):
+            call_command('warm_cache', stdout=StringIO())
+
+    def test_a_sale_invalidates_the_cached_series(self):
+        before = self.client.get('/api/sales-data/?period=monthly').json()['values']
+        product = Product.objects.filter(stock_quantity__gt=0).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(product=product, employee=Employee.objects.first(), quantity=1, price=1000)
+        after = self.client.get('/api/sales-data/?period=monthly').json()['values']
+        self.assertEqual(Decimal(str(after[-1])) - Decimal(str(before[-1])), 1000)
+
+    def test_warmed_dropdowns_render_from_the_cache(self):
+        precompute.warm()
+        versions = {name: version for name, (version, _) in current_versions().items()}
+        html = render_to_string('main/partials/employee_options.html',
+                                {'employees': [], 'selected': '', 'data_versions': versions,
+                                 'templates_version': templates_version()})
+        self.assertIn(Employee.objects.first().name, html)
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(precompute.single_flight('test:key', compute)))
+                   for _ in range(8)]
+        # The database cache would need a connection per thread outside the test transaction
+        with override_settings(PRECOMPUTE_CACHE='default'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(len(calls), 1)
+
+
+class GroupCommitTest(TransactionTestCase):
+    """Guruhlab yozish navbati savdolarni birgalikda va to'g'ri saqlashini tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=12, days=5, stdout=StringIO())
+        self.product = Product.objects.order_by('-stock_quantity').first()
+        self.employee = Employee.objects.first()
+
+    def sale(self, product_id=None):
+        return Sale(product_id=product_id or self.product.id, employee=self.employee, quantity=1, price=2)
+
+    def submit_concurrently(self, writer, product_ids):
+        errors = []
+
+        def submit(product_id):
+            try:
+                writer.submit(sales=[self.sale(product_id)])
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=submit, args=(product_id,)) for product_id in product_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_submissions_share_transactions(self):
+        writer = ingest.GroupCommitWriter(max_batch=50, max_delay_ms=50)
+        stock = self.product.stock_quantity
+        units = SalesCounter.objects.get(product=self.product).units_sold
+
+        self.assertEqual(self.submit_concurrently(writer, [self.product.id] * 20), [])
+        self.assertEqual(writer.submissions, 20)
+        self.assertLess(writer.batches, 20)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, stock - 20)
+        self.assertEqual(SalesCounter.objects.get(product=self.product).units_sold, units + 20)
+
+    def test_a_bad_submission_only_fails_its_caller(self):
+        writer = ingest.GroupCommitWriter(max_batch=50, max_delay_ms=200)
+        stock = self.product.stock_quantity
+        errors = self.submit_concurrently(writer, [self.product.id, 999999, self.product.id])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], IntegrityError)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, stock - 2)
+
+    def test_form_submits_through_the_writer(self):
+        client = Client()
+        client.force_login(User.objects.create_user('till'))
+        stock = self.product.stock_quantity
+        with override_settings(INGEST_QUEUE=True):
+            response = client.post('/sales/add/', {
+                'product': self.product.id, 'employee': self.employee.id, 'quantity': 2, 'price': '3.00',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, stock - 2)
+        self.assertEqual(str(Sale.objects.latest('id').line_total), '6.00')
+        self.assertGreater(ingest.writer().batches, 0)
+
+
+class StockCheckTest(TestCase):
+    """Qoldiqni kirim va sotuvlar daftari bilan solishtirish va tuzatishni tekshiradi."""
+
+    def setUp(self):
+        call_command('generate_data', scale=0.05, seed=15, days=40, stdout=StringIO())
+        self.product = Product.objects.order_by('-stock_quantity').first()
+
+    def test_generated_stock_matches_the_ledger_after_archiving(self):
+        call_command('archive_sales', days=20, stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reconcile_stock(dry_run=True), {})
+        self.assertLessEqual(len(queries), 6)
+
+    def test_drift_is_reported_then_fixed(self):
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=F('stock_quantity') + 5)
+        out = StringIO()
+        call_command('check_stock', stdout=out)
+        self.assertIn(f'{self.product.name}: stock {self.product.stock_quantity + 5}', out.getvalue())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, self.product.stock_quantity + 5)
+
+        call_command('check_stock', fix=True, stdout=StringIO())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, self.product.stock_quantity)
+        self.assertEqual(ProductStock.objects.filter(product=self.product).aggregate(total=Sum('quantity'))['total'],
+                         self.product.stock_quantity)
+        self.assertEqual(reconcile_stock(dry_run=True), {})
+
+    def test_deleting_a_receipt_keeps_stock_on_the_ledger(self):
+        self.client.force_login(User.objects.create_user('keeper'))
+        receipt = Inventory.objects.filter(product=self.product).latest('id')
+        self.client.post(f'/inventory/delete/{receipt.id}/')
+        self.assertFalse(Inventory.objects.filter(pk=receipt.pk).exists())
+        self.assertEqual(reconcile_stock(dry_run=True), {})
+
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, metrics, views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -7,7 +8,6 @@ urlpatterns = [
     path('products/', views.products, name='products'),
     path('products/add/', views.add_product, name='add_product'),
     path('products/edit/<int:product_id>/', views.edit_product, name='edit_product'),
-    path('inventory/delete/<int:inventory_id>/', views.delete_inventory, name='delete_inventory'),
     path('sales/', views.sales, name='sales'),
     path('sales/add/', views.add_sale, name='add_sale'),
     path('sales/view/<int:sale_id>/', views.view_sale, name='view_sale'),
@@ -22,17 +22,38 @@ urlpatterns = [
     path('employees/edit/<int:employee_id>/', views.edit_employee, name='edit_employee'),
     path('employees/delete/<int:employee_id>/', views.delete_employee, name='delete_employee'),
     path('reports/', views.reports, name='reports'),
+    path('reports/top-sellers/', views.top_sellers_report, name='top_sellers'),
+    path('reports/abc/', views.abc_report, name='abc_report'),
+    path('reports/pivot/', views.category_pivot_report, name='category_pivot'),
     path('settings/', views.settings, name='settings'),
     path('search/', views.search, name='search'),
     path('export/products/', views.export_products, name='export_products'),
     path('export/sales/', views.export_sales, name='export_sales'),
     path('export/inventory/', views.export_inventory, name='export_inventory'),
     path('export/employees/', views.export_employees, name='export_employees'),
+    path('import/', views.import_data, name='import_data'),
     path('api/sales-data/', views.api_sales_data, name='api_sales_data'),
     path('api/employee-performance/', views.api_employee_performance, name='api_employee_performance'),
+    path('avatar/<path:name>.svg', views.avatar, name='avatar'),
+    path('live/', views.live_feed, name='live_feed'),
+    path('api/v1/products/', api.products, name='api_products'),
+    path('api/v1/stock/', api.stock, name='api_stock'),
+    path('api/v1/locations/', api.locations, name='api_locations'),
+    path('api/v1/sales/', api.sales, name='api_sales'),
+    path('api/v1/inventory/', api.inventory, name='api_inventory'),
+    path('metrics', metrics.metrics_view, name='metrics'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('products/<int:product_id>/delete/', views.delete_product, name='delete_product'),
     path('sales/<int:sale_id>/delete/', views.delete_sale, name='delete_sale'),
     path('employees/<int:employee_id>/delete/', views.delete_employee, name='delete_employee'),
 ]
+
+if settings.ASYNC_VIEWS:
+    # Listed first, so they take over these paths from the sync views
+    urlpatterns = [
+        path('dashboard/', async_views.dashboard, name='dashboard'),
+        path('api/sales-data/', async_views.api_sales_data, name='api_sales_data'),
+        path('api/employee-performance/', async_views.api_employee_performance, name='api_employee_performance'),
+        path('live/', async_views.live_feed, name='live_feed'),
+    ] + urlpatterns
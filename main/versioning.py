@@ -0,0 +1,70 @@
+"""Conditional GET support keyed on DataVersion counters
+
+Every write path bumps the DataVersion row of the model it touches (see
+VersionedModel; bulk paths call DataVersion.bump themselves). A view
+decorated with @conditional('sale', 'product') gets an ETag and
+Last-Modified computed from one small query, and Django answers 304
+before the view's own queries run when the client's copy is current.
+"""
+import datetime
+import hashlib
+from collections import defaultdict
+
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+
+def data_versions(request):
+    """All DataVersion rows as {name: (version, updated_at)}, fetched once per request
+
+    The table holds one row per model, so loading it whole lets the ETag
+    check and the template fragment keys share a single query.
+    """
+    cached = getattr(request, '_data_versions', None)
+    if cached is None:
+        cached = request._data_versions = current_versions()
+    return cached
+
+
+def current_versions():
+    """All DataVersion rows as {name: (version, updated_at)}; (0, None) for names never bumped"""
+    return defaultdict(lambda: (0, None), (
+        (name, (version, updated_at))
+        for name, version, updated_at in DataVersion.objects.values_list('name', 'version', 'updated_at')
+    ))
+
+
+def conditional(*names, daily=False):
+    """ETag/Last-Modified for a view whose output depends on the named models
+
+    daily=True is for views that show "last N days" windows: their output
+    also changes at midnight, so the date is folded into both validators.
+    """
+    def etag(request, *args, **kwargs):
+        versions = data_versions(request)
+        parts = [str(request.user.pk), request.get_full_path()]
+        parts += [f'{name}:{versions[name][0]}' for name in sorted(names)]
+        if daily:
+            parts.append(timezone.localdate().isoformat())
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        versions = data_versions(request)
+        stamps = [versions[name][1] for name in names if versions[name][1]]
+        # A fresh login must not be answered with another user's cached page
+        if request.user.is_authenticated and request.user.last_login:
+            stamps.append(request.user.last_login)
+        if daily:
+            today = timezone.localdate()
+            stamps.append(timezone.make_aware(datetime.datetime.combine(today, datetime.time.min)))
+        return max(stamps) if stamps else None
+
+    def decorator(view):
+        # no-cache: browsers may keep the page but must revalidate every time
+        return cache_control(private=True, no_cache=True)(
+            condition(etag_func=etag, last_modified_func=last_modified)(view)
+        )
+    return decorator
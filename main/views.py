@@ -1,16 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.conf import settings as django_settings
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Sum, Count, Q
+from django.db import transaction
+from django.db.models import F, Sum, Count, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.cache import cache_control
 import csv
 import json
+from collections import defaultdict
 from decimal import Decimal
+from itertools import chain
 import datetime
-from .models import Product, Category, Sale, Inventory, Employee, Supplier
+from . import abc, events, fastjson, importers, ingest, pivot, precompute
+from .archive import archived_sales, daily_totals, day_range, sales_by, sales_summary, top_sellers
+from .avatars import avatar_svg
+from .models import Product, Category, Sale, Inventory, Employee, Location, ProductStock, ReorderSuggestion, Supplier
+from .versioning import conditional, data_versions
 
 def index(request):
     """Redirect to dashboard or login page"""
@@ -19,85 +29,198 @@ def index(request):
     else:
         return redirect('login')
 
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
+def _month_bounds(year, month):
+    """First and last day of a month"""
+    first = datetime.date(year, month, 1)
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return first, next_month - datetime.timedelta(days=1)
 
+def _recent_months(today, count):
+    """(year, month) pairs for the last `count` months, oldest first"""
+    months = []
+    for i in range(count):
+        month = today.month - i if today.month > i else 12 - (i - today.month)
+        year = today.year if today.month > i else today.year - 1
+        months.append((year, month))
+    months.reverse()
+    return months
 
-@login_required
-def dashboard(request):
-    """Display the main dashboard with key metrics and charts"""
-    # Get summary statistics
-    total_sales_amount = Sale.objects.aggregate(Sum('price'))['price__sum'] or 0
-    total_products = Product.objects.count()
-    low_stock_count = Product.objects.filter(stock_quantity__lt=10).count()
-    total_employees = Employee.objects.count()
-    
-    # Get recent sales
-    recent_sales = Sale.objects.select_related('product', 'employee').order_by('-date_time')[:10]
-    
-    # Get low stock products
-    low_stock_products = Product.objects.select_related('category').filter(stock_quantity__lt=10).order_by('stock_quantity')
-    
+def _date_bounds(params):
+    """Turn the date_range / start_date / end_date filters into inclusive dates"""
+    start = end = None
+    date_range = params.get('date_range')
+    if date_range:
+        today = timezone.now().date()
+        if date_range == 'today':
+            start = end = today
+        elif date_range == 'yesterday':
+            start = end = today - datetime.timedelta(days=1)
+        elif date_range == 'this_week':
+            start = today - datetime.timedelta(days=today.weekday())
+        elif date_range == 'last_week':
+            start = today - datetime.timedelta(days=today.weekday() + 7)
+            end = start + datetime.timedelta(days=6)
+        elif date_range == 'this_month':
+            start, end = _month_bounds(today.year, today.month)
+        elif date_range == 'last_month':
+            last_month = today.month - 1 if today.month > 1 else 12
+            year = today.year if today.month > 1 else today.year - 1
+            start, end = _month_bounds(year, last_month)
+
+    # An explicit range narrows whatever date_range selected
+    start_date = parse_date(params.get('start_date') or '')
+    end_date = parse_date(params.get('end_date') or '')
+    if start_date and end_date:
+        start = max(start, start_date) if start else start_date
+        end = min(end, end_date) if end else end_date
+    return start, end
+
+def _sales_filters(params):
+    """Date bounds plus the employee/category lookups shared by sales views"""
+    filters = {}
+    if params.get('employee'):
+        filters['employee_id'] = params.get('employee')
+    if params.get('category'):
+        filters['product__category_id'] = params.get('category')
+    start, end = _date_bounds(params)
+    return start, end, filters
+
+def _location_param(params):
+    """?location= as an id, or None; raises ValueError for anything else"""
+    value = params.get('location')
+    return int(value) if value else None
+
+def _filter_dates(queryset, field, start, end):
+    return queryset.filter(**day_range(field, start, end))
+
+
+# Models the dashboard and the chart endpoints read, for their ETags and cache keys
+DASHBOARD_MODELS = ('sale', 'product', 'employee', 'category', 'reordersuggestion')
+SALES_SERIES_MODELS = ('sale',)
+PERFORMANCE_MODELS = ('sale', 'employee')
+# Chart periods the dashboard asks for; the warm_cache command fills each one
+SALES_PERIODS = ('daily', 'weekly', 'monthly')
+PERFORMANCE_PERIODS = ('this_month', 'last_month', 'this_year', 'all')
+
+
+def dashboard_queries(today):
+    """The dashboard's independent queries, by name
+
+    The sync view runs them one after another; main.async_views runs them
+    concurrently. Querysets are evaluated inside the callables so the work
+    happens wherever they are called.
+    """
+    thirty_days_ago = today - datetime.timedelta(days=30)
+    return {
+        # Archived sales are included through their rollups
+        'total_sales_amount': lambda: sales_summary()['line_total'],
+        'total_products': Product.objects.count,
+        'low_stock_count': Product.objects.filter(stock_quantity__lt=10).count,
+        'total_employees': Employee.objects.count,
+        'recent_sales': lambda: list(
+            Sale.objects.select_related('product', 'employee').order_by('-date_time')[:10]
+        ),
+        'low_stock_products': lambda: list(
+            Product.objects.select_related('category').filter(stock_quantity__lt=10).order_by('stock_quantity')
+        ),
+        'daily': lambda: daily_totals(thirty_days_ago, today - datetime.timedelta(days=1)),
+        'categories': lambda: list(Category.objects.all()),
+        'by_category': lambda: sales_by('product__category'),
+        'top_sellers': lambda: top_sellers(5),
+        'reorder_count': ReorderSuggestion.objects.count,
+        'reorder_suggestions': lambda: list(
+            ReorderSuggestion.objects.select_related('product', 'supplier').order_by('days_of_cover')[:5]
+        ),
+    }
+
+def dashboard_context(today, results):
+    """Template context from the results of dashboard_queries"""
     # Prepare sales chart data (last 30 days)
-    today = timezone.now().date()
     thirty_days_ago = today - datetime.timedelta(days=30)
-    
     sales_data = []
     sales_dates = []
-    
     for i in range(30):
         date = thirty_days_ago + datetime.timedelta(days=i)
-        day_sales = Sale.objects.filter(date_time__date=date).aggregate(Sum('price'))['price__sum'] or 0
-        sales_data.append(day_sales)
+        sales_data.append(results['daily'][date]['line_total'])
         sales_dates.append(date.strftime('%b %d'))
     
     # Prepare category chart data
-    categories = Category.objects.all()
     category_names = []
     category_data = []
-    
-    for category in categories:
+    for category in results['categories']:
         category_names.append(category.name)
-        category_sales = Sale.objects.filter(product__category=category).count()
-        category_data.append(category_sales)
-    
-    context = {
-        'total_sales_amount': total_sales_amount,
-        'total_products': total_products,
-        'low_stock_count': low_stock_count,
-        'total_employees': total_employees,
-        'recent_sales': recent_sales,
-        'low_stock_products': low_stock_products,
-        'sales_data': json.dumps(sales_data, default=decimal_default),
+        category_data.append(results['by_category'][category.id]['line_total'])
+    
+    return {
+        'total_sales_amount': results['total_sales_amount'],
+        'total_products': results['total_products'],
+        'low_stock_count': results['low_stock_count'],
+        'total_employees': results['total_employees'],
+        'recent_sales': results['recent_sales'],
+        'low_stock_products': results['low_stock_products'],
+        'top_sellers': results['top_sellers'],
+        'reorder_count': results['reorder_count'],
+        'reorder_suggestions': results['reorder_suggestions'],
+        'sales_data': fastjson.dumps(sales_data),
         'sales_dates': json.dumps(sales_dates),
         'category_names': json.dumps(category_names),
-        'category_data': json.dumps(category_data),
+        'category_data': fastjson.dumps(category_data),
+        # A sync /live/ stream holds a WSGI thread for LIVE_FEED_MAX_SECONDS per open tab
+        'live_feed': django_settings.ASYNC_VIEWS,
     }
-    
-    return render(request, 'main/dashboard.html', context)
+
+def dashboard_results(today, versions):
+    """Results of dashboard_queries, cached until one of DASHBOARD_MODELS changes"""
+    return precompute.single_flight(
+        precompute.key('dashboard', today, versions, DASHBOARD_MODELS),
+        lambda: {name: query() for name, query in dashboard_queries(today).items()},
+    )
 
 @login_required
+@conditional(*DASHBOARD_MODELS, daily=True)
+def dashboard(request):
+    """Display the main dashboard with key metrics and charts"""
+    today = timezone.now().date()
+    results = dashboard_results(today, data_versions(request))
+    return render(request, 'main/dashboard.html', dashboard_context(today, results))
+
+@login_required
+@conditional('product', 'category', 'location')
 def products(request):
     """Display and manage products"""
     # Get filter parameters
     category_id = request.GET.get('category')
     stock_status = request.GET.get('stock')
+    tier = request.GET.get('tier')
+    try:
+        location_id = _location_param(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('location must be a location id')
     
     # Apply filters
     products_list = Product.objects.select_related('category').all()
     
+    # stock_level is the stock at the chosen location, or the total; one
+    # location's rows come straight from the (location, quantity) index
+    if location_id is not None:
+        products_list = products_list.filter(stock_levels__location_id=location_id).annotate(
+            stock_level=F('stock_levels__quantity'))
+    else:
+        products_list = products_list.annotate(stock_level=F('stock_quantity'))
+    
     if category_id:
         products_list = products_list.filter(category_id=category_id)
     
     if stock_status:
         if stock_status == 'in_stock':
-            products_list = products_list.filter(stock_quantity__gt=10)
+            products_list = products_list.filter(stock_level__gt=10)
         elif stock_status == 'low_stock':
-            products_list = products_list.filter(stock_quantity__gt=0, stock_quantity__lt=10)
+            products_list = products_list.filter(stock_level__gt=0, stock_level__lt=10)
         elif stock_status == 'out_of_stock':
-            products_list = products_list.filter(stock_quantity=0)
+            products_list = products_list.filter(stock_level=0)
+    
+    if tier in abc.TIERS:
+        products_list = products_list.filter(abc_class=tier)
     
     # Paginate results
     paginator = Paginator(products_list.order_by('name'), 10)
@@ -110,6 +233,8 @@ def products(request):
     context = {
         'products': products,
         'categories': categories,
+        'tiers': abc.TIERS,
+        'locations': Location.objects.all(),
     }
     
     return render(request, 'main/products.html', context)
@@ -134,6 +259,8 @@ def add_product(request):
             stock_quantity=stock_quantity
         )
         product.save()
+        # Opening stock goes to the default location
+        ProductStock.rebalance([product.pk])
         
         return redirect('products')
     
@@ -153,6 +280,8 @@ def edit_product(request, product_id):
         product.price = request.POST.get('price')
         product.stock_quantity = request.POST.get('stock_quantity')
         product.save()
+        # A new total is a correction at the default location
+        ProductStock.rebalance([product.pk])
         
         return redirect('products')
     
@@ -184,54 +313,18 @@ def delete_product(request, product_id):
 def sales(request):
     """Display and manage sales"""
     # Get filter parameters
-    date_range = request.GET.get('date_range')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    employee_id = request.GET.get('employee')
-    category_id = request.GET.get('category')
+    start, end, filters = _sales_filters(request.GET)
     
     # Apply filters
-    sales_list = Sale.objects.select_related('product', 'employee', 'product__category').all()
-    
-    if date_range:
-        today = timezone.now().date()
-        if date_range == 'today':
-            sales_list = sales_list.filter(date_time__date=today)
-        elif date_range == 'yesterday':
-            yesterday = today - datetime.timedelta(days=1)
-            sales_list = sales_list.filter(date_time__date=yesterday)
-        elif date_range == 'this_week':
-            start_of_week = today - datetime.timedelta(days=today.weekday())
-            sales_list = sales_list.filter(date_time__date__gte=start_of_week)
-        elif date_range == 'last_week':
-            start_of_last_week = today - datetime.timedelta(days=today.weekday() + 7)
-            end_of_last_week = start_of_last_week + datetime.timedelta(days=6)
-            sales_list = sales_list.filter(date_time__date__gte=start_of_last_week, date_time__date__lte=end_of_last_week)
-        elif date_range == 'this_month':
-            sales_list = sales_list.filter(date_time__month=today.month, date_time__year=today.year)
-        elif date_range == 'last_month':
-            last_month = today.month - 1 if today.month > 1 else 12
-            year = today.year if today.month > 1 else today.year - 1
-            sales_list = sales_list.filter(date_time__month=last_month, date_time__year=year)
-    
-    if start_date and end_date:
-        sales_list = sales_list.filter(date_time__date__gte=start_date, date_time__date__lte=end_date)
-    
-    if employee_id:
-        sales_list = sales_list.filter(employee_id=employee_id)
-    
-    if category_id:
-        sales_list = sales_list.filter(product__category_id=category_id)
+    sales_list = Sale.objects.select_related('product', 'employee', 'product__category').filter(**filters)
+    sales_list = _filter_dates(sales_list, 'date_time', start, end)
     
-    # Calculate totals
-    total_sales = sales_list.count()
-    total_revenue = sales_list.aggregate(Sum('price'))['price__sum'] or 0
+    # Calculate totals over hot and archived sales
+    summary = sales_summary(start, end, **filters)
+    total_sales = summary['count']
+    total_revenue = summary['line_total']
     average_sale = total_revenue / total_sales if total_sales > 0 else 0
     
-    # Add total_price to each sale
-    for sale in sales_list:
-        sale.total_price = sale.price * sale.quantity
-    
     # Paginate results
     paginator = Paginator(sales_list.order_by('-date_time'), 10)
     page = request.GET.get('page', 1)
@@ -246,6 +339,7 @@ def sales(request):
         'sales': sales,
         'employees': employees,
         'categories': categories,
+        'locations': Location.objects.all(),
         'all_products': all_products,
         'total_sales': total_sales,
         'total_revenue': total_revenue,
@@ -267,10 +361,18 @@ def add_sale(request):
         sale = Sale(
             product_id=product_id,
             employee_id=employee_id,
+            location_id=_location_param(request.POST),
             quantity=quantity,
             price=price
         )
+        if django_settings.INGEST_QUEUE:
+            # Committed together with other tills' sales; sends its own events
+            sale.product_id, sale.employee_id = int(product_id), int(employee_id)
+            ingest.writer().submit(sales=[sale])
+            return redirect('sales')
         sale.save()
+        events.sale_recorded(sale)
+        events.stock_moved(sale.product, sale.product.stock_quantity + quantity)
         
         return redirect('sales')
     
@@ -294,12 +396,15 @@ def delete_sale(request, sale_id):
     sale = get_object_or_404(Sale, id=sale_id)
     
     if request.method == 'POST':
-        # Restore product stock quantity
-        product = sale.product
-        product.stock_quantity += sale.quantity
-        product.save()
-        
-        sale.delete()
+        with transaction.atomic():
+            # Restore product stock quantity
+            product = sale.product
+            ProductStock.move({(product.pk, sale.location_id or Location.default_id()): sale.quantity})
+            product.stock_quantity += sale.quantity
+            events.sale_removed(sale)
+            events.stock_moved(product, product.stock_quantity - sale.quantity)
+            
+            sale.delete()
         return redirect('sales')
     
     context = {
@@ -314,16 +419,23 @@ def inventory(request):
     # Get filter parameters
     supplier_id = request.GET.get('supplier')
     category_id = request.GET.get('category')
+    try:
+        location_id = _location_param(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest('location must be a location id')
     date_range = request.GET.get('date_range')
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     
     # Apply filters
-    inventories_list = Inventory.objects.select_related('product', 'supplier', 'product__category').all()
+    inventories_list = Inventory.objects.select_related('product', 'supplier', 'product__category', 'location').all()
     
     if supplier_id:
         inventories_list = inventories_list.filter(supplier_id=supplier_id)
     
+    if location_id is not None:
+        inventories_list = inventories_list.filter(location_id=location_id)
+    
     if category_id:
         inventories_list = inventories_list.filter(product__category_id=category_id)
     
@@ -346,13 +458,9 @@ def inventory(request):
     
     # Calculate totals
     total_products = inventories_list.values('product').distinct().count()
-    total_items = inventories_list.aggregate(Sum('quantity'))['quantity__sum'] or 0
-    total_value = 0
-    
-    # Add total_value to each inventory item
-    for inventory in inventories_list:
-        inventory.total_value = inventory.quantity * inventory.unit_price
-        total_value += inventory.total_value
+    totals = inventories_list.aggregate(items=Sum('quantity'), value=Sum('line_value'))
+    total_items = totals['items'] or 0
+    total_value = totals['value'] or 0
     
     # Paginate results
     paginator = Paginator(inventories_list.order_by('-date_received'), 10)
@@ -363,11 +471,15 @@ def inventory(request):
     suppliers = Supplier.objects.all()
     categories = Category.objects.all()
     all_products = Product.objects.all()
+    # Products that run out within the lead time, soonest first
+    reorder_suggestions = ReorderSuggestion.objects.select_related('product', 'supplier').order_by('days_of_cover')[:20]
     
     context = {
         'inventories': inventories,
+        'reorder_suggestions': reorder_suggestions,
         'suppliers': suppliers,
         'categories': categories,
+        'locations': Location.objects.all(),
         'all_products': all_products,
         'total_products': total_products,
         'total_items': total_items,
@@ -389,10 +501,16 @@ def add_inventory(request):
         inventory = Inventory(
             product_id=product_id,
             supplier_id=supplier_id,
+            location_id=_location_param(request.POST),
             quantity=quantity,
             unit_price=unit_price
         )
+        if django_settings.INGEST_QUEUE:
+            inventory.product_id, inventory.supplier_id = int(product_id), int(supplier_id)
+            ingest.writer().submit(receipts=[inventory])
+            return redirect('inventory')
         inventory.save()
+        events.stock_moved(inventory.product, inventory.product.stock_quantity - quantity)
         
         return redirect('inventory')
     
@@ -416,12 +534,14 @@ def delete_inventory(request, inventory_id):
     inventory = get_object_or_404(Inventory, id=inventory_id)
     
     if request.method == 'POST':
-        # Reduce product stock quantity
-        product = inventory.product
-        product.stock_quantity -= inventory.quantity
-        product.save()
-        
-        inventory.delete()
+        with transaction.atomic():
+            # Reduce product stock quantity
+            product = inventory.product
+            ProductStock.move({(product.pk, inventory.location_id or Location.default_id()): -inventory.quantity})
+            product.stock_quantity -= inventory.quantity
+            events.stock_moved(product, product.stock_quantity + inventory.quantity)
+            
+            inventory.delete()
         return redirect('inventory')
     
     context = {
@@ -430,26 +550,17 @@ def delete_inventory(request, inventory_id):
     
     return render(request, 'main/delete_inventory.html', context)
 
-@login_required
-def delete_inventory(request, inventory_id):
-    if request.method == 'POST':
-        inventory = get_object_or_404(Inventory, pk=inventory_id)
-        inventory.delete()
-        return redirect('inventory')
-    # (You could also redirect or raise 405 if GET—just be sure it matches your logic.)
-
-
 @login_required
 def employees(request):
     """Display and manage employees"""
     employees_list = Employee.objects.all()
 
     # Calculate sales performance for each employee
-    max_sales = Sale.objects.values('employee').annotate(count=Count('id')).order_by('-count').first()
-    max_count = max_sales['count'] if max_sales else 1
+    by_employee = sales_by('employee')
+    max_count = max((row['count'] for row in by_employee.values()), default=1)
 
     for employee in employees_list:
-        employee.sales_count = Sale.objects.filter(employee=employee).count()
+        employee.sales_count = by_employee[employee.id]['count']
         employee.performance_percentage = (employee.sales_count / max_count) * 100 if max_count > 0 else 0
 
     # Prepare chart data
@@ -510,38 +621,26 @@ def employee_detail(request, employee_id):
     sales = Sale.objects.filter(employee=employee).select_related('product').order_by('-date_time')
 
     # Calculate statistics
-    total_sales = sales.count()
-    total_revenue = sales.aggregate(Sum('price'))['price__sum'] or 0
+    summary = sales_summary(employee=employee)
+    total_sales = summary['count']
+    total_revenue = summary['line_total']
 
     # Prepare monthly sales data for chart
     today = timezone.now().date()
-    months_data = []
-    months_labels = []
+    months = _recent_months(today, 6)
+    monthly = defaultdict(Decimal)
+    for day, row in daily_totals(datetime.date(*months[0], 1), today, employee=employee).items():
+        monthly[(day.year, day.month)] += row['line_total']
 
-    for i in range(6):
-        month = today.month - i if today.month > i else 12 - (i - today.month)
-        year = today.year if today.month > i else today.year - 1
-
-        month_sales = Sale.objects.filter(
-            employee=employee,
-            date_time__month=month,
-            date_time__year=year
-        ).aggregate(Sum('price'))['price__sum'] or 0
-
-        month_name = datetime.date(year, month, 1).strftime('%b %Y')
-        months_data.append(month_sales)
-        months_labels.append(month_name)
-
-    # Reverse lists to show chronological order
-    months_data.reverse()
-    months_labels.reverse()
+    months_data = [monthly[month] for month in months]
+    months_labels = [datetime.date(year, month, 1).strftime('%b %Y') for year, month in months]
 
     context = {
         'employee': employee,
         'sales': sales[:10],  # Show only the 10 most recent sales
         'total_sales': total_sales,
         'total_revenue': total_revenue,
-        'months_data': json.dumps(months_data, default=decimal_default),
+        'months_data': fastjson.dumps(months_data),
         'months_labels': json.dumps(months_labels),
     }
 
@@ -592,35 +691,151 @@ def delete_employee(request, employee_id):
 @login_required
 def reports(request):
     """Generate and display reports"""
-    # Get report type
+    # Get report type and optional start_date/end_date bounds
     report_type = request.GET.get('type', 'sales')
+    start, end = _date_bounds(request.GET)
+    today = timezone.now().date()
     
+    # Summary cards
     context = {
         'report_type': report_type,
+        'total_sales_amount': sales_summary(start, end)['line_total'],
+        'total_products': Product.objects.count(),
+        'total_employees': Employee.objects.count(),
+        'low_stock_count': Product.objects.filter(stock_quantity__lt=10).count(),
     }
     
-    if report_type == 'sales':
-        # Sales report
-        sales_data = Sale.objects.select_related('product', 'employee').order_by('-date_time')
-        context['sales_data'] = sales_data
-        
-    elif report_type == 'inventory':
-        # Inventory report
-        inventory_data = Product.objects.select_related('category').all()
-        context['inventory_data'] = inventory_data
-        
-    elif report_type == 'employee':
-        # Employee performance report
-        employees_data = Employee.objects.all()
-        
-        for employee in employees_data:
-            employee.sales_count = Sale.objects.filter(employee=employee).count()
-            employee.sales_revenue = Sale.objects.filter(employee=employee).aggregate(Sum('price'))['price__sum'] or 0
-        
-        context['employees_data'] = employees_data
+    # Sales chart (last 7 days, same series as the "week" button)
+    week_start = today - datetime.timedelta(days=6)
+    daily = daily_totals(week_start, today)
+    week = [week_start + datetime.timedelta(days=i) for i in range(7)]
+    context['sales_dates'] = json.dumps([day.strftime('%b %d') for day in week])
+    context['sales_data'] = fastjson.dumps([daily[day]['line_total'] for day in week])
+    
+    # Category chart
+    categories = Category.objects.all()
+    by_category = sales_by('product__category', start, end)
+    context['category_names'] = json.dumps([category.name for category in categories])
+    context['category_data'] = json.dumps([by_category[category.id]['count'] for category in categories])
+    
+    # Employee performance table
+    employees = list(Employee.objects.all())
+    by_employee = sales_by('employee', start, end)
+    max_count = max((row['count'] for row in by_employee.values()), default=0)
+    for employee in employees:
+        employee.sales_count = by_employee[employee.id]['count']
+        employee.sales_amount = by_employee[employee.id]['line_total']
+        employee.performance_percentage = (employee.sales_count / max_count) * 100 if max_count > 0 else 0
+    context['employees'] = employees
+    
+    # Recent sales; a start date reaching the archive pulls archived rows in too
+    recent = _filter_dates(
+        Sale.objects.select_related('product', 'employee').order_by('-date_time'), 'date_time', start, end
+    )[:10]
+    recent_sales = list(chain(recent, archived_sales(start, end).order_by('-date_time')[:10]))[:10]
+    context['recent_sales'] = recent_sales
     
     return render(request, 'main/reports.html', context)
 
+@login_required
+@conditional('sale', 'product', 'category', daily=True)
+def top_sellers_report(request):
+    """Best-selling products by units or revenue, per category and period"""
+    start, end = _date_bounds(request.GET)
+    by = 'revenue' if request.GET.get('by') == 'revenue' else 'units'
+    try:
+        category_id = int(request.GET['category'])
+    except (KeyError, ValueError):
+        category_id = None
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 100)
+    except ValueError:
+        limit = 10
+
+    context = {
+        'rows': top_sellers(limit, by, start, end, category_id),
+        'by': by,
+        'limit': limit,
+        'start': start,
+        'end': end,
+    }
+    return render(request, 'main/top_sellers.html', context)
+
+@login_required
+@conditional('sale', 'product', daily=True)
+def abc_report(request):
+    """Products ranked by revenue share with their A/B/C tier and stock"""
+    try:
+        days = min(max(int(request.GET['days']), 1), 3650)
+    except (KeyError, ValueError):
+        days = django_settings.ABC_PERIOD_DAYS
+    ranked = abc.ranking(abc.period_start(days)).select_related('category')
+
+    # The window totals cover every product, so the tier filter is applied
+    # here rather than in SQL
+    tier_filter = request.GET.get('tier')
+    summary = {tier: {'tier': tier, 'count': 0, 'revenue': Decimal('0'), 'stock': 0} for tier in abc.TIERS}
+    rows = []
+    total = Decimal('0')
+    for rank, product in enumerate(ranked, 1):
+        tier = abc.tier(product.revenue, product.running, product.total)
+        total = product.total or total
+        summary[tier]['count'] += 1
+        summary[tier]['revenue'] += product.revenue
+        summary[tier]['stock'] += product.stock_quantity
+        if tier_filter in abc.TIERS and tier != tier_filter:
+            continue
+        rows.append({
+            'rank': rank,
+            'product': product,
+            'revenue': product.revenue,
+            'share': product.revenue / total * 100 if total else 0,
+            'cumulative': product.running / total * 100 if total else 0,
+            'tier': tier,
+        })
+    for entry in summary.values():
+        entry['share'] = entry['revenue'] / total * 100 if total else 0
+
+    paginator = Paginator(rows, 50)
+    context = {
+        'rows': paginator.get_page(request.GET.get('page', 1)),
+        'summary': list(summary.values()),
+        'total': total,
+        'days': days,
+        'tiers': abc.TIERS,
+    }
+    return render(request, 'main/abc_report.html', context)
+
+def _pivot_params(request):
+    """(kind, measure, pivot) from the query string of the category pivot views"""
+    kind = request.GET.get('kind') if request.GET.get('kind') in pivot.KINDS else 'month'
+    measure = request.GET.get('measure') if request.GET.get('measure') in pivot.MEASURES else 'revenue'
+    start, end = _date_bounds(request.GET)
+    end = end or timezone.localdate()
+    start = start or pivot.default_start(kind, end)
+    return kind, measure, pivot.category_pivot(kind, start, end, data_versions(request))
+
+@login_required
+@conditional('sale', 'category', daily=True)
+def category_pivot_report(request):
+    """Units, revenue or sale count per category and day, week or month"""
+    kind, measure, result = _pivot_params(request)
+    rows, columns, total = pivot.table(result, measure)
+    export_query = request.GET.copy()
+    export_query['kind'], export_query['measure'] = kind, measure
+    context = {
+        'kind': kind,
+        'measure': measure,
+        'kinds': pivot.KINDS,
+        'measures': pivot.MEASURES,
+        'buckets': result['buckets'],
+        'rows': rows,
+        'column_totals': columns,
+        'grand_total': total,
+        'export_query': export_query.urlencode(),
+    }
+    return render(request, 'main/category_pivot.html', context)
+
 @login_required
 def settings(request):
     """User and system settings"""
@@ -667,7 +882,13 @@ def search(request):
     
     return render(request, 'main/search_results.html', context)
 
+@cache_control(public=True, max_age=365 * 24 * 3600, immutable=True)
+def avatar(request, name):
+    """Initials avatar as SVG; the URL fully determines the image"""
+    return HttpResponse(avatar_svg(name, request.GET.get('size', 40)), content_type='image/svg+xml')
+
 @login_required
+@conditional('product', 'category')
 def export_products(request):
     """Export products to CSV"""
     response = HttpResponse(content_type='text/csv')
@@ -690,9 +911,27 @@ def export_products(request):
     
     return response
 
+def _export_pivot(request):
+    """The category pivot of one measure as CSV; export_sales with ?kind="""
+    kind, measure, result = _pivot_params(request)
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="category_{measure}_by_{kind}.csv"'
+    
+    writer = csv.writer(response)
+    writer.writerow(['Category'] + [day.isoformat() for day in result['buckets']] + ['Total'])
+    rows, columns, total = pivot.table(result, measure)
+    for name, values, row_total in rows:
+        writer.writerow([name] + values + [row_total])
+    writer.writerow(['Total'] + columns + [total])
+    
+    return response
+
 @login_required
+@conditional('sale', 'product', 'employee', 'category', daily=True)
 def export_sales(request):
-    """Export sales to CSV"""
+    """Export sales to CSV, or their category pivot when ?kind= is given"""
+    if 'kind' in request.GET:
+        return _export_pivot(request)
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="sales.csv"'
     
@@ -700,43 +939,12 @@ def export_sales(request):
     writer.writerow(['Product', 'Category', 'Employee', 'Date', 'Quantity', 'Price', 'Total'])
     
     # Apply the same filters as in the sales view
-    date_range = request.GET.get('date_range')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    employee_id = request.GET.get('employee')
-    category_id = request.GET.get('category')
-    
-    sales = Sale.objects.select_related('product', 'employee', 'product__category').all()
-    
-    if date_range:
-        today = timezone.now().date()
-        if date_range == 'today':
-            sales = sales.filter(date_time__date=today)
-        elif date_range == 'yesterday':
-            yesterday = today - datetime.timedelta(days=1)
-            sales = sales.filter(date_time__date=yesterday)
-        elif date_range == 'this_week':
-            start_of_week = today - datetime.timedelta(days=today.weekday())
-            sales = sales.filter(date_time__date__gte=start_of_week)
-        elif date_range == 'last_week':
-            start_of_last_week = today - datetime.timedelta(days=today.weekday() + 7)
-            end_of_last_week = start_of_last_week + datetime.timedelta(days=6)
-            sales = sales.filter(date_time__date__gte=start_of_last_week, date_time__date__lte=end_of_last_week)
-        elif date_range == 'this_month':
-            sales = sales.filter(date_time__month=today.month, date_time__year=today.year)
-        elif date_range == 'last_month':
-            last_month = today.month - 1 if today.month > 1 else 12
-            year = today.year if today.month > 1 else today.year - 1
-            sales = sales.filter(date_time__month=last_month, date_time__year=year)
-    
-    if start_date and end_date:
-        sales = sales.filter(date_time__date__gte=start_date, date_time__date__lte=end_date)
-    
-    if employee_id:
-        sales = sales.filter(employee_id=employee_id)
+    start, end, filters = _sales_filters(request.GET)
     
-    if category_id:
-        sales = sales.filter(product__category_id=category_id)
+    sales = Sale.objects.select_related('product', 'employee', 'product__category').filter(**filters)
+    sales = _filter_dates(sales, 'date_time', start, end)
+    # Ranges starting inside the archive also export the archived rows
+    sales = chain(archived_sales(start, end, **filters).order_by('date_time'), sales)
     
     for sale in sales:
         writer.writerow([
@@ -746,12 +954,13 @@ def export_sales(request):
             sale.date_time.strftime('%Y-%m-%d %H:%M'),
             sale.quantity,
             sale.price,
-            sale.quantity * sale.price
+            sale.line_total
         ])
     
     return response
 
 @login_required
+@conditional('inventory', 'product', 'supplier', 'category', daily=True)
 def export_inventory(request):
     """Export inventory to CSV"""
     response = HttpResponse(content_type='text/csv')
@@ -799,13 +1008,31 @@ def export_inventory(request):
             inventory.supplier.name,
             inventory.quantity,
             inventory.unit_price,
-            inventory.quantity * inventory.unit_price,
+            inventory.line_value,
             inventory.date_received.strftime('%Y-%m-%d %H:%M')
         ])
     
     return response
 
 @login_required
+def import_data(request):
+    """Upload a products, inventory or sales CSV for bulk import"""
+    context = {'kinds': importers.KINDS, 'kind': request.POST.get('kind', 'products')}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            context['error'] = 'Choose a CSV file to import.'
+        else:
+            try:
+                context['result'] = importers.import_csv(
+                    context['kind'], importers.open_upload(upload), dry_run=bool(request.POST.get('dry_run')),
+                )
+            except importers.CsvImportError as exc:
+                context['error'] = str(exc)
+    return render(request, 'main/import.html', context)
+
+@login_required
+@conditional('employee', 'sale')
 def export_employees(request):
     """Export employees to CSV"""
     response = HttpResponse(content_type='text/csv')
@@ -815,10 +1042,11 @@ def export_employees(request):
     writer.writerow(['Name', 'Position', 'Phone', 'Email', 'Date Joined', 'Sales Count', 'Sales Revenue'])
     
     employees = Employee.objects.all()
+    by_employee = sales_by('employee')
     
     for employee in employees:
-        sales_count = Sale.objects.filter(employee=employee).count()
-        sales_revenue = Sale.objects.filter(employee=employee).aggregate(Sum('price'))['price__sum'] or 0
+        sales_count = by_employee[employee.id]['count']
+        sales_revenue = by_employee[employee.id]['line_total']
         
         writer.writerow([
             employee.name,
@@ -832,31 +1060,31 @@ def export_employees(request):
     
     return response
 
-@login_required
-def api_sales_data(request):
-    """API endpoint for sales chart data"""
-    period = request.GET.get('period', 'daily')
-    today = timezone.now().date()
-    
+def sales_series(period, today):
+    """Chart labels and revenue values for the daily, weekly or monthly view"""
     labels = []
     values = []
     
     if period == 'daily':
         # Daily data for the last 30 days
         thirty_days_ago = today - datetime.timedelta(days=30)
+        daily = daily_totals(thirty_days_ago, today - datetime.timedelta(days=1))
         
         for i in range(30):
             date = thirty_days_ago + datetime.timedelta(days=i)
-            day_sales = Sale.objects.filter(date_time__date=date).aggregate(Sum('price'))['price__sum'] or 0
             labels.append(date.strftime('%b %d'))
-            values.append(day_sales)
+            values.append(daily[date]['line_total'])
     
     elif period == 'weekly':
-        # Weekly data for the last 12 weeks
+        # Weekly data for the last 12 weeks, summed from one daily query
+        daily = daily_totals(today - datetime.timedelta(days=12 * 7 - 1), today)
         for i in range(12):
             end_date = today - datetime.timedelta(days=i * 7)
             start_date = end_date - datetime.timedelta(days=6)
-            week_sales = Sale.objects.filter(date_time__date__range=[start_date, end_date]).aggregate(Sum('price'))['price__sum'] or 0
+            week_sales = sum(
+                (daily[start_date + datetime.timedelta(days=d)]['line_total'] for d in range(7)),
+                Decimal('0'),
+            )
             labels.append(f"{start_date.strftime('%b %d')} - {end_date.strftime('%b %d')}")
             values.append(week_sales)
         
@@ -866,55 +1094,101 @@ def api_sales_data(request):
     
     elif period == 'monthly':
         # Monthly data for the last 12 months
-        for i in range(12):
-            month = today.month - i if today.month > i else 12 - (i - today.month)
-            year = today.year if today.month > i else today.year - 1
-            
-            month_sales = Sale.objects.filter(date_time__month=month, date_time__year=year).aggregate(Sum('price'))['price__sum'] or 0
-            month_name = datetime.date(year, month, 1).strftime('%b %Y')
-            labels.append(month_name)
-            values.append(month_sales)
+        months = _recent_months(today, 12)
+        monthly = defaultdict(Decimal)
+        for day, row in daily_totals(datetime.date(*months[0], 1), today).items():
+            monthly[(day.year, day.month)] += row['line_total']
         
-        # Reverse to show chronological order
-        labels.reverse()
-        values.reverse()
+        for year, month in months:
+            labels.append(datetime.date(year, month, 1).strftime('%b %Y'))
+            values.append(monthly[(year, month)])
     
-    return JsonResponse({
+    return labels, values
+
+def cached_sales_series(period, today, versions):
+    """sales_series(), cached per period until a sale changes"""
+    if period not in SALES_PERIODS:
+        return sales_series(period, today)
+    return precompute.single_flight(
+        precompute.key(f'sales_series:{period}', today, versions, SALES_SERIES_MODELS),
+        lambda: sales_series(period, today),
+    )
+
+@login_required
+@conditional(*SALES_SERIES_MODELS, daily=True)
+def api_sales_data(request):
+    """API endpoint for sales chart data"""
+    labels, values = cached_sales_series(
+        request.GET.get('period', 'daily'), timezone.now().date(), data_versions(request),
+    )
+    return fastjson.JSONResponse({
         'labels': labels,
         'values': values
     })
 
-@login_required
-def api_employee_performance(request):
-    """API endpoint for employee performance chart data"""
-    period = request.GET.get('period', 'this_month')
-    today = timezone.now().date()
-    
+def performance_queries(period, today):
+    """Employee list and per-employee sales for a period, as independent queries"""
     # Filter sales based on period
-    sales_query = Sale.objects.all()
+    start = end = None
     
     if period == 'this_month':
-        sales_query = sales_query.filter(date_time__month=today.month, date_time__year=today.year)
+        start, end = _month_bounds(today.year, today.month)
     elif period == 'last_month':
         last_month = today.month - 1 if today.month > 1 else 12
         year = today.year if today.month > 1 else today.year - 1
-        sales_query = sales_query.filter(date_time__month=last_month, date_time__year=year)
+        start, end = _month_bounds(year, last_month)
     elif period == 'this_year':
-        sales_query = sales_query.filter(date_time__year=today.year)
+        start, end = datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)
     
-    # Get employee performance data
-    employees = Employee.objects.all()
+    return {
+        'employees': lambda: list(Employee.objects.values_list('id', 'name')),
+        'by_employee': lambda: sales_by('employee', start, end),
+    }
+
+def performance_period(period):
+    """One of PERFORMANCE_PERIODS; anything else means all time"""
+    return period if period in PERFORMANCE_PERIODS else 'all'
+
+def performance_key(period, today, versions):
+    return precompute.key(f'performance:{period}', today, versions, PERFORMANCE_MODELS)
+
+def employee_performance(period, today, versions):
+    """Chart payload for one of PERFORMANCE_PERIODS, cached until a sale or employee changes"""
+    def compute():
+        queries = performance_queries(period, today)
+        return performance_payload({name: query() for name, query in queries.items()})
+    return precompute.single_flight(performance_key(period, today, versions), compute)
+
+def performance_payload(results):
     labels = []
     values = []
     
-    for employee in employees:
-        labels.append(employee.name)
-        values.append(sales_query.filter(employee=employee).count())
+    for employee_id, name in results['employees']:
+        labels.append(name)
+        values.append(results['by_employee'][employee_id]['count'])
     
-    return JsonResponse({
+    return {
         'labels': labels,
         'values': values
-    })
+    }
+
+@login_required
+@conditional(*PERFORMANCE_MODELS, daily=True)
+def api_employee_performance(request):
+    """API endpoint for employee performance chart data"""
+    period = performance_period(request.GET.get('period', 'this_month'))
+    return fastjson.JSONResponse(employee_performance(period, timezone.now().date(), data_versions(request)))
+
+@login_required
+def live_feed(request):
+    """Server-Sent Events: new sales and stock changes for open dashboards"""
+    response = StreamingHttpResponse(
+        events.stream(events.last_event_id(request)), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 def login_view(request):
     """User login"""